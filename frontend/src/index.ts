@@ -7,14 +7,23 @@ import {showDialog, Dialog, Spinner, MainAreaWidget} from '@jupyterlab/apputils'
 import {ServerConnection} from '@jupyterlab/services';
 import {URLExt} from '@jupyterlab/coreutils';
 import {Widget} from '@lumino/widgets';
-import { addIcon, downloadIcon, closeIcon, infoIcon } from '@jupyterlab/ui-components';
+import { addIcon, downloadIcon, closeIcon, infoIcon, refreshIcon } from '@jupyterlab/ui-components';
 
 class SpinnerWidget extends Widget {
+    private messageNode: HTMLDivElement;
+
     constructor() {
         super();
         this.addClass('jp-SpinnerWidget');
         const spinner = new Spinner();
         this.node.appendChild(spinner.node);
+        this.messageNode = document.createElement('div');
+        this.messageNode.className = 'jp-SpinnerWidget-message';
+        this.node.appendChild(this.messageNode);
+    }
+
+    setMessage(message: string) {
+        this.messageNode.textContent = message;
     }
 }
 
@@ -29,6 +38,201 @@ async function requestAPI<T>(url: string, init: RequestInit): Promise<T> {
     return data.response;
 }
 
+interface BatchResult {
+    path: string;
+    success?: string;
+    error?: string;
+    status?: string;
+}
+
+function getSelectedFilePaths(fileBrowser: FileBrowser): string[] {
+    return Array.from(fileBrowser.selectedItems())
+        .filter(item => item.type !== 'directory')
+        .map(item => item.path);
+}
+
+function batchResultsWidget(results: BatchResult[]): Widget {
+    const body = new Widget();
+    const list = document.createElement('ul');
+    for (const result of results) {
+        const item = document.createElement('li');
+        const message = result.error ? `Error: ${result.error}` : (result.status || result.success);
+        item.textContent = `${result.path}: ${message}`;
+        list.appendChild(item);
+    }
+    body.node.appendChild(list);
+    return body;
+}
+
+async function showBatchResultsDialog(command: string, results: BatchResult[]) {
+    const failed = results.filter(result => result.error).length;
+    await showDialog({
+        title: `${command}: ${results.length - failed} of ${results.length} files succeeded`,
+        body: batchResultsWidget(results),
+        buttons: [Dialog.okButton({label: 'OK'})]
+    });
+}
+
+interface Job {
+    job_id: string;
+    operation: string;
+    path: string;
+    status: string;
+    result: any;
+    progress: any;
+}
+
+type HydroShareEventListener = (data: any) => void;
+
+const HYDROSHARE_EVENT_TYPES = ['progress', 'job', 'files', 'checksums'];
+
+/**
+ * Subscribes to the events pushed by the server extension: transfer progress, job updates, changes to the cached file
+ * listing of a resource and local files of a folder being hashed. The browser reconnects a dropped stream by itself.
+ */
+class HydroShareEvents {
+    private source: EventSource | null = null;
+    private listeners = new Map<string, Set<HydroShareEventListener>>();
+
+    connect() {
+        if (this.source) {
+            return;
+        }
+        const settings = ServerConnection.makeSettings();
+        let url = URLExt.join(settings.baseUrl, 'hydroshare', 'events');
+        if (settings.token) {
+            // EventSource can't send the authorization header
+            url += `?token=${encodeURIComponent(settings.token)}`;
+        }
+        this.source = new EventSource(url);
+        for (const type of HYDROSHARE_EVENT_TYPES) {
+            this.source.addEventListener(type, event => {
+                const data = JSON.parse((event as MessageEvent).data);
+                this.listeners.get(type)?.forEach(listener => listener(data));
+            });
+        }
+    }
+
+    get connected(): boolean {
+        return this.source !== null && this.source.readyState === EventSource.OPEN;
+    }
+
+    on(type: string, listener: HydroShareEventListener): () => void {
+        if (!this.listeners.has(type)) {
+            this.listeners.set(type, new Set());
+        }
+        this.listeners.get(type)!.add(listener);
+        return () => this.listeners.get(type)!.delete(listener);
+    }
+}
+
+const hydroShareEvents = new HydroShareEvents();
+
+function showTransferProgress(content: SpinnerWidget, progress: any) {
+    const eta = progress.eta !== null ? `, ${Math.ceil(progress.eta)}s remaining` : '';
+    content.setMessage(`${progress.percent}% transferred${eta}`);
+}
+
+/**
+ * Waits for a job to finish and returns its result. The progress of the transfer is shown in the spinner. Progress
+ * and completion are pushed by the server - the job is polled only as a fallback for when the event stream is down.
+ * The job keeps running in the server if the page is reloaded.
+ */
+async function waitForJob(jobId: string, content: SpinnerWidget | null): Promise<any> {
+    let jobPath: string | null = null;
+    let finishedJob: Job | null = null;
+    let wakeUp = () => {};
+    const stopJobEvents = hydroShareEvents.on('job', (job: Job) => {
+        if (job.job_id === jobId && job.status !== 'running') {
+            finishedJob = job;
+            wakeUp();
+        }
+    });
+    const stopProgressEvents = hydroShareEvents.on('progress', progress => {
+        if (content && progress.path === jobPath) {
+            showTransferProgress(content, progress);
+        }
+    });
+    try {
+        for (;;) {
+            const job: Job = finishedJob || (await requestAPI<any>(`jobs/${jobId}`, {method: 'GET'})).job;
+            if (job.status !== 'running') {
+                if (job.result.error) {
+                    throw new Error(job.result.error);
+                }
+                return job.result;
+            }
+            jobPath = job.path;
+            if (content && job.progress) {
+                showTransferProgress(content, job.progress);
+            }
+            await new Promise<void>(resolve => {
+                wakeUp = resolve;
+                window.setTimeout(resolve, hydroShareEvents.connected ? 10000 : 1000);
+            });
+        }
+    } finally {
+        stopJobEvents();
+        stopProgressEvents();
+    }
+}
+
+// the transfer operations that the server runs as jobs (JOB_OPERATIONS in hsfiles_jupyter/jobs.py)
+const JOB_OPERATIONS = new Set([
+    'upload', 'refresh', 'delete', 'replace', 'upload-folder', 'sync', 'batch/upload', 'batch/refresh', 'batch/delete'
+]);
+
+/**
+ * Runs an operation ('upload', 'refresh', 'replace', 'sync' etc.) as a job in the server, so that no request is held
+ * open for the whole transfer, and returns its result.
+ */
+async function runJob(operation: string, data: any, content: SpinnerWidget | null): Promise<any> {
+    const response = await requestAPI<any>('jobs', {
+        method: 'POST',
+        body: JSON.stringify({operation, ...data}),
+    });
+    return waitForJob(response.job.job_id, content);
+}
+
+/**
+ * Shows the jobs that are still running in the server (e.g., started before the page was reloaded) and their outcome.
+ */
+async function reattachRunningJobs(app: JupyterFrontEnd) {
+    let jobs: Job[];
+    try {
+        jobs = (await requestAPI<any>('jobs', {method: 'GET'})).jobs;
+    } catch (error) {
+        console.error('Failed to list HydroShare jobs:', error);
+        return;
+    }
+    await Promise.all(jobs.filter(job => job.status === 'running').map(async job => {
+        const [content, mainWidget] = createSpinner(app, `spinner-job-${job.job_id}`);
+        content.setMessage(`${job.operation}: ${job.path}`);
+        try {
+            const result = await waitForJob(job.job_id, content);
+            content.node.style.display = 'none';
+            if (result.results) {
+                // a batch job
+                await showBatchResultsDialog(`HydroShare ${job.operation}`, result.results);
+            } else {
+                await showDialog({
+                    title: `HydroShare ${job.operation} was successful`,
+                    body: result.success,
+                    buttons: [Dialog.okButton({label: 'OK'})]
+                });
+            }
+        } catch (error) {
+            await showDialog({
+                title: `HydroShare ${job.operation} Failed`,
+                body: `Error: ${error instanceof Error ? error.message : error}.`,
+                buttons: [Dialog.okButton({label: 'OK'})]
+            });
+        } finally {
+            mainWidget.dispose();
+        }
+    }));
+}
+
 function disableFileBrowser(fileBrowser: FileBrowser) {
     fileBrowser.node.style.pointerEvents = 'none';
     fileBrowser.node.style.opacity = '0.5';
@@ -48,13 +252,13 @@ async function handleCommand(
     url: string,
     successTitle: string | ((response: any) => string),
     successMessage: (response: any) => string,
-    extraData: any = {}
+    extraData: any = {},
+    trackProgress: boolean = false
 ) {
     const widget = tracker.currentWidget;
     if (widget) {
-        const selectedItem = widget.selectedItems().next();
-        if (selectedItem && selectedItem.value) {
-            const path = selectedItem.value.path;
+        const paths = getSelectedFilePaths(widget);
+        if (paths.length > 0) {
             const fileBrowser = tracker.currentWidget;
             disableFileBrowser(fileBrowser);
 
@@ -67,18 +271,37 @@ async function handleCommand(
             content.node.style.display = 'block';
 
             try {
-                const response = await requestAPI<any>(url, {
-                    method: 'POST',
-                    body: JSON.stringify({path, ...extraData}),
-                });
-                content.node.style.display = 'none';
-                const title = typeof successTitle === 'function' ? successTitle(response) : successTitle;
-                console.log(title, path);
-                await showDialog({
-                    title: title,
-                    body: successMessage(response),
-                    buttons: [Dialog.okButton({label: 'OK'})]
-                });
+                if (paths.length > 1) {
+                    // acting on all the selected files at once - the transfers run as a job like for a single file,
+                    // which is shown with the folder of the files
+                    const batchUrl = `batch/${url}`;
+                    const folderPath = paths[0].substring(0, paths[0].lastIndexOf('/'));
+                    const response = JOB_OPERATIONS.has(batchUrl)
+                        ? await runJob(batchUrl, {path: folderPath, paths, ...extraData}, null)
+                        : await requestAPI<any>(batchUrl, {
+                            method: 'POST',
+                            body: JSON.stringify({paths, ...extraData}),
+                        });
+                    content.node.style.display = 'none';
+                    await showBatchResultsDialog(command, response.results);
+                } else {
+                    const path = paths[0];
+                    // only the transfers run as jobs, the other commands (e.g., status) are answered right away
+                    const response = JOB_OPERATIONS.has(url)
+                        ? await runJob(url, {path, ...extraData}, trackProgress ? content : null)
+                        : await requestAPI<any>(url, {
+                            method: 'POST',
+                            body: JSON.stringify({path, ...extraData}),
+                        });
+                    content.node.style.display = 'none';
+                    const title = typeof successTitle === 'function' ? successTitle(response) : successTitle;
+                    console.log(title, path);
+                    await showDialog({
+                        title: title,
+                        body: successMessage(response),
+                        buttons: [Dialog.okButton({label: 'OK'})]
+                    });
+                }
             } catch (error) {
                 const errMssg = `${command} Failed:`;
                 if (error instanceof Error) {
@@ -132,30 +355,19 @@ async function handleUploadCommand(
             });
 
             if (result.button.label === 'Replace') {
-                // Delete the existing file first
-                await requestAPI<any>('delete', {
-                    method: 'POST',
-                    body: JSON.stringify({path}),
-                });
-                
-                // Now upload the new file
-                const uploadResponse = await requestAPI<any>('upload', {
-                    method: 'POST',
-                    body: JSON.stringify({path}),
-                });
-                
+                // The server uploads the new file before removing the existing one, and skips the upload if they
+                // are identical
+                const replaceResponse = await runJob('replace', {path}, content);
+
                 await showDialog({
                     title: 'File upload to HydroShare was successful',
-                    body: uploadResponse.success,
+                    body: replaceResponse.success,
                     buttons: [Dialog.okButton({label: 'OK'})]
                 });
             }
         } else {
             // File doesn't exist, proceed with normal upload
-            const uploadResponse = await requestAPI<any>('upload', {
-                method: 'POST',
-                body: JSON.stringify({path}),
-            });
+            const uploadResponse = await runJob('upload', {path}, content);
             
             await showDialog({
                 title: 'File upload to HydroShare was successful',
@@ -184,6 +396,352 @@ async function handleUploadCommand(
     }
 }
 
+interface SyncPlanItem {
+    path: string;
+    status: string;
+    action: string | null;
+    success?: string;
+    error?: string;
+}
+
+function syncPlanWidget(items: SyncPlanItem[]): Widget {
+    const body = new Widget();
+    const list = document.createElement('ul');
+    for (const item of items) {
+        const listItem = document.createElement('li');
+        const outcome = item.error ? `Error: ${item.error}` : (item.action || 'no action');
+        listItem.textContent = `${item.path} (${item.status}): ${outcome}`;
+        list.appendChild(listItem);
+    }
+    body.node.appendChild(list);
+    return body;
+}
+
+function createSpinner(app: JupyterFrontEnd, id: string): [SpinnerWidget, MainAreaWidget<SpinnerWidget>] {
+    const content = new SpinnerWidget();
+    const mainWidget = new MainAreaWidget({ content });
+    mainWidget.id = id;
+    mainWidget.title.label = 'Processing...';
+    app.shell.add(mainWidget, 'main');
+    content.node.style.display = 'block';
+    return [content, mainWidget];
+}
+
+async function handleSyncFolderCommand(app: JupyterFrontEnd, tracker: IFileBrowserFactory['tracker']) {
+    const fileBrowser = tracker.currentWidget;
+    if (!fileBrowser) {
+        return;
+    }
+    const folders = Array.from(fileBrowser.selectedItems()).filter(item => item.type === 'directory');
+    if (folders.length !== 1) {
+        return;
+    }
+    const path = folders[0].path;
+    const choice = await showDialog({
+        title: 'Sync Folder with HydroShare',
+        body: 'Upload local changes to HydroShare, or download the changes made in HydroShare?',
+        buttons: [
+            Dialog.cancelButton({ label: 'Cancel' }),
+            Dialog.okButton({ label: 'Download from HydroShare' }),
+            Dialog.okButton({ label: 'Upload to HydroShare' })
+        ],
+        defaultButton: 0
+    });
+    if (!choice.button.accept) {
+        return;
+    }
+    const direction = choice.button.label === 'Upload to HydroShare' ? 'upload' : 'download';
+
+    disableFileBrowser(fileBrowser);
+    const [content, mainWidget] = createSpinner(app, 'spinner-sync-folder-with-hydroshare');
+    try {
+        // dry run first so that the user can review what will be transferred
+        const planResponse = await requestAPI<any>('sync', {
+            method: 'POST',
+            body: JSON.stringify({path, direction, dry_run: true}),
+        });
+        const plan: SyncPlanItem[] = planResponse.plan;
+        content.node.style.display = 'none';
+        if (!plan.some(item => item.action)) {
+            await showDialog({
+                title: 'Sync Folder with HydroShare',
+                body: `Folder ${path} is in sync with HydroShare.`,
+                buttons: [Dialog.okButton({label: 'OK'})]
+            });
+            return;
+        }
+        const confirmation = await showDialog({
+            title: planResponse.success,
+            body: syncPlanWidget(plan),
+            buttons: [
+                Dialog.cancelButton({ label: 'Cancel' }),
+                Dialog.okButton({ label: 'Sync' })
+            ],
+            defaultButton: 0
+        });
+        if (!confirmation.button.accept) {
+            return;
+        }
+        content.node.style.display = 'block';
+        const syncResponse = await runJob('sync', {path, direction, dry_run: false}, null);
+        content.node.style.display = 'none';
+        await showDialog({
+            title: syncResponse.success,
+            body: syncPlanWidget(syncResponse.results),
+            buttons: [Dialog.okButton({label: 'OK'})]
+        });
+    } catch (error) {
+        const errMssg = 'Sync folder with HydroShare Failed:';
+        if (error instanceof Error) {
+            console.error(errMssg, error.message);
+            await showDialog({
+                title: 'Sync Failed',
+                body: `Error: ${error.message}.`,
+                buttons: [Dialog.okButton({label: 'OK'})]
+            });
+        } else {
+            console.error(errMssg, error);
+        }
+    } finally {
+        if (content.isAttached) {
+            content.parent = null;
+        }
+        mainWidget.dispose();
+        enableFileBrowser(fileBrowser);
+    }
+}
+
+async function handleUploadFolderCommand(app: JupyterFrontEnd, tracker: IFileBrowserFactory['tracker']) {
+    const fileBrowser = tracker.currentWidget;
+    if (!fileBrowser) {
+        return;
+    }
+    const folders = Array.from(fileBrowser.selectedItems()).filter(item => item.type === 'directory');
+    if (folders.length !== 1) {
+        return;
+    }
+    const path = folders[0].path;
+    const result = await showDialog({
+        title: 'Upload Folder to HydroShare',
+        body: 'All files in this folder will be uploaded to HydroShare as a single zip file and unzipped there.',
+        checkbox: {
+            label: 'Overwrite existing files in HydroShare',
+            checked: false
+        },
+        buttons: [
+            Dialog.cancelButton({ label: 'Cancel' }),
+            Dialog.okButton({ label: 'Upload' })
+        ],
+        defaultButton: 0
+    });
+    if (!result.button.accept) {
+        return;
+    }
+
+    disableFileBrowser(fileBrowser);
+    const [content, mainWidget] = createSpinner(app, 'spinner-upload-folder-to-hydroshare');
+    try {
+        const response = await runJob('upload-folder', {path, overwrite: result.isChecked === true}, content);
+        content.node.style.display = 'none';
+        await showDialog({
+            title: 'Folder upload to HydroShare was successful',
+            body: response.success,
+            buttons: [Dialog.okButton({label: 'OK'})]
+        });
+    } catch (error) {
+        const errMssg = 'Upload folder to HydroShare Failed:';
+        if (error instanceof Error) {
+            console.error(errMssg, error.message);
+            await showDialog({
+                title: 'Upload Failed',
+                body: `Error: ${error.message}.`,
+                buttons: [Dialog.okButton({label: 'OK'})]
+            });
+        } else {
+            console.error(errMssg, error);
+        }
+    } finally {
+        if (content.isAttached) {
+            content.parent = null;
+        }
+        mainWidget.dispose();
+        enableFileBrowser(fileBrowser);
+    }
+}
+
+// a folder (or a sub folder) of the data/contents folder of a resource opened into Downloads
+const RESOURCE_CONTENTS_PATH = /^Downloads\/[^/]{32}\/([^/]{32}\/)?data\/contents(\/|$)/;
+
+const SYNC_BADGE_STYLE = `
+.jp-DirListing-item[data-hs-status] .jp-DirListing-itemText::after {
+    margin-left: 6px;
+    font-size: var(--jp-ui-font-size0);
+}
+.jp-DirListing-item[data-hs-status="synced"] .jp-DirListing-itemText::after {
+    content: '\u25CF synced';
+    color: var(--jp-success-color1);
+}
+.jp-DirListing-item[data-hs-status="modified"] .jp-DirListing-itemText::after {
+    content: '\u25CF modified';
+    color: var(--jp-warn-color1);
+}
+.jp-DirListing-item[data-hs-status="local-only"] .jp-DirListing-itemText::after {
+    content: '\u25CB local only';
+    color: var(--jp-ui-font-color2);
+}
+.jp-DirListing-item[data-hs-status="checking"] .jp-DirListing-itemText::after {
+    content: '\u2026';
+    color: var(--jp-ui-font-color2);
+}
+`;
+
+/**
+ * Shows the HydroShare sync status of each file as a badge in the file browser listing of a resource folder.
+ */
+class SyncStatusBadges {
+    private statuses: {[fileName: string]: string} = {};
+    private timer = 0;
+    private observer: MutationObserver;
+
+    constructor(private fileBrowser: FileBrowser) {
+        const model = fileBrowser.model;
+        model.pathChanged.connect(() => {
+            this.statuses = {};
+            this.scheduleUpdate(0);
+        });
+        model.fileChanged.connect(() => this.scheduleUpdate(1000));
+        model.refreshed.connect(() => this.scheduleUpdate(1000));
+        // the statuses change when the resource is changed in HydroShare (possibly from another tab) or the local
+        // files of the folder have been hashed
+        const stopFilesEvents = hydroShareEvents.on('files', event => {
+            const match = RESOURCE_PATH.exec(model.path);
+            if (match && match[1] === event.resource_id) {
+                this.scheduleUpdate(500);
+            }
+        });
+        const stopChecksumsEvents = hydroShareEvents.on('checksums', event => {
+            if (event.path === model.path) {
+                this.scheduleUpdate(0);
+            }
+        });
+        // the listing is re-rendered by the file browser every time its contents are refreshed
+        this.observer = new MutationObserver(() => this.render());
+        this.observer.observe(fileBrowser.node, {childList: true, subtree: true});
+        fileBrowser.disposed.connect(() => {
+            window.clearTimeout(this.timer);
+            this.observer.disconnect();
+            stopFilesEvents();
+            stopChecksumsEvents();
+        });
+        this.scheduleUpdate(0);
+    }
+
+    private scheduleUpdate(delay: number) {
+        window.clearTimeout(this.timer);
+        this.timer = window.setTimeout(() => this.update(), delay);
+    }
+
+    private async update() {
+        const path = this.fileBrowser.model.path;
+        if (!RESOURCE_CONTENTS_PATH.test(path)) {
+            this.statuses = {};
+            this.render();
+            return;
+        }
+        try {
+            const response = await requestAPI<any>('folder-status', {
+                method: 'POST',
+                body: JSON.stringify({path}),
+            });
+            if (this.fileBrowser.model.path !== path) {
+                return;
+            }
+            this.statuses = response.statuses;
+            this.render();
+            if (Object.values(this.statuses).includes('checking') && !hydroShareEvents.connected) {
+                // some files are being hashed in the background - without the event stream we have to poll
+                this.scheduleUpdate(3000);
+            }
+        } catch (error) {
+            console.error('Failed to get HydroShare status of folder:', path, error);
+        }
+    }
+
+    private render() {
+        this.fileBrowser.node.querySelectorAll('.jp-DirListing-item').forEach(item => {
+            const fileName = item.querySelector('.jp-DirListing-itemText')?.textContent;
+            const status = fileName ? this.statuses[fileName] : undefined;
+            if (status) {
+                if (item.getAttribute('data-hs-status') !== status) {
+                    item.setAttribute('data-hs-status', status);
+                }
+            } else if (item.hasAttribute('data-hs-status')) {
+                item.removeAttribute('data-hs-status');
+            }
+        });
+    }
+}
+
+// any folder of a resource opened into Downloads - the first group is the resource id
+const RESOURCE_PATH = /^Downloads\/([^/]{32})(\/|$)/;
+const RESOURCE_ID = /^[^/]{32}$/;
+
+/**
+ * Asks the server to load a resource and its files from HydroShare in the background as soon as a folder of the
+ * resource is opened in the file browser, or a new resource folder appears in Downloads, so that the first action
+ * on its files does not have to wait for them.
+ */
+class ResourceWarmUp {
+    private warmedUp = new Set<string>();
+    private downloadsListing: Set<string> | null = null;
+
+    constructor(private fileBrowser: FileBrowser) {
+        const model = fileBrowser.model;
+        model.pathChanged.connect(() => {
+            this.downloadsListing = null;
+            const match = RESOURCE_PATH.exec(model.path);
+            if (match) {
+                void this.warmUp(match[1]);
+            }
+        });
+        model.refreshed.connect(() => this.checkNewResources());
+    }
+
+    private checkNewResources() {
+        const model = this.fileBrowser.model;
+        if (model.path !== 'Downloads') {
+            return;
+        }
+        const resourceIds = new Set(Array.from(model.items())
+            .filter(item => item.type === 'directory' && RESOURCE_ID.test(item.name))
+            .map(item => item.name));
+        if (this.downloadsListing !== null) {
+            resourceIds.forEach(resourceId => {
+                if (!this.downloadsListing!.has(resourceId)) {
+                    void this.warmUp(resourceId);
+                }
+            });
+        }
+        this.downloadsListing = resourceIds;
+    }
+
+    private async warmUp(resourceId: string) {
+        if (this.warmedUp.has(resourceId)) {
+            return;
+        }
+        this.warmedUp.add(resourceId);
+        try {
+            await requestAPI<any>('warmup', {
+                method: 'POST',
+                body: JSON.stringify({path: `Downloads/${resourceId}`}),
+            });
+        } catch (error) {
+            this.warmedUp.delete(resourceId);
+            console.error('Failed to warm up HydroShare resource:', resourceId, error);
+        }
+    }
+}
+
 const extension: JupyterFrontEndPlugin<void> = {
     id: 'hsfiles_jupyter:plugin',
     autoStart: true,
@@ -192,6 +750,21 @@ const extension: JupyterFrontEndPlugin<void> = {
         const {commands} = app;
         const {tracker} = factory;
         console.log('JupyterLab extension hsfiles_jupyter is activated!');
+
+        hydroShareEvents.connect();
+
+        const style = document.createElement('style');
+        style.textContent = SYNC_BADGE_STYLE;
+        document.head.appendChild(style);
+        tracker.forEach(fileBrowser => {
+            new SyncStatusBadges(fileBrowser);
+            new ResourceWarmUp(fileBrowser);
+        });
+        tracker.widgetAdded.connect((_, fileBrowser) => {
+            new SyncStatusBadges(fileBrowser);
+            new ResourceWarmUp(fileBrowser);
+        });
+        void reattachRunningJobs(app);
         
         commands.addCommand('upload-to-hydroshare', {
             label: 'Upload File to HydroShare',
@@ -199,9 +772,18 @@ const extension: JupyterFrontEndPlugin<void> = {
             execute: async () => {
                 const widget = tracker.currentWidget;
                 if (widget) {
-                    const selectedItem = widget.selectedItems().next();
-                    if (selectedItem && selectedItem.value) {
-                        const path = selectedItem.value.path;
+                    const paths = getSelectedFilePaths(widget);
+                    if (paths.length > 1) {
+                        await handleCommand(
+                            app,
+                            tracker,
+                            'Upload files to HydroShare',
+                            'upload',
+                            'File upload to HydroShare was successful',
+                            response => `${response.success}`
+                        );
+                    } else if (paths.length === 1) {
+                        const path = paths[0];
                         const fileBrowser = tracker.currentWidget;
                         disableFileBrowser(fileBrowser);
 
@@ -239,7 +821,9 @@ const extension: JupyterFrontEndPlugin<void> = {
                         'Replace with file from HydroShare',
                         'refresh',
                         'File replace from HydroShare was successful',
-                        response => `${response.success}`
+                        response => `${response.success}`,
+                        {},
+                        true
                     );
                 }
             }
@@ -285,6 +869,18 @@ const extension: JupyterFrontEndPlugin<void> = {
             )
         });
 
+        commands.addCommand('sync-folder-with-hydroshare', {
+            label: 'Sync Folder with HydroShare',
+            icon: refreshIcon,
+            execute: () => handleSyncFolderCommand(app, tracker)
+        });
+
+        commands.addCommand('upload-folder-to-hydroshare', {
+            label: 'Upload Folder to HydroShare',
+            icon: addIcon,
+            execute: () => handleUploadFolderCommand(app, tracker)
+        });
+
         // Add separator before HydroShare items with a higher rank
         app.contextMenu.addItem({
             type: 'separator',
@@ -323,6 +919,31 @@ const extension: JupyterFrontEndPlugin<void> = {
             selector: '.jp-DirListing-item[data-isdir="false"]',
             rank: 10.5
         });
+
+        // HydroShare menu items for folders
+        app.contextMenu.addItem({
+            type: 'separator',
+            selector: '.jp-DirListing-item[data-isdir="true"]',
+            rank: 10.0
+        });
+
+        app.contextMenu.addItem({
+            command: 'sync-folder-with-hydroshare',
+            selector: '.jp-DirListing-item[data-isdir="true"]',
+            rank: 10.1
+        });
+
+        app.contextMenu.addItem({
+            command: 'upload-folder-to-hydroshare',
+            selector: '.jp-DirListing-item[data-isdir="true"]',
+            rank: 10.2
+        });
+
+        app.contextMenu.addItem({
+            type: 'separator',
+            selector: '.jp-DirListing-item[data-isdir="true"]',
+            rank: 10.5
+        });
     }
 };
 
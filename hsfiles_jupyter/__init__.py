@@ -36,8 +36,11 @@ def _load_jupyter_server_extension(server_app: ServerApp):
         JupyterLab application instance
     """
     from .handlers import setup_handlers
+    from .file_watcher import FileWatcher
 
     setup_handlers(server_app.web_app)
     server_app.log.info(f"Registered {_EXTENSION_NAME} server extension")
+    if FileWatcher().start():
+        server_app.log.info(f"Started {_EXTENSION_NAME} file watcher")
 
 load_jupyter_server_extension = _load_jupyter_server_extension
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+from pathlib import Path
+
+from .check_file_status import check_file_status
+from .delete_file import delete_file_from_hydroshare
+from .refresh_file import refresh_file_from_hydroshare
+from .upload_file import upload_file_to_hydroshare
+from .utils import (
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    logger,
+    HydroShareAuthError,
+    get_batch_concurrency,
+    get_resource_id,
+    run_in_executor,
+)
+
+BATCH_OPERATIONS = {
+    'upload': upload_file_to_hydroshare,
+    'refresh': refresh_file_from_hydroshare,
+    'delete': delete_file_from_hydroshare,
+    'status': check_file_status,
+}
+
+
+async def run_batch_operation(operation_name: str, file_paths: list[str]):
+    """Runs the operation 'operation_name' on each of the files in 'file_paths'. The files are grouped by resource so
+    that each resource and its file listing is retrieved only once, and at most HS_BATCH_CONCURRENCY files are acted
+    on at a time. Returns the result of the operation for each file in the order of 'file_paths'."""
+
+    operation = BATCH_OPERATIONS[operation_name]
+    # acting on the same file more than once in a batch would only race with itself
+    file_paths = list(dict.fromkeys(file_paths))
+    rfc_manager = ResourceFileCacheManager()
+    results = {}
+    resource_file_paths = {}
+    for file_path in file_paths:
+        try:
+            resource_id = get_resource_id(Path(file_path).as_posix())
+        except ValueError as e:
+            results[file_path] = {"error": str(e)}
+            continue
+        resource_file_paths.setdefault(resource_id, []).append(file_path)
+
+    semaphore = asyncio.Semaphore(get_batch_concurrency())
+
+    async def run_operation(file_path, res_info):
+        async with semaphore:
+            try:
+                results[file_path] = await operation(file_path, res_info)
+            except Exception as e:
+                err_msg = f'Failed to {operation_name} file: {file_path}. Error: {str(e)}'
+                logger.error(err_msg)
+                results[file_path] = {"error": err_msg}
+
+    tasks = []
+    for resource_id, res_file_paths in resource_file_paths.items():
+        try:
+            res_infos = await run_in_executor(rfc_manager.get_hydroshare_resource_info_for_files, resource_id,
+                                              res_file_paths)
+        except (HydroShareAuthError, ValueError) as e:
+            for file_path in res_file_paths:
+                results[file_path] = {"error": str(e)}
+            continue
+        if operation is check_file_status:
+            # the local files of the batch are hashed in parallel up front, the status checks then find their
+            # checksums in the cache
+            local_file_paths = [file_path for file_path, res_info in zip(res_file_paths, res_infos)
+                                if res_info.hs_file_relative_path in res_info.files]
+            await run_in_executor(LocalChecksumCache().get_checksums, local_file_paths, ignore_errors=True)
+        tasks.extend(run_operation(file_path, res_info) for file_path, res_info in zip(res_file_paths, res_infos))
+
+    await asyncio.gather(*tasks)
+    return {"results": [{"path": file_path, **results[file_path]} for file_path in file_paths]}
+
+
+async def run_batch_job(operation_name: str, folder_path: str, paths: list[str]):
+    """Runs the operation 'operation_name' on the files 'paths' as a job (see JOB_OPERATIONS) - the job is shown with
+    the folder of the files, 'folder_path'."""
+    return await run_batch_operation(operation_name, paths)
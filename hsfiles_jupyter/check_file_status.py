@@ -1,31 +1,38 @@
+import posixpath
+
 from .utils import (
     ResourceFileCacheManager,
     HydroShareAuthError,
+    HydroShareResourceInfo,
+    run_in_executor,
 )
 
 
-async def check_file_status(file_path: str):
+async def check_file_status(file_path: str, res_info: HydroShareResourceInfo = None):
     """Checks if the selected local file is also in Hydroshare and if they are identical"""
 
     rfc_manager = ResourceFileCacheManager()
-    try:
-        res_info = rfc_manager.get_hydroshare_resource_info(file_path)
-    except HydroShareAuthError as e:
-        return {"error": str(e)}
+    if res_info is None:
+        try:
+            res_info = await run_in_executor(rfc_manager.get_hydroshare_resource_info, file_path)
+        except HydroShareAuthError as e:
+            return {"error": str(e)}
 
     success_response = {"success": f'File {res_info.hs_file_path} exists in HydroShare'
                                    f' resource: {res_info.resource_id}', "status": "Exists in HydroShare"}
-    for res_file in res_info.files:
-        if res_info.hs_file_relative_path == res_file:
-            local_checksum = rfc_manager.compute_checksum(file_path)
-            if local_checksum == res_file.checksum:
-                success_response["status"] = "Exists in HydroShare and they are identical"
-            else:
-                success_response["status"] = "Exists in HydroShare but they are different"
-            return success_response
+    res_file = res_info.files.get(res_info.hs_file_relative_path)
+    if res_file is not None:
+        local_checksum = await run_in_executor(rfc_manager.compute_checksum, file_path)
+        # a file uploaded while it was being modified has no checksum until the cache is refreshed
+        if local_checksum == getattr(res_file, 'checksum', None):
+            success_response["status"] = "Exists in HydroShare and they are identical"
+        else:
+            success_response["status"] = "Exists in HydroShare but they are different"
+        return success_response
 
     if not res_info.refresh:
-        files, _ = rfc_manager.get_files(res_info.resource, refresh=True)
+        files, _ = await run_in_executor(rfc_manager.get_files, res_info.resource, refresh=True,
+                                         folders=[posixpath.dirname(res_info.hs_file_relative_path)])
         if res_info.hs_file_relative_path in files:
             return success_response
     return {"success": f'File {res_info.hs_file_path} does not exist in HydroShare'
@@ -1,35 +1,34 @@
+import posixpath
+
+from .scheduler import TransferPriority, TransferScheduler
 from .utils import (
     FileCacheUpdateType,
     ResourceFileCacheManager,
     logger,
     HydroShareAuthError,
+    HydroShareResourceInfo,
+    run_in_executor,
 )
 
 
-async def delete_file_from_hydroshare(file_path: str):
+async def delete_file_from_hydroshare(file_path: str, res_info: HydroShareResourceInfo = None):
     """
     Deletes a file 'file_path' from HydroShare resource.
     """
     rfc_manager = ResourceFileCacheManager()
-    try:
-        res_info = rfc_manager.get_hydroshare_resource_info(file_path)
-    except HydroShareAuthError as e:
-        return {"error": str(e)}
+    if res_info is None:
+        try:
+            res_info = await run_in_executor(rfc_manager.get_hydroshare_resource_info, file_path)
+        except HydroShareAuthError as e:
+            return {"error": str(e)}
 
-    hs_file_to_delete = None
-    # doing this loop to get an instance of the matching File object (hsclient) that can be passed to the file_delete()
+    # getting an instance of the matching File object (hsclient) that can be passed to the file_delete()
     # method of hsclient
-    for res_file in res_info.files:
-        if res_info.hs_file_relative_path == res_file:
-            hs_file_to_delete = res_file
-            break
-    else:
-        if not res_info.refresh:
-            files, _ = rfc_manager.get_files(res_info.resource, refresh=True)
-            for res_file in files:
-                if res_info.hs_file_relative_path == res_file:
-                    hs_file_to_delete = res_file
-                    break
+    hs_file_to_delete = res_info.files.get(res_info.hs_file_relative_path)
+    if hs_file_to_delete is None and not res_info.refresh:
+        files, _ = await run_in_executor(rfc_manager.get_files, res_info.resource, refresh=True,
+                                         folders=[posixpath.dirname(res_info.hs_file_relative_path)])
+        hs_file_to_delete = files.get(res_info.hs_file_relative_path)
 
     if hs_file_to_delete is None:
         err_msg = f"File {res_info.hs_file_path} doesn't exist in HydroShare resource: {res_info.resource_id}"
@@ -37,7 +36,8 @@ async def delete_file_from_hydroshare(file_path: str):
 
     try:
         # deleting from HydroShare
-        res_info.resource.file_delete(hs_file_to_delete)
+        await TransferScheduler().run(res_info.resource_id, file_path, res_info.resource.file_delete,
+                                      hs_file_to_delete, priority=TransferPriority.HIGH)
         rfc_manager.update_resource_files_cache(resource=res_info.resource, file_path=res_info.hs_file_relative_path,
                                                 update_type=FileCacheUpdateType.DELETE)
     except Exception as e:
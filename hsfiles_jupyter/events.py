@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+# events queued for a subscriber that is not reading them fast enough - the oldest events are dropped beyond this
+_MAX_QUEUED_EVENTS = 1000
+
+
+class EventBus:
+    """A class to push events (transfer progress, job updates, changes to the cached resource file listings etc.) to
+    the subscribed frontends. Events can be published from any thread - each one is delivered on the event loop of
+    the subscriber."""
+
+    # make this a singleton class
+    _instance: "EventBus" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._subscribers = {}
+            cls._instance = instance
+        return cls._instance
+
+    def subscribe(self) -> asyncio.Queue:
+        """Returns the queue (to be read on the running event loop) that the published events are put on."""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def publish(self, event_type: str, data: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        event = {"type": event_type, "time": time.time(), "data": data}
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_event, queue, event)
+            except RuntimeError:
+                # the event loop of the subscriber is closed
+                self.unsubscribe(queue)
+
+
+def _put_event(queue: asyncio.Queue, event: dict) -> None:
+    if queue.qsize() >= _MAX_QUEUED_EVENTS:
+        # a slow subscriber loses its oldest events rather than holding up the server
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def publish(event_type: str, **data) -> None:
+    event_bus = EventBus()
+    if event_bus.has_subscribers():
+        event_bus.publish(event_type, data)
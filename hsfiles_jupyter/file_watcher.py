@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from tornado.ioloop import IOLoop
+
+from .check_file_status import check_file_status
+from .sync_folder import SyncAction, run_sync_action
+from .utils import (
+    LocalChecksumCache,
+    logger,
+    get_auto_upload_delay,
+    get_auto_upload_enabled,
+    get_file_watcher_enabled,
+    get_file_watcher_poll_interval,
+    get_notebook_dir,
+)
+
+try:
+    # watchdog is an optional dependency - it uses inotify on Linux, without it the watcher polls the file system
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# local file paths (relative to the notebook dir) of the files in the data/contents folder of downloaded resources
+_WATCHED_FILE_PATH = re.compile(r'^Downloads/[^/]{32}/(?:[^/]{32}/)?data/contents/(?:[^/.][^/]*/)*[^/.][^/]*$')
+
+
+def is_watched_file_path(file_path: str) -> bool:
+    return _WATCHED_FILE_PATH.match(file_path) is not None
+
+
+class _FileChangeHandler(FileSystemEventHandler):
+    def __init__(self, file_watcher: "FileWatcher"):
+        super().__init__()
+        self._file_watcher = file_watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        if event.event_type in ('created', 'modified', 'closed'):
+            self._file_watcher.file_changed(event.src_path)
+        elif event.event_type == 'deleted':
+            self._file_watcher.file_deleted(event.src_path)
+        elif event.event_type == 'moved':
+            self._file_watcher.file_deleted(event.src_path)
+            self._file_watcher.file_changed(event.dest_path)
+
+
+class FileWatcher:
+    """A class to watch the data/contents folders of the downloaded resources for local file changes. Each changed
+    file is added to a dirty set and its cached checksum is invalidated. Once a dirty file has not changed for
+    HS_AUTO_UPLOAD_DELAY seconds its checksum is computed again (and the file is uploaded to HydroShare if
+    HS_AUTO_UPLOAD is enabled) and it is removed from the dirty set."""
+
+    # make this a singleton class
+    _instance: "FileWatcher" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._dirty_files = {}
+            instance._snapshot = {}
+            instance._observer = None
+            instance._stop_event = threading.Event()
+            instance._threads = []
+            instance._io_loop = None
+            cls._instance = instance
+        return cls._instance
+
+    def start(self) -> bool:
+        """Starts watching the Downloads folder if the watcher is enabled with HS_FILE_WATCHER. Returns True if the
+        watcher is running."""
+        if not get_file_watcher_enabled() or self.is_running():
+            return self.is_running()
+        # auto-uploads are run on the server event loop
+        self._io_loop = IOLoop.current()
+        self._stop_event.clear()
+        downloads_dir = Path(get_notebook_dir()) / 'Downloads'
+        if Observer is not None and downloads_dir.is_dir():
+            self._observer = Observer()
+            self._observer.schedule(_FileChangeHandler(self), str(downloads_dir), recursive=True)
+            self._observer.start()
+        else:
+            self._snapshot = self._scan()
+            self._start_thread(self._poll, 'hsfiles_jupyter_watcher')
+        self._start_thread(self._process_dirty_files, 'hsfiles_jupyter_watcher_debounce')
+        return True
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def is_running(self) -> bool:
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def is_dirty(self, file_path: str) -> bool:
+        with self._lock:
+            return file_path in self._dirty_files
+
+    def get_dirty_files(self) -> list[str]:
+        with self._lock:
+            return sorted(self._dirty_files)
+
+    def file_changed(self, absolute_file_path: str) -> None:
+        file_path = self._get_file_path(absolute_file_path)
+        if file_path is None:
+            return
+        checksum_cache = LocalChecksumCache()
+        try:
+            # files written by this extension (downloads) have their checksum cached as soon as they are written
+            if checksum_cache.get_cached_checksum(file_path) is not None:
+                return
+        except OSError:
+            # the file was deleted or moved after the change was detected
+            return
+        with self._lock:
+            self._dirty_files[file_path] = time.monotonic()
+        checksum_cache.invalidate(file_path)
+
+    def file_deleted(self, absolute_file_path: str) -> None:
+        file_path = self._get_file_path(absolute_file_path)
+        if file_path is None:
+            return
+        with self._lock:
+            self._dirty_files.pop(file_path, None)
+        LocalChecksumCache().invalidate(file_path)
+
+    @staticmethod
+    def _get_file_path(absolute_file_path: str):
+        try:
+            file_path = Path(absolute_file_path).relative_to(get_notebook_dir()).as_posix()
+        except ValueError:
+            return None
+        return file_path if is_watched_file_path(file_path) else None
+
+    def _start_thread(self, target, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _scan(self) -> dict[str, tuple]:
+        # stats of all the files in the data/contents folders of the downloaded resources
+        snapshot = {}
+        downloads_dir = Path(get_notebook_dir()) / 'Downloads'
+        for contents_dir in [*downloads_dir.glob('*/data/contents'), *downloads_dir.glob('*/*/data/contents')]:
+            for dir_path, dir_names, file_names in os.walk(contents_dir):
+                dir_names[:] = [dir_name for dir_name in dir_names if not dir_name.startswith('.')]
+                for file_name in file_names:
+                    absolute_file_path = os.path.join(dir_path, file_name)
+                    try:
+                        file_stat = os.stat(absolute_file_path)
+                    except OSError:
+                        continue
+                    snapshot[absolute_file_path] = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        return snapshot
+
+    def _poll(self) -> None:
+        while not self._stop_event.wait(get_file_watcher_poll_interval()):
+            try:
+                snapshot = self._scan()
+            except OSError as e:
+                logger.error(f"Failed to scan the Downloads folder for file changes. Error: {str(e)}")
+                continue
+            for absolute_file_path, stat_key in snapshot.items():
+                if self._snapshot.get(absolute_file_path) != stat_key:
+                    self.file_changed(absolute_file_path)
+            for absolute_file_path in self._snapshot.keys() - snapshot.keys():
+                self.file_deleted(absolute_file_path)
+            self._snapshot = snapshot
+
+    def _process_dirty_files(self) -> None:
+        while not self._stop_event.wait(1):
+            settled_before = time.monotonic() - get_auto_upload_delay()
+            with self._lock:
+                file_paths = [file_path for file_path, changed_at in self._dirty_files.items()
+                              if changed_at <= settled_before]
+            for file_path in file_paths:
+                self._process_dirty_file(file_path)
+
+    def _process_dirty_file(self, file_path: str) -> None:
+        with self._lock:
+            changed_at = self._dirty_files.get(file_path)
+        try:
+            LocalChecksumCache().get_checksum(file_path)
+        except FileNotFoundError:
+            # the file was deleted or moved - it is reported again if it comes back
+            self._remove_dirty_file(file_path, changed_at)
+            return
+        except OSError as e:
+            # e.g., the file can't be read - it is not retried until it changes again
+            logger.error(f"Failed to compute checksum for file: {file_path}. Error: {str(e)}")
+            self._remove_dirty_file(file_path, changed_at)
+            return
+        if not self._remove_dirty_file(file_path, changed_at):
+            return
+        if get_auto_upload_enabled():
+            self._io_loop.add_callback(auto_upload_file, file_path)
+
+    def _remove_dirty_file(self, file_path: str, changed_at: float) -> bool:
+        # the file is still dirty if it changed again while it was being processed
+        with self._lock:
+            if self._dirty_files.get(file_path) != changed_at:
+                return False
+            del self._dirty_files[file_path]
+            return True
+
+
+async def auto_upload_file(file_path: str):
+    """Uploads the local file 'file_path' to HydroShare if it is not in HydroShare or is different from the file in
+    HydroShare"""
+    try:
+        response = await check_file_status(file_path)
+        if "error" in response:
+            logger.error(f"Failed to auto-upload file: {file_path}. Error: {response['error']}")
+            return
+        if response["status"] == "Does not exist in HydroShare":
+            response = await run_sync_action(file_path, SyncAction.UPLOAD)
+        elif response["status"] == "Exists in HydroShare but they are different":
+            response = await run_sync_action(file_path, SyncAction.REPLACE_IN_HYDROSHARE)
+        if "error" in response:
+            logger.error(f"Failed to auto-upload file: {file_path}. Error: {response['error']}")
+    except Exception as e:
+        logger.error(f"Failed to auto-upload file: {file_path}. Error: {str(e)}")
@@ -0,0 +1,117 @@
+import os
+import threading
+from enum import Enum
+from pathlib import Path
+
+from .events import publish
+from .file_watcher import FileWatcher
+from .utils import (
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    HydroShareAuthError,
+    get_executor,
+    get_hs_relative_path,
+    get_local_absolute_file_path,
+    get_resource_id,
+    run_in_executor,
+)
+
+
+class FileSyncStatus(Enum):
+    SYNCED = 'synced'
+    MODIFIED = 'modified'
+    LOCAL_ONLY = 'local-only'
+    REMOTE_ONLY = 'remote-only'
+    # the local file has not been hashed yet - it is being hashed in the background
+    CHECKING = 'checking'
+
+
+# local folders whose files are being hashed in the background
+_folders_being_hashed = set()
+_folders_being_hashed_lock = threading.Lock()
+
+
+def _hash_files_in_background(folder_path: str, file_paths: list[str]) -> None:
+    with _folders_being_hashed_lock:
+        if folder_path in _folders_being_hashed:
+            return
+        _folders_being_hashed.add(folder_path)
+
+    def hash_files():
+        try:
+            LocalChecksumCache().get_checksums(file_paths, ignore_errors=True)
+        finally:
+            with _folders_being_hashed_lock:
+                _folders_being_hashed.discard(folder_path)
+        # the statuses of the files in the folder can now be reported
+        publish('checksums', path=folder_path)
+
+    get_executor().submit(hash_files)
+
+
+def get_folder_file_statuses(folder_path: str) -> dict[str, str]:
+    """Returns the sync status of each file directly in the local folder 'folder_path' and of each file that is only
+    in the same folder in HydroShare, keyed by file name. Only cached local checksums are used, so a listing never
+    waits for files to be hashed - files without a valid cached checksum are hashed in the background and are
+    reported as 'checking'. While the file watcher is running the files it reports as being modified are not hashed
+    until they stop changing."""
+    folder_path = Path(folder_path).as_posix()
+    hs_folder = get_hs_relative_path(folder_path)
+    rfc_manager = ResourceFileCacheManager()
+    if not rfc_manager.user_authorized():
+        raise HydroShareAuthError("User is not authorized with HydroShare")
+    resource = rfc_manager.get_resource(get_resource_id(folder_path))
+    rfc_manager.get_files(resource, folders=[hs_folder])
+    listing = rfc_manager.get_resource_file_cache(resource).get_listing()
+    remote_files = {os.path.basename(hs_file_path): listing.files.get(hs_file_path)
+                    for hs_file_path in listing.get_folder_files(hs_folder)}
+
+    checksum_cache = LocalChecksumCache()
+    file_watcher = FileWatcher()
+    watcher_running = file_watcher.is_running()
+    statuses = {}
+    files_to_hash = []
+    refresh_remote_files = False
+    with os.scandir(get_local_absolute_file_path(folder_path)) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if entry.name not in remote_files:
+                statuses[entry.name] = FileSyncStatus.LOCAL_ONLY.value
+                continue
+            file_path = f"{folder_path}/{entry.name}"
+            if watcher_running and file_watcher.is_dirty(file_path):
+                # the file is still being modified - the watcher hashes it once it stops changing
+                statuses[entry.name] = FileSyncStatus.CHECKING.value
+                continue
+            # the watcher may not have seen the latest change yet (e.g., made while the server was down or since its
+            # last poll), so the cached checksum is used only if the file is unchanged since it was computed
+            local_checksum = checksum_cache.get_cached_checksum(file_path, entry.stat())
+            # files added to the cache by this extension don't have a checksum until the cache is refreshed
+            remote_checksum = getattr(remote_files[entry.name], 'checksum', None)
+            if local_checksum is None or not remote_checksum:
+                statuses[entry.name] = FileSyncStatus.CHECKING.value
+                if local_checksum is None:
+                    files_to_hash.append(file_path)
+                refresh_remote_files = refresh_remote_files or not remote_checksum
+            elif local_checksum == remote_checksum:
+                statuses[entry.name] = FileSyncStatus.SYNCED.value
+            else:
+                statuses[entry.name] = FileSyncStatus.MODIFIED.value
+
+    for file_name in remote_files.keys() - statuses.keys():
+        statuses[file_name] = FileSyncStatus.REMOTE_ONLY.value
+    if files_to_hash:
+        _hash_files_in_background(folder_path, files_to_hash)
+    if refresh_remote_files:
+        rfc_manager.refresh_files_cache(resource)
+    return statuses
+
+
+async def check_folder_status(folder_path: str):
+    """Returns the sync status (with HydroShare) of all files in the local folder 'folder_path'"""
+    try:
+        statuses = await run_in_executor(get_folder_file_statuses, folder_path)
+    except HydroShareAuthError as e:
+        return {"error": str(e)}
+    return {"success": f"Status of {len(statuses)} file(s) in folder {folder_path}", "statuses": statuses}
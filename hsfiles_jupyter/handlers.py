@@ -1,24 +1,70 @@
+import asyncio
 import json
+import time
 from jupyter_server.utils import url_path_join
 from jupyter_server.base.handlers import APIHandler
 from tornado import web
+from tornado.iostream import StreamClosedError
 from .upload_file import upload_file_to_hydroshare
 from .refresh_file import refresh_file_from_hydroshare
 from .delete_file import delete_file_from_hydroshare
+from .replace_file import replace_file_in_hydroshare
 from .check_file_status import check_file_status
+from .batch import run_batch_operation, BATCH_OPERATIONS
+from .scheduler import cancel_file_transfers
+from .progress import get_transfer_progress
+from .sync_folder import sync_folder_with_hydroshare
+from .upload_folder import upload_folder_to_hydroshare
+from .folder_status import check_folder_status
+from .warmup import warm_up
+from .jobs import cancel_job, get_job, list_jobs, submit_job
+from .metrics import MetricsRegistry, format_server_timing, start_request_timings
+from .events import EventBus
+from .utils import ResourceFileCacheManager, get_event_keepalive_interval
 
 
-class BaseFileHandler(APIHandler):
-    async def handle_request(self, operation):
+class HydroShareAPIHandler(APIHandler):
+    """Reports the time spent in the main stages of serving the request (resource info, file listing, checksum,
+    transfer etc.) in the Server-Timing header of the response"""
+
+    async def prepare(self):
+        self._request_started = time.perf_counter()
+        self._request_timings = start_request_timings()
+        await super().prepare()
+
+    def finish(self, *args, **kwargs):
+        if not self._finished and hasattr(self, '_request_timings'):
+            total = time.perf_counter() - self._request_started
+            self.set_header('Server-Timing', format_server_timing(self._request_timings, total))
+        return super().finish(*args, **kwargs)
+
+
+class BaseFileHandler(HydroShareAPIHandler):
+    async def handle_request(self, operation, option_names=()):
         try:
             data = self.get_json_body()
             file_path = data['path']
-            response = await operation(file_path)
+            # optional request parameters that are passed on to the operation as keyword arguments
+            options = {name: data[name] for name in option_names if name in data}
+            response = await operation(file_path, **options)
+            await self.finish(json.dumps({"response": response}))
+        except Exception as e:
+            self.set_status(500)
+            await self.finish(json.dumps({"response": {"error": str(e)}}))
+
+class BatchFileHandler(HydroShareAPIHandler):
+    @web.authenticated
+    async def post(self, operation_name):
+        try:
+            data = self.get_json_body()
+            file_paths = data['paths']
+            response = await run_batch_operation(operation_name, file_paths)
             await self.finish(json.dumps({"response": response}))
         except Exception as e:
             self.set_status(500)
             await self.finish(json.dumps({"response": {"error": str(e)}}))
 
+
 class UploadFileHandler(BaseFileHandler):
     @web.authenticated
     async def post(self):
@@ -37,23 +83,172 @@ class DeleteFileHandler(BaseFileHandler):
         await self.handle_request(delete_file_from_hydroshare)
 
 
+class ReplaceFileHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(replace_file_in_hydroshare)
+
+
 class CheckFileStatusHandler(BaseFileHandler):
     @web.authenticated
     async def post(self):
         await self.handle_request(check_file_status)
 
 
+class CancelTransferHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(cancel_file_transfers)
+
+
+class SyncFolderHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(sync_folder_with_hydroshare,
+                                  option_names=('direction', 'dry_run', 'delete_extra_files'))
+
+
+class UploadFolderHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(upload_folder_to_hydroshare, option_names=('overwrite',))
+
+
+class CheckFolderStatusHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(check_folder_status)
+
+
+class TransferProgressHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(get_transfer_progress)
+
+
+class WarmUpHandler(BaseFileHandler):
+    @web.authenticated
+    async def post(self):
+        await self.handle_request(warm_up)
+
+
+class JobsHandler(HydroShareAPIHandler):
+    @web.authenticated
+    async def get(self):
+        await self.finish(json.dumps({"response": await list_jobs()}))
+
+    @web.authenticated
+    async def post(self):
+        try:
+            data = self.get_json_body()
+            # the other request parameters are passed on to the operation of the job
+            options = {name: value for name, value in data.items() if name not in ('operation', 'path')}
+            response = await submit_job(data['operation'], data['path'], options)
+            await self.finish(json.dumps({"response": response}))
+        except Exception as e:
+            self.set_status(500)
+            await self.finish(json.dumps({"response": {"error": str(e)}}))
+
+
+class JobHandler(HydroShareAPIHandler):
+    @web.authenticated
+    async def get(self, job_id):
+        await self.finish(json.dumps({"response": await get_job(job_id)}))
+
+    @web.authenticated
+    async def delete(self, job_id):
+        await self.finish(json.dumps({"response": await cancel_job(job_id)}))
+
+
+class EventStreamHandler(APIHandler):
+    """Streams the events published by the extension (transfer progress, job updates and changes to the cached
+    resource file listings) to the frontend as server-sent events"""
+
+    _queue = None
+
+    @web.authenticated
+    async def get(self):
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        # stops proxies (nginx) from buffering the stream
+        self.set_header('X-Accel-Buffering', 'no')
+        event_bus = EventBus()
+        self._queue = queue = event_bus.subscribe()
+        try:
+            self.write(": connected\n\n")
+            await self.flush()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), get_event_keepalive_interval())
+                    if event is None:
+                        break
+                    self.write(f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n")
+                except asyncio.TimeoutError:
+                    # a comment line that keeps an idle connection from being closed by proxies
+                    self.write(": keepalive\n\n")
+                await self.flush()
+        except StreamClosedError:
+            # the frontend closed the connection
+            pass
+        finally:
+            event_bus.unsubscribe(queue)
+
+    def on_connection_close(self):
+        # ends the stream without waiting for the next write to fail
+        if self._queue is not None:
+            self._queue.put_nowait(None)
+
+
+class CacheStatsHandler(HydroShareAPIHandler):
+    @web.authenticated
+    async def get(self):
+        stats = ResourceFileCacheManager().get_cache_stats()
+        await self.finish(json.dumps({"response": stats}))
+
+
+class MetricsHandler(HydroShareAPIHandler):
+    @web.authenticated
+    async def get(self):
+        await self.finish(MetricsRegistry().render(), set_content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def setup_handlers(web_app):
     host_pattern = '.*$'
     base_url = web_app.settings['base_url']
     upload_route_pattern = url_path_join(base_url, 'hydroshare', 'upload')
     refresh_route_pattern = url_path_join(base_url, 'hydroshare', 'refresh')
     delete_route_pattern = url_path_join(base_url, 'hydroshare', 'delete')
+    replace_route_pattern = url_path_join(base_url, 'hydroshare', 'replace')
     check_file_status_route_pattern = url_path_join(base_url, 'hydroshare', 'status')
+    cancel_transfer_route_pattern = url_path_join(base_url, 'hydroshare', 'cancel')
+    sync_folder_route_pattern = url_path_join(base_url, 'hydroshare', 'sync')
+    upload_folder_route_pattern = url_path_join(base_url, 'hydroshare', 'upload-folder')
+    check_folder_status_route_pattern = url_path_join(base_url, 'hydroshare', 'folder-status')
+    transfer_progress_route_pattern = url_path_join(base_url, 'hydroshare', 'progress')
+    cache_stats_route_pattern = url_path_join(base_url, 'hydroshare', 'cache')
+    warm_up_route_pattern = url_path_join(base_url, 'hydroshare', 'warmup')
+    metrics_route_pattern = url_path_join(base_url, 'hydroshare', 'metrics')
+    jobs_route_pattern = url_path_join(base_url, 'hydroshare', 'jobs')
+    events_route_pattern = url_path_join(base_url, 'hydroshare', 'events')
+    job_route_pattern = url_path_join(base_url, 'hydroshare', 'jobs', '([0-9a-f]{32})')
+    batch_route_pattern = url_path_join(base_url, 'hydroshare', 'batch', f"({'|'.join(BATCH_OPERATIONS)})")
     web_app.add_handlers(host_pattern,
                          [(upload_route_pattern, UploadFileHandler),
                           (refresh_route_pattern, RefreshFileHandler),
                           (delete_route_pattern, DeleteFileHandler),
-                          (check_file_status_route_pattern, CheckFileStatusHandler)
+                          (replace_route_pattern, ReplaceFileHandler),
+                          (check_file_status_route_pattern, CheckFileStatusHandler),
+                          (batch_route_pattern, BatchFileHandler),
+                          (cancel_transfer_route_pattern, CancelTransferHandler),
+                          (cache_stats_route_pattern, CacheStatsHandler),
+                          (transfer_progress_route_pattern, TransferProgressHandler),
+                          (sync_folder_route_pattern, SyncFolderHandler),
+                          (upload_folder_route_pattern, UploadFolderHandler),
+                          (check_folder_status_route_pattern, CheckFolderStatusHandler),
+                          (warm_up_route_pattern, WarmUpHandler),
+                          (metrics_route_pattern, MetricsHandler),
+                          (jobs_route_pattern, JobsHandler),
+                          (job_route_pattern, JobHandler),
+                          (events_route_pattern, EventStreamHandler)
                           ]
                          )
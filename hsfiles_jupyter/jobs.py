@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from functools import partial
+
+from .batch import run_batch_job
+from .delete_file import delete_file_from_hydroshare
+from .events import publish
+from .progress import TransferProgressTracker
+from .refresh_file import refresh_file_from_hydroshare
+from .replace_file import replace_file_in_hydroshare
+from .scheduler import TransferScheduler
+from .sync_folder import sync_folder_with_hydroshare
+from .upload_file import upload_file_to_hydroshare
+from .upload_folder import upload_folder_to_hydroshare
+from .utils import (
+    logger,
+    get_job_retention,
+    get_jobs_file_path,
+    get_jobs_persist_enabled,
+)
+
+# the operations that can be run as jobs and the names of their optional request parameters
+JOB_OPERATIONS = {
+    'upload': (upload_file_to_hydroshare, ()),
+    'refresh': (refresh_file_from_hydroshare, ()),
+    'delete': (delete_file_from_hydroshare, ()),
+    'replace': (replace_file_in_hydroshare, ()),
+    'upload-folder': (upload_folder_to_hydroshare, ('overwrite',)),
+    'sync': (sync_folder_with_hydroshare, ('direction', 'dry_run', 'delete_extra_files')),
+    # the path of a batch job is the folder of its files
+    'batch/upload': (partial(run_batch_job, 'upload'), ('paths',)),
+    'batch/refresh': (partial(run_batch_job, 'refresh'), ('paths',)),
+    'batch/delete': (partial(run_batch_job, 'delete'), ('paths',)),
+}
+
+
+class JobStatus(Enum):
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    # the server was stopped while the job was running
+    INTERRUPTED = 'interrupted'
+
+
+@dataclass
+class Job:
+    operation: str
+    path: str
+    options: dict = field(default_factory=dict)
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = JobStatus.RUNNING.value
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    result: dict = None
+    # progress of the transfer when the job finished - the progress of a running job is read from the tracker
+    progress: dict = None
+    cancel_requested: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self.status == JobStatus.RUNNING.value
+
+    def to_dict(self) -> dict:
+        job = asdict(self)
+        if self.running:
+            job["progress"] = TransferProgressTracker().get_progress(self.path)
+        return job
+
+
+class JobManager:
+    """A class to run file operations (uploads, downloads, folder syncs etc.) as jobs in the background of the server,
+    so that the frontend gets a job id right away instead of holding a request open for the whole transfer, and can
+    poll or cancel the job. Finished jobs are kept for HS_JOB_RETENTION seconds. With HS_JOBS_PERSIST the jobs are
+    also saved to disk, so that their outcome is known after the server is restarted."""
+
+    # make this a singleton class
+    _instance: "JobManager" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._jobs = {}
+            instance._tasks = {}
+            instance._loaded = False
+            cls._instance = instance
+        return cls._instance
+
+    def submit(self, operation_name: str, path: str, options: dict = None) -> Job:
+        """Starts the operation 'operation_name' on the file or folder 'path' as a job on the running event loop."""
+        operation, option_names = JOB_OPERATIONS[operation_name]
+        options = {name: value for name, value in (options or {}).items() if name in option_names}
+        job = Job(operation=operation_name, path=path, options=options)
+        self._load()
+        with self._lock:
+            self._purge_finished()
+            self._jobs[job.job_id] = job
+            self._tasks[job.job_id] = asyncio.ensure_future(self._run(job, operation))
+        self._save()
+        publish('job', **job.to_dict())
+        return job
+
+    def get_job(self, job_id: str):
+        self._load()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def list_jobs(self) -> list[dict]:
+        self._load()
+        with self._lock:
+            self._purge_finished()
+            return [job.to_dict() for job in sorted(self._jobs.values(), key=lambda job: job.created_at)]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a running job along with its queued and running transfers. Returns False if the job is not
+        running."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.running or job.cancel_requested:
+                return False
+            job.cancel_requested = True
+            task = self._tasks.get(job_id)
+        scheduler = TransferScheduler()
+        folder_prefix = f"{job.path.rstrip('/')}/"
+        # a batch job only transfers its own files, not all the files in their folder
+        batch_paths = set(job.options.get('paths') or ())
+        for transfer in scheduler.list_transfers():
+            if batch_paths:
+                job_transfer = transfer["path"] in batch_paths
+            else:
+                job_transfer = transfer["path"] == job.path or transfer["path"].startswith(folder_prefix)
+            if job_transfer:
+                scheduler.cancel(transfer["transfer_id"])
+        if task is not None:
+            task.cancel()
+        return True
+
+    async def _run(self, job: Job, operation) -> None:
+        try:
+            result = await operation(job.path, **job.options)
+        except asyncio.CancelledError:
+            result = {"error": f"Job to {job.operation} {job.path} was cancelled"}
+        except Exception as e:
+            err_msg = f"Failed to {job.operation} {job.path}. Error: {str(e)}"
+            logger.error(err_msg)
+            result = {"error": err_msg}
+        progress = TransferProgressTracker().get_progress(job.path)
+        with self._lock:
+            job.result = result
+            job.progress = progress
+            job.finished_at = time.time()
+            if job.cancel_requested:
+                job.status = JobStatus.CANCELLED.value
+            elif "error" in result:
+                job.status = JobStatus.FAILED.value
+            else:
+                job.status = JobStatus.SUCCEEDED.value
+            self._tasks.pop(job.job_id, None)
+        self._save()
+        publish('job', **job.to_dict())
+
+    def _purge_finished(self) -> None:
+        oldest_finished_at = time.time() - get_job_retention()
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if not job.running and job.finished_at < oldest_finished_at]
+        for job_id in finished:
+            del self._jobs[job_id]
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not get_jobs_persist_enabled():
+                return
+            try:
+                with open(get_jobs_file_path()) as jobs_file:
+                    saved_jobs = json.load(jobs_file)
+            except FileNotFoundError:
+                return
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to load the saved jobs. Error: {str(e)}")
+                return
+            for saved_job in saved_jobs:
+                job = Job(**saved_job)
+                if job.running:
+                    # the job was running when the server was stopped
+                    job.status = JobStatus.INTERRUPTED.value
+                    job.finished_at = time.time()
+                self._jobs.setdefault(job.job_id, job)
+            self._purge_finished()
+
+    def _save(self) -> None:
+        if not get_jobs_persist_enabled():
+            return
+        with self._lock:
+            saved_jobs = [asdict(job) for job in self._jobs.values()]
+        jobs_file_path = get_jobs_file_path()
+        temp_file_path = jobs_file_path.with_name(f"{jobs_file_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            jobs_file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file_path, 'w') as jobs_file:
+                json.dump(saved_jobs, jobs_file)
+            # the jobs file is replaced atomically so that it is never left half written
+            os.replace(temp_file_path, jobs_file_path)
+        except OSError as e:
+            logger.error(f"Failed to save the jobs. Error: {str(e)}")
+            try:
+                os.remove(temp_file_path)
+            except OSError:
+                pass
+
+
+async def submit_job(operation: str, path: str, options: dict = None):
+    """Starts the operation 'operation' on the file or folder 'path' as a background job"""
+    if operation not in JOB_OPERATIONS:
+        return {"error": f"Invalid job operation: {operation}"}
+    job = JobManager().submit(operation, path, options)
+    return {"success": f"Started job to {operation} {path}", "job": job.to_dict()}
+
+
+async def get_job(job_id: str):
+    job = JobManager().get_job(job_id)
+    if job is None:
+        return {"error": f"Job {job_id} was not found"}
+    return {"success": f"Job to {job['operation']} {job['path']} is {job['status']}", "job": job}
+
+
+async def list_jobs():
+    jobs = JobManager().list_jobs()
+    return {"success": f"{len(jobs)} job(s)", "jobs": jobs}
+
+
+async def cancel_job(job_id: str):
+    if not JobManager().cancel(job_id):
+        return {"error": f"Job {job_id} is not running"}
+    return {"success": f"Cancelled job {job_id}"}
@@ -0,0 +1,122 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds (seconds) of the stage duration histogram buckets
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# (stage, duration) of the stages timed while serving the current request - None outside of a request
+_request_timings: contextvars.ContextVar = contextvars.ContextVar('hsfiles_jupyter_request_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = _DURATION_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+
+
+class MetricsRegistry:
+    """A class to collect the timings of the main stages of the file operations (as histograms) and counters of cache
+    hits, misses, retries and bytes transferred, rendered in the Prometheus text format for the metrics endpoint."""
+
+    # make this a singleton class
+    _instance: "MetricsRegistry" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._histograms = {}
+            instance._counters = {}
+            cls._instance = instance
+        return cls._instance
+
+    def observe(self, stage: str, duration: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(duration)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = ["# TYPE hsfiles_stage_duration_seconds histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    lines.append(f'hsfiles_stage_duration_seconds_bucket{{stage="{stage}",le="{upper_bound}"}}'
+                                 f' {cumulative_count}')
+                lines.append(f'hsfiles_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'hsfiles_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'hsfiles_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+            counter_names = sorted({name for name, _ in self._counters})
+            for counter_name in counter_names:
+                lines.append(f"# TYPE hsfiles_{counter_name}_total counter")
+                for (name, labels), value in sorted(self._counters.items()):
+                    if name != counter_name:
+                        continue
+                    label_str = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+                    lines.append(f"hsfiles_{name}_total{{{label_str}}} {value}" if label_str
+                                 else f"hsfiles_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+def start_request_timings() -> list:
+    """Starts collecting the stage timings of the request being served in the current context."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def record_timing(stage: str, duration: float) -> None:
+    """Adds the 'duration' (seconds) of the 'stage' to the stage duration histogram and to the timings of the request
+    being served."""
+    MetricsRegistry().observe(stage, duration)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, duration))
+
+
+@contextmanager
+def timed(stage: str):
+    """Times the enclosed block as the 'stage'."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - started)
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    MetricsRegistry().increment(name, value, **labels)
+
+
+def format_server_timing(timings: list, total: float) -> str:
+    """Returns the value of the Server-Timing header for the stage 'timings' of a request. Repeated stages are summed
+    up."""
+    durations = {}
+    counts = {}
+    for stage, duration in timings:
+        durations[stage] = durations.get(stage, 0) + duration
+        counts[stage] = counts.get(stage, 0) + 1
+    metrics = [f'{stage};dur={duration * 1000:.1f};desc="{counts[stage]} call(s)"'
+               for stage, duration in durations.items()]
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
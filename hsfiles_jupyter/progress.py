@@ -0,0 +1,119 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .events import publish
+from .metrics import increment
+from .utils import get_progress_retention
+
+# minimum number of seconds between two progress events of a transfer
+_PROGRESS_EVENT_INTERVAL = 0.5
+
+
+@dataclass
+class TransferProgress:
+    file_path: str
+    operation: str
+    total_bytes: int
+    bytes_done: int = 0
+    attempt: int = 1
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+    error: str = None
+    published_at: float = 0
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        throughput = self.bytes_done / elapsed if elapsed > 0 else 0
+        remaining_bytes = max(self.total_bytes - self.bytes_done, 0)
+        eta = remaining_bytes / throughput if throughput > 0 and not self.done else None
+        return {
+            "path": self.file_path,
+            "operation": self.operation,
+            "total_bytes": self.total_bytes,
+            "bytes_done": self.bytes_done,
+            "percent": round(100 * self.bytes_done / self.total_bytes, 1) if self.total_bytes else 100.0,
+            "attempt": self.attempt,
+            "throughput": round(throughput),
+            "eta": round(eta, 1) if eta is not None else None,
+            "done": self.done,
+            "error": self.error,
+        }
+
+
+class TransferProgressTracker:
+    """A class to track the progress of file transfers with HydroShare. Transfers report their progress from worker
+    threads and the frontend polls it. A finished transfer is kept for HS_PROGRESS_RETENTION seconds so that the
+    frontend can see that it completed."""
+
+    # make this a singleton class
+    _instance: "TransferProgressTracker" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._transfers = {}
+            cls._instance = instance
+        return cls._instance
+
+    def start(self, file_path: str, operation: str, total_bytes: int) -> TransferProgress:
+        progress = TransferProgress(file_path=file_path, operation=operation, total_bytes=total_bytes)
+        with self._lock:
+            self._purge_finished()
+            self._transfers[file_path] = progress
+        self._publish(progress, force=True)
+        return progress
+
+    def restart(self, progress: TransferProgress) -> None:
+        """Resets the progress of a transfer that is being retried from the beginning."""
+        with self._lock:
+            progress.bytes_done = 0
+            progress.attempt += 1
+        self._publish(progress, force=True)
+
+    def add_bytes(self, progress: TransferProgress, byte_count: int) -> None:
+        with self._lock:
+            progress.bytes_done += byte_count
+        increment('bytes_transferred', byte_count, direction=progress.operation)
+        self._publish(progress)
+
+    def finish(self, progress: TransferProgress, error: str = None) -> None:
+        with self._lock:
+            progress.finished_at = time.monotonic()
+            progress.error = error
+        self._publish(progress, force=True)
+
+    @staticmethod
+    def _publish(progress: TransferProgress, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - progress.published_at < _PROGRESS_EVENT_INTERVAL:
+            return
+        progress.published_at = now
+        publish('progress', **progress.to_dict())
+
+    def get_progress(self, file_path: str) -> dict:
+        with self._lock:
+            self._purge_finished()
+            progress = self._transfers.get(file_path)
+            return progress.to_dict() if progress is not None else None
+
+    def _purge_finished(self) -> None:
+        now = time.monotonic()
+        retention = get_progress_retention()
+        finished = [file_path for file_path, progress in self._transfers.items()
+                    if progress.done and now - progress.finished_at > retention]
+        for file_path in finished:
+            del self._transfers[file_path]
+
+
+async def get_transfer_progress(file_path: str):
+    """Returns the progress of the most recent transfer of the file 'file_path'"""
+    progress = TransferProgressTracker().get_progress(file_path)
+    if progress is None:
+        return {"error": f"There is no transfer in progress for file {file_path}"}
+    return {"success": f"{progress['percent']}% of file {file_path} transferred", "progress": progress}
@@ -1,36 +1,110 @@
+import hashlib
 import os
+import posixpath
+import shutil
+import tempfile
+from urllib.parse import quote
 
+from hsclient.hydroshare import Resource
+
+from .progress import TransferProgressTracker
+from .scheduler import TransferPriority, TransferScheduler, check_transfer_cancelled
 from .utils import (
+    LocalChecksumCache,
     ResourceFileCacheManager,
     logger,
     HydroShareAuthError,
+    HydroShareResourceInfo,
+    run_in_executor,
+    get_download_chunk_size,
     get_local_absolute_file_path,
 )
 
 
-async def refresh_file_from_hydroshare(file_path: str):
+def stream_file_download(resource: Resource, hs_file_relative_path: str, file_path: str, checksum: str) -> None:
+    """Downloads the resource file to a temporary file next to the local file 'file_path', computing its md5 while
+    streaming. The local file is replaced (atomically) only after the download is complete and the checksum matches
+    the 'checksum' of the file in HydroShare, so a failed download never leaves a truncated local file."""
+    absolute_file_path = get_local_absolute_file_path(file_path)
+    file_dir, file_name = os.path.split(absolute_file_path)
+    # the url is encoded here and requested with the http session directly - HydroShareSession.get() encodes the url
+    # it is given, which double encodes a quoted path and cuts an unquoted path at a '#'
+    hs_session = resource._hs_session
+    download_url = (f"{hs_session.base_url}/resource/{resource.resource_id}/data/contents/"
+                    f"{quote(hs_file_relative_path)}/")
+    response = hs_session._session.get(download_url, allow_redirects=True, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"Failed GET {download_url}, status_code {response.status_code}")
+
+    tracker = TransferProgressTracker()
+    progress = tracker.start(file_path, 'download', int(response.headers.get('Content-Length', 0)))
+    md5_hash = hashlib.md5()
+    temp_fd, temp_file_path = tempfile.mkstemp(prefix=f".{file_name}.", suffix=".hsdownload", dir=file_dir)
+    try:
+        with os.fdopen(temp_fd, "wb") as temp_file:
+            for chunk in response.iter_content(chunk_size=get_download_chunk_size()):
+                check_transfer_cancelled()
+                temp_file.write(chunk)
+                md5_hash.update(chunk)
+                tracker.add_bytes(progress, len(chunk))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        downloaded_checksum = md5_hash.hexdigest()
+        if checksum and downloaded_checksum != checksum:
+            raise ValueError(f"Checksum of the downloaded file ({downloaded_checksum}) doesn't match the checksum"
+                             f" of the file in HydroShare ({checksum})")
+        if os.path.exists(absolute_file_path):
+            shutil.copymode(absolute_file_path, temp_file_path)
+        else:
+            os.chmod(temp_file_path, 0o644)
+        os.replace(temp_file_path, absolute_file_path)
+    except Exception as e:
+        tracker.finish(progress, error=str(e))
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+    finally:
+        response.close()
+
+    tracker.finish(progress)
+    LocalChecksumCache().set_checksum(file_path, downloaded_checksum)
+
+
+async def refresh_file_from_hydroshare(file_path: str, res_info: HydroShareResourceInfo = None):
     """Download the file 'file_path' from HydroShare and replace the local file"""
 
     rfc_manager = ResourceFileCacheManager()
-    try:
-        res_info = rfc_manager.get_hydroshare_resource_info(file_path)
-    except HydroShareAuthError as e:
-        return {"error": str(e)}
+    if res_info is None:
+        try:
+            res_info = await run_in_executor(rfc_manager.get_hydroshare_resource_info, file_path)
+        except HydroShareAuthError as e:
+            return {"error": str(e)}
 
-    if res_info.hs_file_relative_path not in res_info.files:
-        file_not_found = True
+    res_file = res_info.files.get(res_info.hs_file_relative_path)
+    if res_file is None:
         if not res_info.refresh:
-            files, _ = rfc_manager.get_files(res_info.resource, refresh=True)
-            file_not_found = res_info.hs_file_relative_path not in files
-        if file_not_found:
+            files, _ = await run_in_executor(rfc_manager.get_files, res_info.resource, refresh=True,
+                                             folders=[posixpath.dirname(res_info.hs_file_relative_path)])
+            res_file = files.get(res_info.hs_file_relative_path)
+        if res_file is None:
             err_msg = f'File {res_info.hs_file_path} is not found in HydroShare resource: {res_info.resource_id}'
             return {"error": err_msg}
 
-    file_dir = os.path.dirname(file_path)
-    downloaded_file_path = get_local_absolute_file_path(file_dir)
+    # files added to the cache by this extension don't have a checksum until the cache is refreshed
+    remote_checksum = getattr(res_file, 'checksum', None)
+    if remote_checksum and os.path.exists(get_local_absolute_file_path(file_path)):
+        local_checksum = await run_in_executor(rfc_manager.compute_checksum, file_path)
+        if local_checksum == remote_checksum:
+            success_msg = (f'File {res_info.hs_file_path} is identical to the file in'
+                           f' HydroShare resource: {res_info.resource_id}. No need to replace it.')
+            return {"success": success_msg}
 
     try:
-        res_info.resource.file_download(path=res_info.hs_file_relative_path, save_path=downloaded_file_path)
+        await TransferScheduler().run(res_info.resource_id, file_path, stream_file_download, res_info.resource,
+                                      res_info.hs_file_relative_path, file_path, remote_checksum,
+                                      priority=TransferPriority.NORMAL)
         success_msg = (f'File {res_info.hs_file_path} replaced successfully from'
                        f' HydroShare resource: {res_info.resource_id}')
         return {"success": success_msg}
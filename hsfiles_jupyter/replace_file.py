@@ -0,0 +1,113 @@
+import posixpath
+import uuid
+
+from hsclient.hydroshare import File, Resource
+
+from .scheduler import TransferPriority, TransferScheduler
+from .upload_file import stream_file_upload, upload_file_to_hydroshare
+from .utils import (
+    FileCacheUpdateType,
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    logger,
+    HydroShareAuthError,
+    HydroShareWrapper,
+    HydroShareResourceInfo,
+    get_local_absolute_file_path,
+    run_in_executor,
+)
+
+
+def replace_file(resource: Resource, absolute_file_path: str, hs_file_relative_path: str, file_path: str) -> None:
+    """Uploads the local file under a temporary name next to the file 'hs_file_relative_path' of the resource, renames
+    the file in HydroShare to a backup name, renames the uploaded copy to take its place and deletes the backup.
+    HydroShare has no atomic replace - the file is missing from the resource between the two renames. If the upload or
+    the first rename fails the file in HydroShare is left as it was. If the uploaded copy can't be renamed (the renames
+    are retried) the backup is renamed back, and if that fails too the error says where both copies are."""
+    folder, file_name = posixpath.split(hs_file_relative_path)
+    suffix = uuid.uuid4().hex[:8]
+    temporary_file_name = f"{file_name}.{suffix}.hsfiles-upload"
+    temporary_file_path = posixpath.join(folder, temporary_file_name)
+    backup_file_path = posixpath.join(folder, f"{file_name}.{suffix}.hsfiles-backup")
+    hs_wrapper = HydroShareWrapper()
+    stream_file_upload(resource, absolute_file_path, folder, file_path, upload_file_name=temporary_file_name)
+    try:
+        hs_wrapper.execute_with_retry(lambda: resource.file_rename(hs_file_relative_path, backup_file_path))
+    except Exception:
+        # the file in HydroShare is unchanged - the uploaded copy is removed
+        _delete_file(resource, temporary_file_path)
+        raise
+    try:
+        hs_wrapper.execute_with_retry(lambda: resource.file_rename(temporary_file_path, hs_file_relative_path))
+    except Exception as e:
+        try:
+            hs_wrapper.execute_with_retry(lambda: resource.file_rename(backup_file_path, hs_file_relative_path))
+        except Exception:
+            raise Exception(f"The file in HydroShare was renamed to {backup_file_path} and the local file was uploaded"
+                            f" as {temporary_file_path}, but neither could be renamed to {hs_file_relative_path}."
+                            f" Rename one of them to {hs_file_relative_path} in HydroShare to recover the file."
+                            f" Error: {str(e)}") from e
+        _delete_file(resource, temporary_file_path)
+        raise Exception(f"The uploaded file could not be renamed to {hs_file_relative_path} - the file in HydroShare"
+                        f" was left as it was. Error: {str(e)}") from e
+    _delete_file(resource, backup_file_path)
+
+
+def _delete_file(resource: Resource, hs_file_relative_path: str) -> None:
+    # deletes a temporary or backup file of a replace - a leftover file is only logged
+    try:
+        HydroShareWrapper().execute_with_retry(lambda: resource.file_delete(hs_file_relative_path))
+    except Exception as e:
+        logger.error(f"Failed to delete the file: {hs_file_relative_path} from HydroShare"
+                     f" resource: {resource.resource_id}. Error: {str(e)}")
+
+
+async def replace_file_in_hydroshare(file_path: str, res_info: HydroShareResourceInfo = None):
+    """Replaces the file 'file_path' in HydroShare resource with the local file, or uploads the local file if it is not
+    in HydroShare. Nothing is transferred if the files are identical."""
+
+    rfc_manager = ResourceFileCacheManager()
+    if res_info is None:
+        try:
+            res_info = await run_in_executor(rfc_manager.get_hydroshare_resource_info, file_path)
+        except HydroShareAuthError as e:
+            return {"error": str(e)}
+
+    res_file = res_info.files.get(res_info.hs_file_relative_path)
+    if res_file is None and not res_info.refresh:
+        files, _ = await run_in_executor(rfc_manager.get_files, res_info.resource, refresh=True,
+                                         folders=[posixpath.dirname(res_info.hs_file_relative_path)])
+        res_file = files.get(res_info.hs_file_relative_path)
+    if res_file is None:
+        return await upload_file_to_hydroshare(file_path, res_info)
+
+    # the local checksum is usually cached by the status check that preceded the replace
+    local_checksum = await run_in_executor(rfc_manager.compute_checksum, file_path)
+    # a file uploaded while it was being modified has no checksum until the cache is refreshed
+    if local_checksum == getattr(res_file, 'checksum', None):
+        return {"success": f'File {res_info.hs_file_path} in HydroShare resource: {res_info.resource_id} is identical'
+                           f' to the local file'}
+
+    absolute_local_file_path = get_local_absolute_file_path(file_path)
+    try:
+        await TransferScheduler().run(res_info.resource_id, file_path, replace_file, res_info.resource,
+                                      absolute_local_file_path, res_info.hs_file_relative_path, file_path,
+                                      priority=TransferPriority.LOW)
+    except Exception as e:
+        err_msg = (f'Failed to replace file: {res_info.hs_file_path} in HydroShare resource: {res_info.resource_id}.'
+                   f' Error: {str(e)}')
+        logger.error(err_msg)
+        # the file may have been left under its temporary or backup name
+        rfc_manager.refresh_files_cache(res_info.resource)
+        return {"error": err_msg}
+
+    # the cached listing is updated with the checksum of the uploaded file instead of being refreshed - unless the
+    # local file changed while it was being uploaded, in which case the uploaded content is not known
+    if await run_in_executor(LocalChecksumCache().get_cached_checksum, file_path) == local_checksum:
+        replaced_file = File(res_info.hs_file_relative_path, getattr(res_file, 'url', None), local_checksum)
+    else:
+        replaced_file = res_info.hs_file_relative_path
+        rfc_manager.refresh_files_cache(res_info.resource)
+    rfc_manager.update_resource_files_cache(resource=res_info.resource, file_path=replaced_file,
+                                            update_type=FileCacheUpdateType.ADD)
+    return {"success": f'File {res_info.hs_file_path} was replaced in HydroShare resource: {res_info.resource_id}'}
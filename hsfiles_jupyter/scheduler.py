@@ -0,0 +1,211 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable
+
+from .metrics import record_timing, timed
+from .utils import (
+    logger,
+    get_max_transfers,
+    get_max_transfers_per_resource,
+)
+
+
+class TransferPriority(IntEnum):
+    """Transfers with a lower value are started first."""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class TransferCancelledError(Exception):
+    """Exception raised when a scheduled transfer has been cancelled."""
+    pass
+
+
+@dataclass(order=True)
+class ScheduledTransfer:
+    priority: int
+    sequence: int
+    resource_id: str = field(compare=False)
+    file_path: str = field(compare=False)
+    operation: Callable = field(compare=False, repr=False)
+    transfer_id: str = field(compare=False, default_factory=lambda: uuid.uuid4().hex)
+    future: Future = field(compare=False, default_factory=Future, repr=False)
+    cancel_event: threading.Event = field(compare=False, default_factory=threading.Event, repr=False)
+    running: bool = field(compare=False, default=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "transfer_id": self.transfer_id,
+            "resource_id": self.resource_id,
+            "path": self.file_path,
+            "priority": TransferPriority(self.priority).name,
+            "running": self.running,
+        }
+
+
+_current_transfer = threading.local()
+
+
+def check_transfer_cancelled() -> None:
+    """Raises TransferCancelledError if the transfer running in the current worker thread has been cancelled.
+    Long-running transfer functions call this between chunks so that a running transfer can be stopped."""
+    transfer = getattr(_current_transfer, 'transfer', None)
+    if transfer is not None and transfer.cancel_event.is_set():
+        raise TransferCancelledError(f"Transfer of file {transfer.file_path} was cancelled")
+
+
+def wait_before_retry(delay: float) -> None:
+    """Waits 'delay' seconds before a transfer running in the current worker thread is retried. The wait ends early
+    (raising TransferCancelledError) if the transfer is cancelled."""
+    transfer = getattr(_current_transfer, 'transfer', None)
+    if transfer is None:
+        time.sleep(delay)
+        return
+    transfer.cancel_event.wait(delay)
+    check_transfer_cancelled()
+
+
+class TransferScheduler:
+    """A class to schedule file transfers with HydroShare. Transfers run in a global worker pool of HS_MAX_TRANSFERS
+    threads, at most HS_MAX_TRANSFERS_PER_RESOURCE transfers run concurrently against the same resource, and queued
+    transfers are started in priority order."""
+
+    # make this a singleton class
+    _instance: "TransferScheduler" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            instance._queue = []
+            instance._sequence = itertools.count()
+            instance._transfers = {}
+            instance._running_per_resource = {}
+            instance._running_count = 0
+            instance._executor = ThreadPoolExecutor(max_workers=get_max_transfers(),
+                                                    thread_name_prefix='hsfiles_jupyter_transfer')
+            cls._instance = instance
+        return cls._instance
+
+    def submit(self, resource_id: str, file_path: str, operation: Callable, *args,
+               priority: TransferPriority = TransferPriority.NORMAL, **kwargs) -> ScheduledTransfer:
+        """Queues the blocking callable 'operation' as a transfer for the file 'file_path' in the resource
+        'resource_id'. The result of the transfer is available from the returned transfer's future."""
+        # the transfer runs in a copy of the current context, so that its timings are added to the timings of the
+        # request that scheduled it
+        context = contextvars.copy_context()
+        submitted_at = time.perf_counter()
+
+        def run_operation():
+            record_timing('transfer_queue', time.perf_counter() - submitted_at)
+            with timed('transfer'):
+                return operation(*args, **kwargs)
+
+        transfer = ScheduledTransfer(priority=int(priority), sequence=next(self._sequence),
+                                     resource_id=resource_id, file_path=file_path,
+                                     operation=lambda: context.run(run_operation))
+        with self._lock:
+            self._transfers[transfer.transfer_id] = transfer
+            heapq.heappush(self._queue, transfer)
+        self._dispatch()
+        return transfer
+
+    async def run(self, resource_id: str, file_path: str, operation: Callable, *args,
+                  priority: TransferPriority = TransferPriority.NORMAL, **kwargs):
+        """Schedules a transfer and waits (without blocking the event loop) for its result."""
+        transfer = self.submit(resource_id, file_path, operation, *args, priority=priority, **kwargs)
+        return await asyncio.wrap_future(transfer.future)
+
+    def cancel(self, transfer_id: str) -> bool:
+        """Cancels a queued or running transfer. A queued transfer is never started. A running transfer is signalled
+        to stop and its waiters are released immediately with TransferCancelledError."""
+        with self._lock:
+            transfer = self._transfers.get(transfer_id)
+            if transfer is None or transfer.future.done():
+                return False
+            transfer.cancel_event.set()
+            if not transfer.running:
+                self._queue.remove(transfer)
+                heapq.heapify(self._queue)
+                del self._transfers[transfer_id]
+        try:
+            transfer.future.set_exception(
+                TransferCancelledError(f"Transfer of file {transfer.file_path} was cancelled")
+            )
+        except InvalidStateError:
+            # the running transfer completed before we could cancel it
+            return False
+        return True
+
+    def cancel_file_transfers(self, file_path: str) -> int:
+        """Cancels all queued and running transfers for the file 'file_path'. Returns the number of cancelled
+        transfers."""
+        with self._lock:
+            transfer_ids = [transfer.transfer_id for transfer in self._transfers.values()
+                            if transfer.file_path == file_path]
+        return sum(self.cancel(transfer_id) for transfer_id in transfer_ids)
+
+    def list_transfers(self) -> list[dict]:
+        with self._lock:
+            return [transfer.to_dict() for transfer in self._transfers.values()]
+
+    def _dispatch(self) -> None:
+        # start as many queued transfers as the global and per resource limits allow, in priority order
+        max_per_resource = get_max_transfers_per_resource()
+        with self._lock:
+            deferred = []
+            while self._queue and self._running_count < get_max_transfers():
+                transfer = heapq.heappop(self._queue)
+                if self._running_per_resource.get(transfer.resource_id, 0) >= max_per_resource:
+                    deferred.append(transfer)
+                    continue
+                transfer.running = True
+                self._running_count += 1
+                self._running_per_resource[transfer.resource_id] = \
+                    self._running_per_resource.get(transfer.resource_id, 0) + 1
+                self._executor.submit(self._run_transfer, transfer)
+            for transfer in deferred:
+                heapq.heappush(self._queue, transfer)
+
+    def _run_transfer(self, transfer: ScheduledTransfer) -> None:
+        _current_transfer.transfer = transfer
+        try:
+            check_transfer_cancelled()
+            result = transfer.operation()
+        except Exception as e:
+            try:
+                transfer.future.set_exception(e)
+            except InvalidStateError:
+                # the transfer was cancelled while running
+                pass
+        else:
+            try:
+                transfer.future.set_result(result)
+            except InvalidStateError:
+                logger.error(f"Transfer of file {transfer.file_path} completed after it was cancelled")
+        finally:
+            _current_transfer.transfer = None
+            with self._lock:
+                self._transfers.pop(transfer.transfer_id, None)
+                self._running_count -= 1
+                self._running_per_resource[transfer.resource_id] -= 1
+                if not self._running_per_resource[transfer.resource_id]:
+                    del self._running_per_resource[transfer.resource_id]
+            self._dispatch()
+
+
+async def cancel_file_transfers(file_path: str):
+    """Cancels the queued and running HydroShare transfers of the file 'file_path'"""
+    cancelled_count = TransferScheduler().cancel_file_transfers(file_path)
+    if not cancelled_count:
+        return {"error": f"There is no transfer in progress for file {file_path}"}
+    return {"success": f"Cancelled {cancelled_count} transfer(s) of file {file_path}"}
@@ -0,0 +1,148 @@
+import asyncio
+import os
+from enum import Enum
+from pathlib import Path
+
+from .delete_file import delete_file_from_hydroshare
+from .refresh_file import refresh_file_from_hydroshare
+from .replace_file import replace_file_in_hydroshare
+from .upload_file import upload_file_to_hydroshare
+from .utils import (
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    logger,
+    HydroShareAuthError,
+    get_batch_concurrency,
+    get_hs_relative_path,
+    get_local_absolute_file_path,
+    get_resource_id,
+    run_in_executor,
+)
+
+
+class SyncDirection(Enum):
+    # make the HydroShare folder match the local folder
+    UPLOAD = 'upload'
+    # make the local folder match the HydroShare folder
+    DOWNLOAD = 'download'
+
+
+class SyncAction(Enum):
+    UPLOAD = 'upload'
+    REPLACE_IN_HYDROSHARE = 'replace in HydroShare'
+    DELETE_IN_HYDROSHARE = 'delete in HydroShare'
+    DOWNLOAD = 'download'
+    DELETE_LOCAL = 'delete local'
+
+
+def build_local_manifest(folder_path: str) -> dict[str, str]:
+    """Returns the checksums (from the local checksum cache) of all the files in the local folder 'folder_path'
+    keyed by the file path relative to the notebook dir. Hidden files and folders are skipped."""
+    absolute_folder_path = get_local_absolute_file_path(folder_path)
+    file_paths = []
+    for dir_path, dir_names, file_names in os.walk(absolute_folder_path):
+        dir_names[:] = [dir_name for dir_name in dir_names if not dir_name.startswith('.')]
+        relative_dir_path = Path(folder_path) / Path(dir_path).relative_to(absolute_folder_path)
+        for file_name in file_names:
+            if file_name.startswith('.'):
+                continue
+            file_paths.append((relative_dir_path / file_name).as_posix())
+    # the files that changed since they were last hashed are hashed in parallel
+    return LocalChecksumCache().get_checksums(file_paths)
+
+
+def build_sync_plan(folder_path: str, direction: SyncDirection, delete_extra_files: bool) -> list[dict]:
+    """Diffs the local folder against the same folder in HydroShare and returns the actions needed to bring
+    them in line in the given 'direction'."""
+    folder_path = Path(folder_path).as_posix()
+    hs_folder = get_hs_relative_path(folder_path)
+    rfc_manager = ResourceFileCacheManager()
+    if not rfc_manager.user_authorized():
+        raise HydroShareAuthError("User is not authorized with HydroShare")
+    resource = rfc_manager.get_resource(get_resource_id(folder_path))
+    # the whole folder is compared, so we want the latest listing (with checksums) of the resource files
+    rfc_manager.get_files(resource, refresh=True)
+    listing = rfc_manager.get_resource_file_cache(resource).get_listing()
+
+    # local path of the 'folder_path' in HydroShare, to map HydroShare file paths to local file paths
+    local_folder_prefix = folder_path[:len(folder_path) - len(hs_folder)] if hs_folder else f"{folder_path}/"
+    local_folder_prefix = local_folder_prefix.rstrip('/') + '/'
+    remote_manifest = {}
+    for hs_file_path in listing.get_folder_files(hs_folder, recursive=True):
+        res_file = listing.files.get(hs_file_path)
+        remote_manifest[f"{local_folder_prefix}{hs_file_path}"] = getattr(res_file, 'checksum', None)
+    local_manifest = build_local_manifest(folder_path)
+
+    plan = []
+    for file_path in sorted(local_manifest.keys() | remote_manifest.keys()):
+        local_checksum = local_manifest.get(file_path)
+        remote_checksum = remote_manifest.get(file_path)
+        if local_checksum is None:
+            status = "remote-only"
+            action = SyncAction.DOWNLOAD if direction == SyncDirection.DOWNLOAD else (
+                SyncAction.DELETE_IN_HYDROSHARE if delete_extra_files else None)
+        elif file_path not in remote_manifest:
+            status = "local-only"
+            action = SyncAction.UPLOAD if direction == SyncDirection.UPLOAD else (
+                SyncAction.DELETE_LOCAL if delete_extra_files else None)
+        elif local_checksum != remote_checksum:
+            status = "modified"
+            action = SyncAction.REPLACE_IN_HYDROSHARE if direction == SyncDirection.UPLOAD else SyncAction.DOWNLOAD
+        else:
+            continue
+        plan.append({"path": file_path, "status": status, "action": action.value if action else None})
+    return plan
+
+
+async def run_sync_action(file_path: str, action: SyncAction):
+    if action == SyncAction.UPLOAD:
+        return await upload_file_to_hydroshare(file_path)
+    if action == SyncAction.REPLACE_IN_HYDROSHARE:
+        return await replace_file_in_hydroshare(file_path)
+    if action == SyncAction.DELETE_IN_HYDROSHARE:
+        return await delete_file_from_hydroshare(file_path)
+    if action == SyncAction.DOWNLOAD:
+        # the folder of a file that exists only in HydroShare may not exist locally
+        os.makedirs(os.path.dirname(get_local_absolute_file_path(file_path)), exist_ok=True)
+        return await refresh_file_from_hydroshare(file_path)
+    if action == SyncAction.DELETE_LOCAL:
+        os.remove(get_local_absolute_file_path(file_path))
+        LocalChecksumCache().invalidate(file_path)
+        return {"success": f"Local file {file_path} was deleted"}
+
+
+async def sync_folder_with_hydroshare(folder_path: str, direction: str = SyncDirection.UPLOAD.value,
+                                      dry_run: bool = True, delete_extra_files: bool = False):
+    """Brings the local folder 'folder_path' in line with the same folder in HydroShare. Only the files that differ
+    are transferred, in parallel. With 'dry_run' the planned actions are returned without transferring anything."""
+    try:
+        sync_direction = SyncDirection(direction)
+    except ValueError:
+        return {"error": f"Invalid sync direction: {direction}"}
+
+    try:
+        plan = await run_in_executor(build_sync_plan, folder_path, sync_direction, delete_extra_files)
+    except HydroShareAuthError as e:
+        return {"error": str(e)}
+
+    actions = [item for item in plan if item["action"] is not None]
+    if dry_run:
+        return {"success": f"{len(actions)} file(s) to sync in folder {folder_path}", "plan": plan}
+
+    semaphore = asyncio.Semaphore(get_batch_concurrency())
+
+    async def run_action(item):
+        async with semaphore:
+            try:
+                result = await run_sync_action(item["path"], SyncAction(item["action"]))
+            except Exception as e:
+                err_msg = f'Failed to {item["action"]} file: {item["path"]}. Error: {str(e)}'
+                logger.error(err_msg)
+                result = {"error": err_msg}
+            return {**item, **result}
+
+    results = await asyncio.gather(*(run_action(item) for item in actions))
+    failed_count = sum(1 for result in results if "error" in result)
+    success_msg = (f"Synced {len(results) - failed_count} of {len(results)} file(s) in folder {folder_path}"
+                   f" with HydroShare")
+    return {"success": success_msg, "plan": plan, "results": results}
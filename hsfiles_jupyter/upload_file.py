@@ -1,21 +1,139 @@
 import os
+import uuid
 
+from hsclient.hydroshare import File, Resource
+
+from .metrics import increment
+from .progress import TransferProgressTracker
+from .scheduler import (
+    TransferCancelledError,
+    TransferPriority,
+    TransferScheduler,
+    check_transfer_cancelled,
+    wait_before_retry,
+)
 from .utils import (
+    FileCacheUpdateType,
+    LocalChecksumCache,
     ResourceFileCacheManager,
     logger,
     HydroShareAuthError,
+    HydroShareResourceInfo,
+    get_retry_delay,
+    is_retryable_error,
+    run_in_executor,
     get_local_absolute_file_path,
+    get_upload_chunk_size,
+    get_upload_max_retries,
 )
 
 
-async def upload_file_to_hydroshare(file_path: str):
+class MultipartUploadStream:
+    """A multipart/form-data request body for uploading a file to HydroShare. The file is read in chunks of
+    HS_UPLOAD_CHUNK_SIZE bytes while the request is being sent, so the file is never loaded into memory."""
+
+    def __init__(self, absolute_file_path: str, on_read=None, file_name: str = None):
+        self.boundary = uuid.uuid4().hex
+        file_name = (file_name or os.path.basename(absolute_file_path)).replace('"', '%22')
+        self._preamble = (f'--{self.boundary}\r\n'
+                          f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                          f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+        self._epilogue = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._file_size = os.path.getsize(absolute_file_path)
+        self._file = open(absolute_file_path, 'rb')
+        self._on_read = on_read
+        self._chunks = self._read_chunks()
+        self._chunk = b''
+        self._offset = 0
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        # used by requests to set the Content-Length header
+        return len(self._preamble) + self._file_size + len(self._epilogue)
+
+    def _read_chunks(self):
+        yield self._preamble
+        chunk_size = get_upload_chunk_size()
+        while chunk := self._file.read(chunk_size):
+            yield chunk
+            if self._on_read is not None:
+                self._on_read(len(chunk))
+        yield self._epilogue
+
+    def read(self, size: int = -1) -> bytes:
+        check_transfer_cancelled()
+        if size is None or size < 0:
+            remaining = [self._chunk[self._offset:], *self._chunks]
+            self._chunk, self._offset = b'', 0
+            return b''.join(remaining)
+
+        if self._offset >= len(self._chunk):
+            self._chunk = next(self._chunks, b'')
+            self._offset = 0
+        # returning less than 'size' bytes is fine - the http client keeps reading until an empty read
+        data = self._chunk[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def stream_file_upload(resource: Resource, absolute_file_path: str, destination_folder: str, file_path: str,
+                       upload_file_name: str = None) -> None:
+    """Uploads the local file to the 'destination_folder' of the resource (as 'upload_file_name' if given, otherwise
+    under its local name) as a streamed request. A failed upload is retried from the beginning (after a backoff delay)
+    up to HS_UPLOAD_MAX_RETRIES times - HydroShare keeps nothing from a failed upload request, so restarting is always
+    clean."""
+    tracker = TransferProgressTracker()
+    progress = tracker.start(file_path, 'upload', os.path.getsize(absolute_file_path))
+    upload_path = f"/hsapi/resource/{resource.resource_id}/files/"
+    if destination_folder:
+        upload_path = f"{upload_path}{destination_folder.strip('/')}/"
+
+    max_retries = get_upload_max_retries()
+    attempt = 0
+    while True:
+        stream = None
+        try:
+            stream = MultipartUploadStream(absolute_file_path, on_read=lambda n: tracker.add_bytes(progress, n),
+                                           file_name=upload_file_name)
+            resource._hs_session.post(upload_path, status_code=201, data=stream,
+                                      headers={'Content-Type': stream.content_type})
+            tracker.finish(progress)
+            return
+        except Exception as e:
+            attempt += 1
+            if isinstance(e, TransferCancelledError) or not is_retryable_error(e) or attempt > max_retries:
+                tracker.finish(progress, error=str(e))
+                raise
+            delay = get_retry_delay(attempt - 1)
+            increment('retries', operation='upload')
+            logger.error(f"Upload of file {file_path} failed (attempt {attempt} of {max_retries + 1}),"
+                         f" restarting the upload in {delay:.1f} seconds. Error: {str(e)}")
+            try:
+                wait_before_retry(delay)
+            except TransferCancelledError as cancel_error:
+                tracker.finish(progress, error=str(cancel_error))
+                raise
+            tracker.restart(progress)
+        finally:
+            if stream is not None:
+                stream.close()
+
+
+async def upload_file_to_hydroshare(file_path: str, res_info: HydroShareResourceInfo = None):
     """Uploads a file 'file_path' to a HydroShare resource"""
 
     rfc_manager = ResourceFileCacheManager()
-    try:
-        res_info = rfc_manager.get_hydroshare_resource_info(file_path)
-    except HydroShareAuthError as e:
-        return {"error": str(e)}
+    if res_info is None:
+        try:
+            res_info = await run_in_executor(rfc_manager.get_hydroshare_resource_info, file_path)
+        except HydroShareAuthError as e:
+            return {"error": str(e)}
     if res_info.hs_file_relative_path in res_info.files:
         err_msg = f'File {res_info.hs_file_path} already exists in HydroShare resource: {res_info.resource_id}'
         return {"error": err_msg}
@@ -24,8 +142,20 @@ async def upload_file_to_hydroshare(file_path: str):
     absolute_local_file_path = get_local_absolute_file_path(file_path)
 
     try:
-        res_info.resource.file_upload(absolute_local_file_path, destination_path=file_folder)
-        rfc_manager.refresh_files_cache(res_info.resource)
+        # the checksum of the uploaded file is cached with it, so that its status is known right after the upload
+        local_checksum = await run_in_executor(rfc_manager.compute_checksum, file_path)
+        await TransferScheduler().run(res_info.resource_id, file_path, stream_file_upload, res_info.resource,
+                                      absolute_local_file_path, file_folder, file_path,
+                                      priority=TransferPriority.LOW)
+        # unless the local file changed while it was being uploaded, in which case the uploaded content is not known
+        # and the cache is refreshed in the background to get the checksum of the uploaded file
+        if await run_in_executor(LocalChecksumCache().get_cached_checksum, file_path) == local_checksum:
+            uploaded_file = File(res_info.hs_file_relative_path, None, local_checksum)
+        else:
+            uploaded_file = res_info.hs_file_relative_path
+            rfc_manager.refresh_files_cache(res_info.resource)
+        rfc_manager.update_resource_files_cache(resource=res_info.resource, file_path=uploaded_file,
+                                                update_type=FileCacheUpdateType.ADD)
         success_msg = (f'File {res_info.hs_file_path} uploaded successfully to HydroShare'
                        f' resource: {res_info.resource_id}')
         return {"success": success_msg}
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import uuid
+import zipfile
+from pathlib import Path
+
+from hsclient.hydroshare import Resource
+
+from .scheduler import TransferPriority, TransferScheduler, check_transfer_cancelled
+from .upload_file import stream_file_upload
+from .utils import (
+    FileCacheUpdateType,
+    ResourceFileCacheManager,
+    logger,
+    HydroShareAuthError,
+    get_hs_relative_path,
+    get_local_absolute_file_path,
+    get_resource_id,
+    run_in_executor,
+)
+
+
+def zip_folder(absolute_folder_path: str, zip_file_path: str) -> list[str]:
+    """Writes the files of the local folder to the zip file one file at a time, with the folder name as the top
+    level folder of the archive. Hidden files and folders are skipped. Returns the paths of the zipped files relative
+    to the parent of the folder."""
+    folder_name = os.path.basename(absolute_folder_path.rstrip('/'))
+    zipped_files = []
+    with zipfile.ZipFile(zip_file_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+        for dir_path, dir_names, file_names in os.walk(absolute_folder_path):
+            dir_names[:] = [dir_name for dir_name in dir_names if not dir_name.startswith('.')]
+            for file_name in file_names:
+                if file_name.startswith('.'):
+                    continue
+                check_transfer_cancelled()
+                absolute_file_path = os.path.join(dir_path, file_name)
+                archive_path = (Path(folder_name) / Path(absolute_file_path).relative_to(absolute_folder_path))
+                zip_file.write(absolute_file_path, arcname=archive_path.as_posix())
+                zipped_files.append(archive_path.as_posix())
+    return zipped_files
+
+
+def upload_folder_as_zip(resource: Resource, folder_path: str, destination_folder: str, overwrite: bool) -> list[str]:
+    """Uploads the local folder as a single zip file to the 'destination_folder' of the resource and has HydroShare
+    unzip it there. Returns the paths (relative to the resource data/contents folder) of the uploaded files. Raises
+    FileExistsError if any of the files is already in the resource and 'overwrite' is False."""
+    absolute_folder_path = get_local_absolute_file_path(folder_path)
+    zip_file_name = f"{os.path.basename(absolute_folder_path.rstrip('/'))}_{uuid.uuid4().hex[:8]}.zip"
+    # the zip file is written next to the folder (hidden) as the system temp dir may be too small for it
+    with tempfile.TemporaryDirectory(prefix='.hsupload-', dir=os.path.dirname(absolute_folder_path)) as temp_dir:
+        zip_file_path = os.path.join(temp_dir, zip_file_name)
+        zipped_files = zip_folder(absolute_folder_path, zip_file_path)
+        if not zipped_files:
+            return []
+        if destination_folder:
+            zipped_files = [f"{destination_folder}/{zipped_file}" for zipped_file in zipped_files]
+        if not overwrite:
+            # HydroShare doesn't report conflicts when not overwriting - it unzips into a new folder named after the
+            # zip file instead
+            files, _ = ResourceFileCacheManager().get_files(
+                resource, folders=list({os.path.dirname(zipped_file) for zipped_file in zipped_files}))
+            existing_files = [zipped_file for zipped_file in zipped_files if zipped_file in files]
+            if existing_files:
+                raise FileExistsError(f"{len(existing_files)} file(s) already exist in HydroShare:"
+                                      f" {', '.join(existing_files[:5])}{', ...' if len(existing_files) > 5 else ''}")
+        stream_file_upload(resource, zip_file_path, destination_folder, folder_path)
+
+    hs_zip_file_path = f"{destination_folder}/{zip_file_name}" if destination_folder else zip_file_name
+    # HydroShare deletes the zip file after unzipping it
+    resource.file_unzip(hs_zip_file_path, overwrite=True, ingest_metadata=False)
+    return zipped_files
+
+
+async def upload_folder_to_hydroshare(folder_path: str, overwrite: bool = False):
+    """Uploads all files in the local folder 'folder_path' to the same folder in the HydroShare resource in a
+    single request (zip upload followed by unzip in HydroShare)"""
+
+    rfc_manager = ResourceFileCacheManager()
+    folder_path = Path(folder_path).as_posix()
+    try:
+        hs_folder = get_hs_relative_path(folder_path)
+        if not hs_folder:
+            return {"error": "Select a folder inside the data/contents folder of the resource to upload"}
+        resource_id = get_resource_id(folder_path)
+        if not rfc_manager.user_authorized():
+            raise HydroShareAuthError("User is not authorized with HydroShare")
+        resource = await run_in_executor(rfc_manager.get_resource, resource_id)
+    except HydroShareAuthError as e:
+        return {"error": str(e)}
+
+    destination_folder = os.path.dirname(hs_folder)
+    try:
+        uploaded_files = await TransferScheduler().run(resource_id, folder_path, upload_folder_as_zip, resource,
+                                                       folder_path, destination_folder, overwrite,
+                                                       priority=TransferPriority.LOW)
+    except Exception as e:
+        err_msg = (f'Failed to upload folder: {folder_path} to HydroShare resource: {resource_id}.'
+                   f' Error: {str(e)}')
+        logger.error(err_msg)
+        return {"error": err_msg}
+
+    if not uploaded_files:
+        return {"error": f"Folder {folder_path} has no files to upload"}
+    for hs_file_path in uploaded_files:
+        rfc_manager.update_resource_files_cache(resource=resource, file_path=hs_file_path,
+                                                update_type=FileCacheUpdateType.ADD)
+    # refreshing in the background to get the checksums of the uploaded files
+    rfc_manager.refresh_files_cache(resource)
+    success_msg = (f'Folder {folder_path} ({len(uploaded_files)} files) uploaded successfully to HydroShare'
+                   f' resource: {resource_id}')
+    return {"success": success_msg}
@@ -1,19 +1,43 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import gzip
 import hashlib
+import json
 import logging
+import multiprocessing
 import os
+import posixpath
+import random
+import re
+import sqlite3
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
 from functools import lru_cache
+from collections import OrderedDict
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from types import MappingProxyType
+from urllib.parse import unquote, urlparse
 
 from hsclient import HydroShare
-from hsclient.hydroshare import Resource
+from hsclient.hydroshare import Aggregation, File, Resource
+from hsclient.utils import is_aggregation
+from jupyter_core.paths import jupyter_runtime_dir
 from jupyter_server.serverapp import ServerApp
-from requests.exceptions import ConnectionError
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException, Timeout
+
+from .events import publish
+from .metrics import increment, timed
 
 # Configure logging
 log_file_path = Path.home() / '.hsfiles_jupyter.log'
@@ -32,10 +56,27 @@ logger.setLevel(logging.ERROR)
 logger.addHandler(handler)
 
 
+# approximate memory held by a cached resource (the hsclient Resource object with its parsed metadata) and by each of
+# its cached files (the File object with its url and checksum, the index entries and its share of the resource map)
+_RESOURCE_CACHE_BASE_SIZE = 64 * 1024
+_FILE_CACHE_ENTRY_SIZE = 1024
+
+# format version of the on-disk snapshots of the resource file listings - snapshots of another version are ignored
+_LISTING_SNAPSHOT_VERSION = 2
+# seconds to wait after a change to a cached file listing before its snapshot is written, so that a burst of changes
+# (e.g., a folder upload) is written once
+_LISTING_SNAPSHOT_SAVE_DELAY = 5
+
+
 class HydroShareAuthError(Exception):
     """Exception raised for errors in the HydroShare authentication."""
     pass
 
+
+class HydroShareUnavailableError(Exception):
+    """Exception raised without sending the request while the circuit breaker for HydroShare is open."""
+    pass
+
 class FileCacheUpdateType(Enum):
     ADD = 1
     DELETE = 2
@@ -45,84 +86,487 @@ class HydroShareResourceInfo:
     resource: Resource
     resource_id: str
     hs_file_path: str
-    files: list
+    files: dict
     refresh: bool
     hs_file_relative_path: str
 
+class CircuitBreaker:
+    """A circuit breaker for the requests to a HydroShare host. After HS_CIRCUIT_BREAKER_THRESHOLD consecutive failed
+    requests (connection errors, 429 and 5xx responses) the circuit opens and requests fail fast for
+    HS_CIRCUIT_BREAKER_COOLDOWN seconds. Then a single trial request is let through - the circuit closes if it succeeds
+    and opens again if it fails."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self._lock = threading.Lock()
+        self._failure_count = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= get_circuit_breaker_cooldown() and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return
+        raise HydroShareUnavailableError(f"HydroShare ({self.host}) is not responding. Please try again later.")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failure_count = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failure_count += 1
+            if self._trial_in_progress or self._failure_count >= get_circuit_breaker_threshold():
+                if self._opened_at is None:
+                    logger.error(f"Requests to HydroShare ({self.host}) are failing, pausing requests for"
+                                 f" {get_circuit_breaker_cooldown()} seconds")
+                self._opened_at = time.monotonic()
+                self._trial_in_progress = False
+
+    def release_trial(self) -> None:
+        """Lets another trial request through after the current one ended without an answer from HydroShare (e.g.,
+        the transfer was cancelled) - that doesn't count as a failure."""
+        with self._lock:
+            self._trial_in_progress = False
+
+
+# Retry-After delay (in seconds) of the last response received by the current thread
+_retry_after = threading.local()
+
+
+class HydroShareHTTPAdapter(HTTPAdapter):
+    """A pooled http adapter that guards every request with the circuit breaker of its host and captures the
+    Retry-After header of throttled (429) and unavailable (503) responses for the retry policy."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._circuit_breakers: dict[str, CircuitBreaker] = {}
+        self._circuit_breakers_lock = threading.Lock()
+
+    def get_circuit_breaker(self, host: str) -> CircuitBreaker:
+        with self._circuit_breakers_lock:
+            if host not in self._circuit_breakers:
+                self._circuit_breakers[host] = CircuitBreaker(host)
+            return self._circuit_breakers[host]
+
+    def send(self, request, **kwargs):
+        circuit_breaker = self.get_circuit_breaker(urlparse(request.url).hostname)
+        circuit_breaker.before_request()
+        _retry_after.delay = None
+        try:
+            response = super().send(request, **kwargs)
+        except (ConnectionError, Timeout):
+            circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            circuit_breaker.release_trial()
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            circuit_breaker.record_failure()
+            _retry_after.delay = _parse_retry_after(response.headers.get('Retry-After'))
+        else:
+            circuit_breaker.record_success()
+        return response
+
+
+def _parse_retry_after(retry_after: str):
+    if not retry_after:
+        return None
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Network errors, throttling (429) and server errors (5xx) are worth retrying - any other error response from
+    HydroShare is not."""
+    if isinstance(error, HydroShareUnavailableError):
+        return False
+    if isinstance(error, RequestException):
+        return True
+    return re.search(r'status_code (429|5\d\d)', str(error)) is not None
+
+
+def get_retry_delay(attempt: int) -> float:
+    """Returns the number of seconds to wait before retrying a request that failed on the (zero based) 'attempt'. The
+    Retry-After delay asked for by HydroShare is honored, otherwise the delay grows exponentially from
+    HS_RETRY_BASE_DELAY with full jitter, so that concurrent requests don't retry in lockstep."""
+    max_delay = get_retry_max_delay()
+    retry_after = getattr(_retry_after, 'delay', None)
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    return random.uniform(0, min(max_delay, get_retry_base_delay() * 2 ** attempt))
+
+
 class HydroShareWrapper:
     """A class to manage a HydroShare session."""
 
     # make this a singleton class
     _instance = None
+    _instance_lock = threading.Lock()
+    # pool of keep-alive connections to HydroShare shared by the http sessions of all the HydroShare clients (and the
+    # resources retrieved with them), so that api calls don't pay for a new TCP/TLS handshake
+    _http_adapter: HydroShareHTTPAdapter = None
+    _http_adapter_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance') or cls._instance is None:
-            cls._instance = super().__new__(cls)
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
         return cls._instance
 
     def __init__(self):
-        username, password = get_credentials()
-        self.username = username
-        self.password = password
-        self._user_logged_in = False
-        self.hs = self._create_session()
+        # the session is created (and the user logged in) only once - an expired authentication is renewed when
+        # HydroShare rejects a request. If the session can't be created it is tried again on the next call.
+        if self._initialized:
+            return
+        with self._instance_lock:
+            if self._initialized:
+                return
+            username, password = get_credentials()
+            self.username = username
+            self.password = password
+            self._user_logged_in = False
+            self.hs = self._create_session()
+            self._initialized = True
 
     def _create_session(self):
-        hs = HydroShare(username=self.username, password=self.password)
+        hs = HydroShare(username=self.username, password=self.password, host=get_hydroshare_host(),
+                        protocol=get_hydroshare_protocol(), port=get_hydroshare_port())
+        self._configure_http_session(hs._hs_session._session)
         self._user_logged_in = True
         return hs
 
+    @classmethod
+    def _get_http_adapter(cls) -> HydroShareHTTPAdapter:
+        with cls._http_adapter_lock:
+            if cls._http_adapter is None:
+                pool_size = get_http_pool_size()
+                cls._http_adapter = HydroShareHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            return cls._http_adapter
+
+    def _configure_http_session(self, session: requests.Session) -> None:
+        http_adapter = self._get_http_adapter()
+        session.mount('https://', http_adapter)
+        session.mount('http://', http_adapter)
+        session.hooks['response'].append(functools.partial(self._reauthenticate, session))
+
+    def _reauthenticate(self, session: requests.Session, response: requests.Response, *args, **kwargs):
+        # the session is authenticated again only when HydroShare rejects a request - the credentials files may have
+        # been updated (e.g., by nbfetch) since the session was created - and the request is then sent once more
+        if response.status_code not in (401, 403) or getattr(response.request, 'hs_reauthenticated', False):
+            return response
+        request_body = response.request.body
+        if request_body is not None and not isinstance(request_body, (bytes, str)):
+            # a streamed request body can't be sent again
+            return response
+        get_credentials.cache_clear()
+        try:
+            self.username, self.password = get_credentials()
+        except HydroShareAuthError:
+            return response
+        session.auth = (self.username, self.password)
+        session.cookies.clear()
+        request = response.request.copy()
+        request.headers.pop('Cookie', None)
+        request.headers.pop('Authorization', None)
+        request.prepare_auth(session.auth)
+        request.hs_reauthenticated = True
+        # reading the (small) body of the rejected response releases its connection back to the pool
+        response.content
+        return session.send(request, **kwargs)
+
     def user_logged_in(self):
         return self._user_logged_in
 
-    def execute_with_retry(self, operation, max_retries=3):
+    def execute_with_retry(self, operation, max_retries=None):
+        # the session (with its authentication cookies) is kept on connection errors - the connection pool replaces
+        # the broken connections. Operations run in the extension worker threads, so waiting between attempts never
+        # blocks the event loop.
+        max_retries = max_retries or get_retry_max_attempts()
         for attempt in range(max_retries):
             try:
                 return operation()
-            except ConnectionError:
-                if attempt == max_retries - 1:
+            except Exception as e:
+                if attempt == max_retries - 1 or not is_retryable_error(e):
                     raise
-                time.sleep(1)
-                self.hs = self._create_session()  # Create new session
+                delay = get_retry_delay(attempt)
+                increment('retries', operation='api')
+                logger.error(f"HydroShare request failed (attempt {attempt + 1} of {max_retries}), retrying in"
+                             f" {delay:.1f} seconds. Error: {str(e)}")
+                time.sleep(delay)
 
     def get_resource(self, resource_id):
         # this function is used to get the resource object from HydroShare using an active hydroshare client session
         # always use this function when there is a need to retrieve a resource object from hydroshare
-        return self.execute_with_retry(
-            lambda: self.hs.resource(resource_id)
-        )
+        with timed('resource_fetch'):
+            return self.execute_with_retry(
+                # not kept in the hsclient resource cache, so that evicting the resource from the extension caches
+                # frees it
+                lambda: self.hs.resource(resource_id, use_cache=False)
+            )
+
     def update_resource_session(self, resource):
-        # before we do any operation (api call) using the resource object, we need to make sure the hydroshare client
-        # session for the resource is still active/valid - here we are using the my_user_info api call to check
-        # if the session is still valid, otherwise we create a new session
-        self.execute_with_retry(
-            lambda: self.hs.my_user_info()
-        )
+        # before we do any operation (api call) using the resource object, we make sure the resource uses the current
+        # hydroshare client session - an expired authentication is renewed when HydroShare rejects a request
         resource._hs_session = self.hs._hs_session
 
+
+@dataclass(frozen=True)
+class ResourceFilesListing:
+    """An immutable snapshot of the cached files of a resource - the files keyed by their path relative to the
+    resource data/contents folder and the file paths keyed by the folder they are in."""
+    files: MappingProxyType
+    folders: MappingProxyType
+
+    def get_folder_files(self, folder: str, recursive: bool = False) -> list[str]:
+        """Returns the file paths in the relative 'folder' ('' for the data/contents folder)."""
+        folder = folder.strip('/')
+        if not recursive:
+            return list(self.folders.get(folder, ()))
+        folder_prefix = f"{folder}/" if folder else ""
+        return [file_path for sub_folder, folder_files in self.folders.items()
+                if sub_folder == folder or sub_folder.startswith(folder_prefix)
+                for file_path in folder_files]
+
+
 @dataclass
 class ResourceFilesCache:
-    """A class to manage a file cache for files in a HydroShare resource."""
-    _file_paths: list[str]
+    """A class to manage a file cache for files in a HydroShare resource. Files are indexed by their path relative
+    to the resource data/contents folder and by the folder they are in, so lookups don't scan the file list.
+
+    The files of the aggregations in the resource are listed only when a file or folder in an aggregation is looked up
+    (see expand_aggregations) - listing them takes a request per aggregation.
+
+    The cache is safe to use from multiple threads. Changes are made under the lock of the cache (the files are listed
+    outside of it) and readers get an immutable listing, taken on the first read after a change, so they never see a
+    partly updated listing."""
+    _files: dict[str, str]
     _resource: Resource
     _refreshed_at: datetime = field(default_factory=datetime.now)
+    _folders: dict[str, set[str]] = field(default_factory=dict)
+    # last updated timestamp of the resource (from the resource system metadata) at the time of the last file listing
+    _modified_at: str = None
+    # approximate memory (bytes) held by the cache
+    _size: int = _RESOURCE_CACHE_BASE_SIZE
+    # aggregations whose files are not cached yet - the folder (relative to data/contents) of each aggregation keyed
+    # by the path of its resource map
+    _aggregations: dict[str, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    # listing of the current files - None until it is read after a change
+    _listing: ResourceFilesListing = field(default=None, repr=False, compare=False)
+    # changes made to the cache while the files of the resource are being listed - None if no listing is in progress
+    _changes_during_load: list = field(default=None, repr=False, compare=False)
+    # the id of the resource is kept, as reading it from the resource may retrieve the resource map again
+    _resource_id: str = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self._resource_id is None:
+            self._resource_id = self._resource.resource_id
 
     def update_files_cache(self, file_path: str, update_type: FileCacheUpdateType) -> None:
-        if update_type == FileCacheUpdateType.ADD:
-            self._file_paths.append(file_path)
-        elif update_type == FileCacheUpdateType.DELETE:
-            self._file_paths.remove(file_path)
-
-    def load_files_to_cache(self) -> None:
+        with self._lock:
+            if update_type == FileCacheUpdateType.ADD:
+                self._add_file(file_path)
+            elif update_type == FileCacheUpdateType.DELETE:
+                self._remove_file(file_path)
+            if self._changes_during_load is not None:
+                self._changes_during_load.append((file_path, update_type))
+            self._listing = None
+        publish('files', resource_id=self._resource_id, path=str(file_path))
+        ResourceListingSnapshots().schedule_save(self)
+
+    def _add_file(self, res_file: str) -> None:
+        # res_file is either a File object (hsclient) or a plain file path for files added by this extension
+        file_path = str(res_file)
+        if file_path not in self._files:
+            self._size += _FILE_CACHE_ENTRY_SIZE + len(file_path)
+        self._files[file_path] = res_file
+        self._folders.setdefault(os.path.dirname(file_path), set()).add(file_path)
+
+    def _remove_file(self, file_path: str) -> None:
+        if self._files.pop(file_path, None) is None:
+            return
+        self._size -= _FILE_CACHE_ENTRY_SIZE + len(file_path)
+        folder = os.path.dirname(file_path)
+        folder_files = self._folders.get(folder)
+        if folder_files is not None:
+            folder_files.discard(file_path)
+            if not folder_files:
+                del self._folders[folder]
+
+    def _set_files(self, res_files: list, aggregations: dict[str, str] = None) -> None:
+        # the new listing is indexed before the lock is taken
+        new_cache = ResourceFilesCache(_files={}, _resource=self._resource, _aggregations=dict(aggregations or {}),
+                                       _resource_id=self._resource_id)
+        for res_file in res_files:
+            new_cache._add_file(res_file)
+        with self._lock:
+            # a change made while the files were being listed may or may not be in the listing - the change is applied
+            # again unless the listing has the checksum of the added file and the change doesn't
+            for res_file, update_type in self._changes_during_load or ():
+                if update_type == FileCacheUpdateType.DELETE:
+                    new_cache._remove_file(res_file)
+                elif (getattr(res_file, 'checksum', None) is not None
+                      or getattr(new_cache._files.get(str(res_file)), 'checksum', None) is None):
+                    new_cache._add_file(res_file)
+            self._files = new_cache._files
+            self._folders = new_cache._folders
+            self._size = new_cache._size
+            self._aggregations = new_cache._aggregations
+            self._changes_during_load = None
+            self._listing = None
+
+    def load_files_to_cache(self, conditional: bool = False) -> None:
+        """Loads the resource files to the cache. If 'conditional' is True, the file listing is skipped when the
+        resource has not been modified in HydroShare since the files were last loaded."""
         # refresh resource hydroshare session only if 30 seconds have passed since last refresh
         if (datetime.now() - self._refreshed_at).total_seconds() > 30:
             HydroShareWrapper().update_resource_session(self._resource)
-        self._resource.refresh()
-        self._file_paths = self._resource.files(search_aggregations=True)
+        # the modified timestamp is read before the files are listed so that a change made during the listing is
+        # picked up by the next refresh
+        modified_at = self._get_modified_at()
+        if conditional and modified_at is not None and modified_at == self._modified_at:
+            self._refreshed_at = datetime.now()
+            return
+        with self._lock:
+            self._changes_during_load = []
+        try:
+            with timed('file_listing'):
+                self._resource.refresh()
+                # the files that are not in an aggregation - the aggregations are listed when they are looked up
+                self._set_files(self._resource.files(search_aggregations=False), self._get_aggregations())
+        finally:
+            with self._lock:
+                self._changes_during_load = None
+        self._modified_at = modified_at
         self._refreshed_at = datetime.now()
+        # the whole listing may have changed
+        publish('files', resource_id=self._resource_id, path=None)
+        ResourceListingSnapshots().schedule_save(self)
+
+    def _get_aggregations(self) -> dict[str, str]:
+        aggregations = {}
+        for res_file in self._resource._map.describes.files:
+            if is_aggregation(str(res_file)):
+                map_path = unquote(res_file.path)
+                aggregations[map_path] = posixpath.dirname(map_path.split("/data/contents/", 1)[1])
+        return aggregations
+
+    def expand_aggregations(self, folders: list[str] = None) -> None:
+        """Adds the files of the aggregations that the files in the relative 'folders' may be in to the cache - the
+        files of all the aggregations if 'folders' is None. A file set aggregation holds the files of its folder and
+        its sub folders, any other aggregation only files of its own folder."""
+        with self._lock:
+            map_paths = [map_path for map_path, aggregation_folder in self._aggregations.items()
+                         if folders is None or any(_is_in_aggregation_folder(folder.strip('/'), aggregation_folder)
+                                                   for folder in folders)]
+        if not map_paths:
+            return
+        with timed('aggregation_listing'):
+            checksums = self._resource._checksums
+            aggregation_files = {
+                map_path: Aggregation(map_path, self._resource._hs_session, checksums).files(search_aggregations=True)
+                for map_path in map_paths
+            }
+        with self._lock:
+            for map_path, res_files in aggregation_files.items():
+                if self._aggregations.pop(map_path, None) is None:
+                    # listed by another thread in the meantime or the listing of the resource was reloaded
+                    continue
+                for res_file in res_files:
+                    self._add_file(res_file)
+            self._listing = None
+        publish('files', resource_id=self._resource_id, path=None)
+        ResourceListingSnapshots().schedule_save(self)
+
+    def _get_modified_at(self):
+        # a single small api call compared to listing all the files of the resource
+        try:
+            return self._resource.system_metadata().get('date_last_updated')
+        except Exception as e:
+            logger.error(f"Failed to get system metadata for resource: {self._resource_id}. Error: {str(e)}")
+            return None
+
+    def get_listing(self) -> ResourceFilesListing:
+        """Returns the immutable listing of the cached files."""
+        listing = self._listing
+        if listing is None:
+            with self._lock:
+                if self._listing is None:
+                    self._listing = ResourceFilesListing(
+                        files=MappingProxyType(dict(self._files)),
+                        folders=MappingProxyType({folder: frozenset(folder_files)
+                                                  for folder, folder_files in self._folders.items()}),
+                    )
+                listing = self._listing
+        return listing
+
+    def get_files(self) -> MappingProxyType:
+        return self.get_listing().files
+
+    def get_file(self, file_path: str):
+        """Returns the cached File object (hsclient) for the relative 'file_path' or None if it is not cached."""
+        return self.get_listing().files.get(file_path)
+
+    def get_folder_files(self, folder: str, recursive: bool = False) -> list[str]:
+        """Returns the cached file paths in the relative 'folder' ('' for the data/contents folder)."""
+        return self.get_listing().get_folder_files(folder, recursive)
+
+    def to_snapshot(self) -> dict:
+        """Returns the cached listing in the format of the on-disk snapshots. The file urls all share the url of the
+        resource data/contents folder, so only that prefix is stored along with the path and checksum of each file."""
+        url_prefix = None
+        snapshot_files = []
+        with self._lock:
+            aggregations = dict(self._aggregations)
+        for res_file in self.get_listing().files.values():
+            file_path = str(res_file)
+            url = getattr(res_file, 'url', None)
+            if url_prefix is None and url and url.endswith(file_path):
+                url_prefix = url[:-len(file_path)]
+            snapshot_file = [file_path, getattr(res_file, 'checksum', None)]
+            if url is not None and url != f"{url_prefix}{file_path}":
+                snapshot_file.append(url)
+            snapshot_files.append(snapshot_file)
+        return {
+            "version": _LISTING_SNAPSHOT_VERSION,
+            "resource_id": self._resource_id,
+            "modified_at": self._modified_at,
+            "refreshed_at": self._refreshed_at.timestamp(),
+            "url_prefix": url_prefix,
+            "files": snapshot_files,
+            "aggregations": aggregations,
+        }
 
-    def get_files(self) -> list[str]:
-        return self._file_paths
+    @classmethod
+    def from_snapshot(cls, resource: Resource, snapshot: dict) -> "ResourceFilesCache":
+        """Creates the cache of the resource from its on-disk snapshot. The restored cache counts as just refreshed,
+        so it is served as is while it is revalidated."""
+        url_prefix = snapshot.get("url_prefix")
+        res_files = []
+        for snapshot_file in snapshot["files"]:
+            file_path, checksum = snapshot_file[0], snapshot_file[1]
+            if len(snapshot_file) > 2:
+                url = snapshot_file[2]
+            else:
+                url = f"{url_prefix}{file_path}" if url_prefix is not None else None
+            res_files.append(File(file_path, url, checksum))
+        resource_file_cache = cls(_files={}, _resource=resource, _modified_at=snapshot.get("modified_at"))
+        resource_file_cache._set_files(res_files, snapshot.get("aggregations"))
+        return resource_file_cache
 
     def is_due_for_refresh(self) -> bool:
         refresh_interval = get_cache_refresh_interval()
@@ -132,30 +576,282 @@ class ResourceFilesCache:
     def resource(self) -> Resource:
         return self._resource
 
+    @property
+    def resource_id(self) -> str:
+        return self._resource_id
 
-class ResourceFileCacheManager:
-    """ A class to manage resource file caches for multiple HydroShare resources."""
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+def _is_in_aggregation_folder(folder: str, aggregation_folder: str) -> bool:
+    # only a file set aggregation can hold sub folders, and it can't be the data/contents folder itself
+    if not aggregation_folder:
+        return folder == aggregation_folder
+    return folder == aggregation_folder or folder.startswith(f"{aggregation_folder}/")
+
+
+class ResourceFilesCacheStore:
+    """A bounded store of resource file caches keyed by resource id. The least recently used caches are evicted when
+    there are more than HS_RESOURCE_CACHE_MAX_ENTRIES caches or their approximate memory exceeds
+    HS_RESOURCE_CACHE_MAX_BYTES, and a cache not used for HS_RESOURCE_CACHE_TTL seconds is evicted on next access.
+    Evicting a cache drops both the hsclient Resource object and its file list."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # resource id -> (resource file cache, last accessed time), in least recently used first order
+        self._caches: OrderedDict[str, tuple[ResourceFilesCache, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, resource_id: str) -> ResourceFilesCache:
+        """Returns the cache for the resource (None if not cached) and counts the access as a hit or a miss."""
+        with self._lock:
+            resource_file_cache = self._get(resource_id)
+            if resource_file_cache is None:
+                self.misses += 1
+                increment('cache_misses', cache='resource')
+            else:
+                self.hits += 1
+                increment('cache_hits', cache='resource')
+            return resource_file_cache
+
+    def peek(self, resource_id: str) -> ResourceFilesCache:
+        """Same as get() without counting the access as a hit or a miss."""
+        with self._lock:
+            return self._get(resource_id)
+
+    def _get(self, resource_id: str) -> ResourceFilesCache:
+        entry = self._caches.get(resource_id)
+        if entry is None:
+            return None
+        resource_file_cache, accessed_at = entry
+        now = time.monotonic()
+        if now - accessed_at > get_resource_cache_ttl():
+            del self._caches[resource_id]
+            self.evictions += 1
+            return None
+        self._caches[resource_id] = (resource_file_cache, now)
+        self._caches.move_to_end(resource_id)
+        # the caches grow after they are put in the store (refreshes, uploads and aggregation listings)
+        self._evict()
+        return resource_file_cache
+
+    def put(self, resource_id: str, resource_file_cache: ResourceFilesCache) -> None:
+        with self._lock:
+            self._caches[resource_id] = (resource_file_cache, time.monotonic())
+            self._caches.move_to_end(resource_id)
+            self._evict()
+
+    def evict(self, resource_id: str) -> bool:
+        with self._lock:
+            if self._caches.pop(resource_id, None) is None:
+                return False
+            self.evictions += 1
+            return True
+
+    def _evict(self) -> None:
+        max_entries = get_resource_cache_max_entries()
+        max_bytes = get_resource_cache_max_bytes()
+        total_size = sum(resource_file_cache.size for resource_file_cache, _ in self._caches.values())
+        # the most recently used cache is always kept even if it alone exceeds the memory budget
+        while len(self._caches) > 1 and (len(self._caches) > max_entries or total_size > max_bytes):
+            _, (resource_file_cache, _) = self._caches.popitem(last=False)
+            total_size -= resource_file_cache.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._caches),
+                "approximate_bytes": sum(resource_file_cache.size for resource_file_cache, _ in self._caches.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ResourceListingSnapshots:
+    """A class to keep snapshots of the cached resource file listings on disk (a gzipped JSON file per resource in the
+    jupyter runtime directory), so that the listings survive a server restart. A snapshot is written atomically after
+    the files of the resource are listed and shortly after the cached listing is changed. A snapshot of another format
+    version or one older than HS_LISTING_SNAPSHOT_MAX_AGE seconds is ignored."""
+
+    # make this a singleton class
+    _instance: "ResourceListingSnapshots" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            instance = super().__new__(cls)
+            instance._lock = threading.Lock()
+            # resource id -> (timer of the pending save, resource file cache)
+            instance._pending_saves = {}
+            # the pending saves are written when the server is stopped
+            atexit.register(instance.flush)
+            cls._instance = instance
+        return cls._instance
+
+    def load(self, resource_id: str):
+        """Returns the snapshot of the resource or None if there is no usable snapshot."""
+        snapshot_path = self._get_snapshot_path(resource_id)
+        if snapshot_path is None:
+            return None
+        try:
+            with gzip.open(snapshot_path, 'rt', encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            logger.error(f"Failed to load the file listing snapshot of resource: {resource_id}. Error: {str(e)}")
+            return None
+        if (not isinstance(snapshot, dict) or snapshot.get("version") != _LISTING_SNAPSHOT_VERSION
+                or snapshot.get("resource_id") != resource_id):
+            return None
+        if time.time() - snapshot.get("refreshed_at", 0) > get_listing_snapshot_max_age():
+            return None
+        return snapshot
+
+    def schedule_save(self, resource_file_cache: ResourceFilesCache) -> None:
+        """Writes the snapshot of the resource file cache after a short delay. Changes made in the meantime are
+        included in the same write."""
+        if not get_listing_snapshots_enabled():
+            return
+        resource_id = resource_file_cache.resource_id
+        with self._lock:
+            if resource_id in self._pending_saves:
+                return
+            timer = threading.Timer(_LISTING_SNAPSHOT_SAVE_DELAY, self._save_pending, args=(resource_id,))
+            timer.daemon = True
+            self._pending_saves[resource_id] = (timer, resource_file_cache)
+        timer.start()
+
+    def _save_pending(self, resource_id: str) -> None:
+        with self._lock:
+            pending_save = self._pending_saves.pop(resource_id, None)
+        if pending_save is not None:
+            self._write(resource_id, pending_save[1])
+
+    def flush(self) -> None:
+        """Writes all the pending snapshots."""
+        with self._lock:
+            resource_ids = list(self._pending_saves)
+        for resource_id in resource_ids:
+            with self._lock:
+                pending_save = self._pending_saves.pop(resource_id, None)
+            if pending_save is not None:
+                pending_save[0].cancel()
+                self._write(resource_id, pending_save[1])
+
+    def delete(self, resource_id: str) -> None:
+        with self._lock:
+            pending_save = self._pending_saves.pop(resource_id, None)
+        if pending_save is not None:
+            pending_save[0].cancel()
+        snapshot_path = self._get_snapshot_path(resource_id)
+        if snapshot_path is None:
+            return
+        try:
+            os.remove(snapshot_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to delete the file listing snapshot of resource: {resource_id}. Error: {str(e)}")
+
+    def _write(self, resource_id: str, resource_file_cache: ResourceFilesCache) -> None:
+        snapshot_path = self._get_snapshot_path(resource_id)
+        if snapshot_path is None:
+            return
+        snapshot = resource_file_cache.to_snapshot()
+        temp_file_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(temp_file_path, 'wt', encoding='utf-8', compresslevel=6) as snapshot_file:
+                json.dump(snapshot, snapshot_file, separators=(',', ':'))
+            # the snapshot is replaced atomically so that it is never left half written
+            os.replace(temp_file_path, snapshot_path)
+        except OSError as e:
+            logger.error(f"Failed to save the file listing snapshot of resource: {resource_id}. Error: {str(e)}")
+            try:
+                os.remove(temp_file_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _get_snapshot_path(resource_id: str):
+        if not get_listing_snapshots_enabled() or not re.fullmatch(r'[0-9A-Za-z_-]+', resource_id):
+            return None
+        return get_listing_snapshot_dir() / f"{resource_id}.json.gz"
+
+
+class SnapshotResource(Resource):
+    """A HydroShare resource restored from a file listing snapshot. Its id is known without retrieving the resource
+    map, so the restored listing can be used without any api call."""
+
+    def __init__(self, resource_id: str, hs_session):
+        super().__init__(f"/resource/{resource_id}/data/resourcemap.xml", hs_session)
+        self._resource_id = resource_id
+
+    @property
+    def resource_id(self) -> str:
+        return self._resource_id
 
-    resource_file_caches: list[ResourceFilesCache] = []
+
+class ResourceFileCacheManager:
+    """ A class to manage resource file caches for multiple HydroShare resources. The files of a resource are listed
+    by one thread at a time - the threads that need the files of a resource while they are being listed wait for that
+    listing (see _single_flight)."""
+
+    # resource file caches keyed by resource id
+    resource_file_caches: ResourceFilesCacheStore = ResourceFilesCacheStore()
+    # futures of file listings in progress keyed by resource id and kind of listing ('create' or 'load')
+    _loads_in_progress: dict[tuple[str, str], Future] = {}
+    # futures of background refreshes that have not started yet keyed by resource id
+    _refreshes_pending: dict[str, Future] = {}
+    _loads_lock = threading.Lock()
     _instance: "ResourceFileCacheManager" = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, '_instance') or cls._instance is None:
-            cls._instance = super().__new__(cls)
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
         return cls._instance
 
     def get_hydroshare_resource_info(self, file_path: str) -> HydroShareResourceInfo:
         """Get HydroShare resource information for a given file path."""
         file_path = Path(file_path).as_posix()
-        if not self.user_authorized():
-            raise HydroShareAuthError("User is not authorized with HydroShare")
-        resource = self.get_resource_from_file_path(file_path)
-
+        with timed('resource_info'):
+            if not self.user_authorized():
+                raise HydroShareAuthError("User is not authorized with HydroShare")
+            resource = self.get_resource_from_file_path(file_path)
+
+            # get the files in the resource to check if the file to be acted on already exists in the resource - only
+            # the aggregations the file may be in are listed
+            folder = posixpath.dirname(get_hs_relative_path(file_path))
+            files, refresh = self.get_files(resource, folders=[folder])
+            return self._create_resource_info(resource, files, refresh, file_path)
+
+    def get_hydroshare_resource_info_for_files(self, resource_id: str,
+                                               file_paths: list[str]) -> list[HydroShareResourceInfo]:
+        """Get HydroShare resource information for multiple file paths of the same resource. The resource and its
+        file listing are retrieved only once for all the files."""
+        with timed('resource_info'):
+            if not self.user_authorized():
+                raise HydroShareAuthError("User is not authorized with HydroShare")
+            resource = self.get_resource(resource_id)
+            folders = {posixpath.dirname(get_hs_relative_path(file_path)) for file_path in file_paths}
+            files, refresh = self.get_files(resource, folders=list(folders))
+            return [self._create_resource_info(resource, files, refresh, Path(file_path).as_posix())
+                    for file_path in file_paths]
+
+    @staticmethod
+    def _create_resource_info(resource: Resource, files: dict, refresh: bool,
+                              file_path: str) -> HydroShareResourceInfo:
         resource_id = resource.resource_id
         hs_file_path = get_hs_file_path(file_path)
-
-        # get all files in the resource to check if the file to be acted on already exists in the resource
-        files, refresh = self.get_files(resource)
         hs_data_path = get_hs_resource_data_path(resource_id).as_posix() + "/"
         hs_file_relative_path = hs_file_path.split(hs_data_path, 1)[1]
         return HydroShareResourceInfo(
@@ -171,47 +867,143 @@ class ResourceFileCacheManager:
         return HydroShareWrapper().user_logged_in()
 
     def create_resource_file_cache(self, resource: Resource) -> ResourceFilesCache:
-        resource_file_cache = ResourceFilesCache(_file_paths=[], _resource=resource)
-        self.resource_file_caches.append(resource_file_cache)
-        resource_file_cache.load_files_to_cache()
+        def create():
+            resource_file_cache = self._restore_resource_file_cache(resource.resource_id, resource)
+            if resource_file_cache is not None:
+                return resource_file_cache
+            resource_file_cache = ResourceFilesCache(_files={}, _resource=resource)
+            resource_file_cache.load_files_to_cache()
+            self.resource_file_caches.put(resource.resource_id, resource_file_cache)
+            return resource_file_cache
+
+        return self._single_flight(resource.resource_id, 'create', create)
+
+    def _restore_resource_file_cache(self, resource_id: str, resource: Resource = None) -> ResourceFilesCache:
+        """Restores the cache of the resource from its on-disk snapshot and revalidates it in the background
+        (stale-while-revalidate). Returns None if the resource has no usable snapshot."""
+        snapshot = ResourceListingSnapshots().load(resource_id)
+        if snapshot is None:
+            return None
+        if resource is None:
+            resource = SnapshotResource(resource_id, HydroShareWrapper().hs._hs_session)
+        resource_file_cache = ResourceFilesCache.from_snapshot(resource, snapshot)
+        self.resource_file_caches.put(resource_id, resource_file_cache)
+        increment('snapshot_restores', cache='resource')
+
+        def revalidate():
+            try:
+                # the files are listed again only if the resource has been modified since the snapshot was taken
+                self._single_flight(resource_id, 'load',
+                                    lambda: resource_file_cache.load_files_to_cache(conditional=True))
+            except Exception as e:
+                # the resource may have been deleted or the user may no longer have access to it
+                logger.error(f"Failed to revalidate the file listing snapshot of resource: {resource_id}."
+                             f" Error: {str(e)}")
+                ResourceListingSnapshots().delete(resource_id)
+                if self.resource_file_caches.peek(resource_id) is resource_file_cache:
+                    self.evict_resource(resource_id)
+
+        get_executor().submit(revalidate)
         return resource_file_cache
 
     def get_resource_file_cache(self, resource: Resource) -> ResourceFilesCache:
-        return next((rc for rc in self.resource_file_caches if rc.resource.resource_id == resource.resource_id), None)
+        return self.resource_file_caches.peek(resource.resource_id)
 
-    def get_files(self, resource: Resource, refresh=False) -> (list, bool):
-        """Get a list of file paths in a HydroShare resource. If the cache is up to date, return the cached files."""
+    def get_files(self, resource: Resource, refresh=False, folders: list[str] = None) -> (dict, bool):
+        """Get the files (keyed by file path) in a HydroShare resource. If the cache is up to date, return the cached
+        files. The files of the aggregations in the resource are included only for the files in the relative
+        'folders' - for the whole resource if 'folders' is None."""
 
         resource_file_cache = self.get_resource_file_cache(resource)
         if resource_file_cache is None:
-            rfc = self.create_resource_file_cache(resource)
-            return rfc.get_files(), True
-
-        if not refresh:
-            refresh = resource_file_cache.is_due_for_refresh()
-            if not refresh:
-                # letting the caller know that the cache doesn't need to be refreshed - it's up to date
-                return resource_file_cache.get_files(), True
-
-        if refresh:
-            resource_file_cache.load_files_to_cache()
-
-        return resource_file_cache.get_files(), refresh
+            resource_file_cache = self.create_resource_file_cache(resource)
+        elif not refresh:
+            if resource_file_cache.is_due_for_refresh():
+                # a periodic refresh lists the files only if the resource has been modified in HydroShare
+                self._single_flight(resource.resource_id, 'load',
+                                    lambda: resource_file_cache.load_files_to_cache(conditional=True))
+        else:
+            self._single_flight(resource.resource_id, 'load', resource_file_cache.load_files_to_cache)
+
+        resource_file_cache.expand_aggregations(folders)
+        # letting the caller know that the cache doesn't need to be refreshed - it's up to date
+        return resource_file_cache.get_files(), True
+
+    def evict_resource(self, resource_id: str) -> bool:
+        """Removes the resource and its cached files from the cache."""
+        evicted = self.resource_file_caches.evict(resource_id)
+        if evicted:
+            publish('files', resource_id=resource_id, path=None)
+        return evicted
+
+    def get_cache_stats(self) -> dict:
+        return self.resource_file_caches.stats()
+
+    def refresh_files_cache(self, resource: Resource) -> Future:
+        """Refreshes the file cache for the resource in the background. The returned future can be used to wait for
+        the refresh to complete. Refresh requests made while a refresh for the same resource is still waiting to
+        start share that refresh."""
+        resource_id = resource.resource_id
+        with self._loads_lock:
+            future = self._refreshes_pending.get(resource_id)
+            if future is not None:
+                return future
+
+            def refresh():
+                with self._loads_lock:
+                    self._refreshes_pending.pop(resource_id, None)
+                # the aggregations are listed again when they are looked up
+                return self.get_files(resource, refresh=True, folders=[])
+
+            def log_refresh_error(done_future):
+                if not done_future.cancelled() and done_future.exception() is not None:
+                    logger.error(f"Failed to refresh file cache for resource: {resource_id}."
+                                 f" Error: {str(done_future.exception())}")
+
+            future = get_executor().submit(refresh)
+            future.add_done_callback(log_refresh_error)
+            self._refreshes_pending[resource_id] = future
+            return future
+
+    def _single_flight(self, resource_id: str, kind: str, load_files):
+        """Runs 'load_files' for the resource unless a load of the same 'kind' for the same resource is already in
+        progress, in which case the result of the load in progress is returned. Only loads of the same kind return
+        the same result - creating a cache returns the cache, reloading an existing cache returns None."""
+        key = (resource_id, kind)
+        with self._loads_lock:
+            future = self._loads_in_progress.get(key)
+            if future is not None:
+                owner = False
+            else:
+                owner = True
+                future = Future()
+                self._loads_in_progress[key] = future
+        if not owner:
+            return future.result()
 
-    def refresh_files_cache(self, resource: Resource) -> None:
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            executor.submit(self.get_files, resource, refresh=True)
+        try:
+            result = load_files()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._loads_lock:
+                del self._loads_in_progress[key]
 
     def get_resource(self, resource_id: str) -> Resource:
-        resource = next(
-            (rc.resource for rc in self.resource_file_caches if rc.resource.resource_id == resource_id), None
-        )
-        if resource is not None:
-            return resource
+        resource_file_cache = self.resource_file_caches.get(resource_id)
+        if resource_file_cache is not None:
+            return resource_file_cache.resource
 
         if not self.user_authorized():
             err_msg = "User is not authorized with HydroShare"
             raise HydroShareAuthError(err_msg)
+        # the files listed before the server was restarted are served while they are revalidated
+        resource_file_cache = self._restore_resource_file_cache(resource_id)
+        if resource_file_cache is not None:
+            return resource_file_cache.resource
         try:
             resource = HydroShareWrapper().get_resource(resource_id)
         except Exception as e:
@@ -247,10 +1039,156 @@ class ResourceFileCacheManager:
 
     @classmethod
     def compute_checksum(cls, file_path: str):
-        md5_hash = calculate_md5(file_path)
+        md5_hash = LocalChecksumCache().get_checksum(file_path)
         return md5_hash
 
 
+class LocalChecksumCache:
+    """A persistent (sqlite) cache of md5 checksums of local files. A cached checksum is used only if the size,
+    modification time and inode of the file are unchanged since the checksum was computed. Least recently used
+    entries are evicted once the cache grows beyond HS_CHECKSUM_CACHE_MAX_ENTRIES."""
+
+    _instance: "LocalChecksumCache" = None
+
+    def __new__(cls, *args, **kwargs):
+        if not hasattr(cls, '_instance') or cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._conn = None
+            cls._instance._disabled = False
+        return cls._instance
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            db_path = get_checksum_cache_db_path()
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            # WAL journaling keeps the database consistent if the server is killed in the middle of a write
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS checksums ("
+                         "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                         "inode INTEGER NOT NULL, md5 TEXT NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS checksums_accessed_at ON checksums (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_checksum(self, file_path: str) -> str:
+        """Returns the md5 checksum of the local file 'file_path' (relative to the notebook dir), computing
+        it only if the file has changed since the checksum was last cached."""
+        absolute_file_path = get_local_absolute_file_path(file_path)
+        file_stat = os.stat(absolute_file_path)
+        cached_md5 = self._lookup(absolute_file_path, file_stat)
+        if cached_md5 is not None:
+            increment('cache_hits', cache='checksum')
+            return cached_md5
+
+        increment('cache_misses', cache='checksum')
+        with timed('checksum'):
+            md5_hash = calculate_md5(file_path)
+        # skip caching if the file was modified while we were reading it
+        if _stat_key(os.stat(absolute_file_path)) == _stat_key(file_stat):
+            self._store(absolute_file_path, file_stat, md5_hash)
+        return md5_hash
+
+    def get_checksums(self, file_paths: list[str], ignore_errors: bool = False) -> dict[str, str]:
+        """Returns the md5 checksums of the local files 'file_paths' (relative to the notebook dir) keyed by file path.
+        The files without a valid cached checksum are hashed in parallel (see hash_files). A file that can't be read
+        raises OSError unless 'ignore_errors' is True, in which case the error is logged and the file is left out."""
+        checksums = {}
+        file_stats = {}
+        for file_path in file_paths:
+            absolute_file_path = get_local_absolute_file_path(file_path)
+            try:
+                file_stat = os.stat(absolute_file_path)
+            except OSError as e:
+                if not ignore_errors:
+                    raise
+                logger.error(f"Failed to compute checksum for file: {file_path}. Error: {str(e)}")
+                continue
+            cached_md5 = self._lookup(absolute_file_path, file_stat)
+            if cached_md5 is not None:
+                increment('cache_hits', cache='checksum')
+                checksums[file_path] = cached_md5
+            else:
+                increment('cache_misses', cache='checksum')
+                file_stats[absolute_file_path] = (file_path, file_stat)
+        if not file_stats:
+            return checksums
+
+        with timed('checksum'):
+            for absolute_file_path, md5_hash in hash_files(list(file_stats)):
+                file_path, file_stat = file_stats[absolute_file_path]
+                if isinstance(md5_hash, OSError):
+                    if not ignore_errors:
+                        raise md5_hash
+                    logger.error(f"Failed to compute checksum for file: {file_path}. Error: {str(md5_hash)}")
+                    continue
+                checksums[file_path] = md5_hash
+                # skip caching if the file was modified while we were reading it
+                try:
+                    if _stat_key(os.stat(absolute_file_path)) == _stat_key(file_stat):
+                        self._store(absolute_file_path, file_stat, md5_hash)
+                except OSError:
+                    pass
+        return checksums
+
+    def get_cached_checksum(self, file_path: str, file_stat: os.stat_result = None):
+        """Returns the cached md5 checksum of the local file 'file_path' if it is still valid, otherwise None. The
+        file is never read. 'file_stat' is the current stat of the file, if the caller already has it."""
+        absolute_file_path = get_local_absolute_file_path(file_path)
+        return self._lookup(absolute_file_path, file_stat or os.stat(absolute_file_path))
+
+    def set_checksum(self, file_path: str, md5_hash: str) -> None:
+        """Caches an already known checksum (e.g., computed while downloading) of the local file 'file_path'."""
+        absolute_file_path = get_local_absolute_file_path(file_path)
+        self._store(absolute_file_path, os.stat(absolute_file_path), md5_hash)
+
+    def invalidate(self, file_path: str) -> None:
+        absolute_file_path = get_local_absolute_file_path(file_path)
+        self._execute(lambda conn: conn.execute("DELETE FROM checksums WHERE path = ?", (absolute_file_path,)))
+
+    def _lookup(self, absolute_file_path: str, file_stat: os.stat_result):
+        def lookup(conn):
+            row = conn.execute("SELECT size, mtime_ns, inode, md5 FROM checksums WHERE path = ?",
+                               (absolute_file_path,)).fetchone()
+            if row is None or tuple(row[:3]) != _stat_key(file_stat):
+                return None
+            conn.execute("UPDATE checksums SET accessed_at = ? WHERE path = ?", (time.time(), absolute_file_path))
+            return row[3]
+
+        return self._execute(lookup)
+
+    def _store(self, absolute_file_path: str, file_stat: os.stat_result, md5_hash: str) -> None:
+        max_entries = get_checksum_cache_max_entries()
+
+        def store(conn):
+            size, mtime_ns, inode = _stat_key(file_stat)
+            conn.execute("INSERT OR REPLACE INTO checksums (path, size, mtime_ns, inode, md5, accessed_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (absolute_file_path, size, mtime_ns, inode, md5_hash, time.time()))
+            (count,) = conn.execute("SELECT COUNT(*) FROM checksums").fetchone()
+            if count > max_entries:
+                conn.execute("DELETE FROM checksums WHERE path IN "
+                             "(SELECT path FROM checksums ORDER BY accessed_at LIMIT ?)", (count - max_entries,))
+
+        self._execute(store)
+
+    def _execute(self, operation):
+        # the cache is only an optimization - any database error disables it rather than failing the user action
+        if self._disabled:
+            return None
+        with self._lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    return operation(conn)
+            except sqlite3.Error as e:
+                logger.error(f"Local checksum cache is disabled. Error: {str(e)}")
+                self._disabled = True
+                return None
+
+
 @lru_cache(maxsize=None)
 def get_credentials() -> (str, str):
     """The Hydroshare user credentials files used here are created by nbfetch as part of resource
@@ -322,18 +1260,333 @@ def get_hs_file_path(file_path: str) -> str:
     return hs_file_path
 
 
+def get_hs_relative_path(local_path: str) -> str:
+    """Returns the path of a local file or folder relative to the data/contents folder of its resource
+    ('' for the data/contents folder itself)."""
+    local_path = Path(local_path).as_posix()
+    resource_id = get_resource_id(local_path)
+    hs_path = get_hs_file_path(local_path).rstrip('/') + '/'
+    hs_data_path = get_hs_resource_data_path(resource_id).as_posix() + "/"
+    if not hs_path.startswith(hs_data_path):
+        logger.error(f"Selected path is not in the data/contents folder of the resource: {local_path}")
+        raise ValueError("Selected path is not in the data/contents folder of the resource")
+    return hs_path[len(hs_data_path):].rstrip('/')
+
+
+@lru_cache(maxsize=None)
+def get_hydroshare_host() -> str:
+    return os.getenv('HS_HOST', HydroShare.default_host)
+
+
+@lru_cache(maxsize=None)
+def get_hydroshare_protocol() -> str:
+    return os.getenv('HS_PROTOCOL', HydroShare.default_protocol)
+
+
+@lru_cache(maxsize=None)
+def get_hydroshare_port() -> int:
+    return int(os.getenv('HS_PORT', HydroShare.default_port))
+
+
 @lru_cache(maxsize=None)
 def get_cache_refresh_interval() -> int:
     return int(os.getenv('CACHE_REFRESH_INTERVAL', 180))
 
 
-def calculate_md5(file_path):
-    md5_hash = hashlib.md5()
-    buffer_size = 8192  # Read in chunks of 8KB
-    file_path = get_local_absolute_file_path(file_path)
+@lru_cache(maxsize=None)
+def get_checksum_cache_max_entries() -> int:
+    return int(os.getenv('HS_CHECKSUM_CACHE_MAX_ENTRIES', 100000))
+
+
+def get_checksum_cache_db_path() -> Path:
+    return Path(jupyter_runtime_dir()) / 'hsfiles_jupyter_checksums.db'
+
+
+@lru_cache(maxsize=None)
+def get_resource_cache_max_entries() -> int:
+    return int(os.getenv('HS_RESOURCE_CACHE_MAX_ENTRIES', 50))
+
+
+@lru_cache(maxsize=None)
+def get_resource_cache_max_bytes() -> int:
+    return int(os.getenv('HS_RESOURCE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+@lru_cache(maxsize=None)
+def get_resource_cache_ttl() -> int:
+    return int(os.getenv('HS_RESOURCE_CACHE_TTL', 3600))
+
+
+@lru_cache(maxsize=None)
+def get_max_workers() -> int:
+    return int(os.getenv('HS_MAX_WORKERS', 4))
+
+
+@lru_cache(maxsize=None)
+def get_max_transfers() -> int:
+    return int(os.getenv('HS_MAX_TRANSFERS', 4))
+
+
+@lru_cache(maxsize=None)
+def get_max_transfers_per_resource() -> int:
+    return int(os.getenv('HS_MAX_TRANSFERS_PER_RESOURCE', 2))
+
+
+@lru_cache(maxsize=None)
+def get_upload_chunk_size() -> int:
+    return int(os.getenv('HS_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+
+
+@lru_cache(maxsize=None)
+def get_upload_max_retries() -> int:
+    return int(os.getenv('HS_UPLOAD_MAX_RETRIES', 3))
+
+
+@lru_cache(maxsize=None)
+def get_download_chunk_size() -> int:
+    return int(os.getenv('HS_DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+
+
+@lru_cache(maxsize=None)
+def get_progress_retention() -> int:
+    return int(os.getenv('HS_PROGRESS_RETENTION', 60))
+
+
+@lru_cache(maxsize=None)
+def get_batch_concurrency() -> int:
+    return int(os.getenv('HS_BATCH_CONCURRENCY', 4))
+
+
+@lru_cache(maxsize=None)
+def get_file_watcher_enabled() -> bool:
+    return os.getenv('HS_FILE_WATCHER', 'false').lower() in ('1', 'true', 'yes')
+
+
+@lru_cache(maxsize=None)
+def get_file_watcher_poll_interval() -> int:
+    return int(os.getenv('HS_FILE_WATCHER_POLL_INTERVAL', 5))
+
+
+@lru_cache(maxsize=None)
+def get_auto_upload_enabled() -> bool:
+    return os.getenv('HS_AUTO_UPLOAD', 'false').lower() in ('1', 'true', 'yes')
+
+
+@lru_cache(maxsize=None)
+def get_auto_upload_delay() -> int:
+    return int(os.getenv('HS_AUTO_UPLOAD_DELAY', 30))
+
+
+@lru_cache(maxsize=None)
+def get_http_pool_size() -> int:
+    return int(os.getenv('HS_HTTP_POOL_SIZE', 16))
+
 
-    with open(file_path, "rb") as file:
-        while chunk := file.read(buffer_size):
-            md5_hash.update(chunk)
+@lru_cache(maxsize=None)
+def get_retry_max_attempts() -> int:
+    return int(os.getenv('HS_RETRY_MAX_ATTEMPTS', 3))
+
+
+@lru_cache(maxsize=None)
+def get_retry_base_delay() -> float:
+    return float(os.getenv('HS_RETRY_BASE_DELAY', 0.5))
+
+
+@lru_cache(maxsize=None)
+def get_retry_max_delay() -> float:
+    return float(os.getenv('HS_RETRY_MAX_DELAY', 30))
+
+
+@lru_cache(maxsize=None)
+def get_circuit_breaker_threshold() -> int:
+    return int(os.getenv('HS_CIRCUIT_BREAKER_THRESHOLD', 5))
+
+
+@lru_cache(maxsize=None)
+def get_circuit_breaker_cooldown() -> int:
+    return int(os.getenv('HS_CIRCUIT_BREAKER_COOLDOWN', 30))
+
+
+@lru_cache(maxsize=None)
+def get_warmup_max_files() -> int:
+    return int(os.getenv('HS_WARMUP_MAX_FILES', 10000))
+
+
+@lru_cache(maxsize=None)
+def get_event_keepalive_interval() -> int:
+    return int(os.getenv('HS_EVENT_KEEPALIVE_INTERVAL', 15))
+
+
+@lru_cache(maxsize=None)
+def get_job_retention() -> int:
+    return int(os.getenv('HS_JOB_RETENTION', 3600))
+
+
+@lru_cache(maxsize=None)
+def get_jobs_persist_enabled() -> bool:
+    return os.getenv('HS_JOBS_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_jobs_file_path() -> Path:
+    return Path(jupyter_runtime_dir()) / 'hsfiles_jupyter_jobs.json'
 
+
+@lru_cache(maxsize=None)
+def get_listing_snapshots_enabled() -> bool:
+    return os.getenv('HS_LISTING_SNAPSHOTS', 'true').lower() in ('1', 'true', 'yes')
+
+
+@lru_cache(maxsize=None)
+def get_listing_snapshot_max_age() -> int:
+    return int(os.getenv('HS_LISTING_SNAPSHOT_MAX_AGE', 7 * 24 * 3600))
+
+
+def get_listing_snapshot_dir() -> Path:
+    return Path(jupyter_runtime_dir()) / 'hsfiles_jupyter_listings'
+
+
+@lru_cache(maxsize=None)
+def get_hash_workers() -> int:
+    # 0 disables the hashing process pool - all files are then hashed in the calling thread
+    return int(os.getenv('HS_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+
+
+@lru_cache(maxsize=None)
+def get_hash_process_min_size() -> int:
+    return int(os.getenv('HS_HASH_PROCESS_MIN_SIZE', 4 * 1024 * 1024))
+
+
+@lru_cache(maxsize=None)
+def get_hash_buffer_size() -> int:
+    return int(os.getenv('HS_HASH_BUFFER_SIZE', 1024 * 1024))
+
+
+_executor: ThreadPoolExecutor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the bounded thread pool used by the server extension to run blocking HydroShare calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_max_workers(), thread_name_prefix='hsfiles_jupyter')
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """Stops the worker thread pool and the hashing process pool without waiting for their work. Both are created
+    again on next use (e.g., by the next test)."""
+    global _executor, _hash_process_pool
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+    with _hash_process_pool_lock:
+        if _hash_process_pool is not None:
+            _hash_process_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_process_pool = None
+
+
+_hash_process_pool: ProcessPoolExecutor = None
+_hash_process_pool_lock = threading.Lock()
+# set if the workers of the hashing process pool could not be started - files are then hashed in the calling thread
+_hash_process_pool_broken = False
+
+
+def get_hash_process_pool():
+    """Returns the process pool used to hash large local files in parallel, or None if it is disabled with
+    HS_HASH_WORKERS=0. Hashing in separate processes keeps it from competing with the server for the GIL."""
+    global _hash_process_pool
+    if get_hash_workers() < 1 or _hash_process_pool_broken:
+        return None
+    with _hash_process_pool_lock:
+        if _hash_process_pool is None:
+            # the server process is multithreaded, so the workers are spawned rather than forked
+            _hash_process_pool = ProcessPoolExecutor(max_workers=get_hash_workers(),
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return _hash_process_pool
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Runs a blocking callable (hsclient api calls, file hashing etc.) in the extension thread pool so that the
+    Tornado event loop is free to serve other requests while the call is in progress."""
+    loop = asyncio.get_running_loop()
+    # the callable runs in a copy of the current context, so that the stages it times are added to the timings of the
+    # request being served
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def calculate_md5(file_path):
+    return calculate_file_md5(get_local_absolute_file_path(file_path), get_hash_buffer_size())
+
+
+def calculate_file_md5(absolute_file_path: str, buffer_size: int) -> str:
+    # module level function so that it can be run in the hashing process pool
+    with open(absolute_file_path, "rb") as file:
+        if hasattr(hashlib, 'file_digest'):
+            # python 3.11+ - reads the file into a reused buffer and hashes it without holding the GIL
+            return hashlib.file_digest(file, 'md5').hexdigest()
+        md5_hash = hashlib.md5()
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while size := file.readinto(buffer):
+            md5_hash.update(view[:size])
     return md5_hash.hexdigest()
+
+
+def hash_files(absolute_file_paths: list[str]):
+    """Computes the md5 checksums of the local files 'absolute_file_paths', yielding (absolute file path, checksum or
+    OSError) pairs in the order the files are hashed. Files of at least HS_HASH_PROCESS_MIN_SIZE bytes are hashed in
+    parallel in the hashing process pool while the smaller ones are hashed in the calling thread. At most
+    HS_HASH_WORKERS files are submitted to the pool at a time, so memory use is bounded by the number of workers
+    times the read buffer size regardless of the number of files."""
+    buffer_size = get_hash_buffer_size()
+    process_pool = get_hash_process_pool()
+    process_min_size = get_hash_process_min_size()
+    in_flight = {}
+
+    def hash_file(absolute_file_path):
+        try:
+            return calculate_file_md5(absolute_file_path, buffer_size)
+        except OSError as e:
+            return e
+
+    def completed(futures):
+        global _hash_process_pool_broken
+        for future in futures:
+            absolute_file_path = in_flight.pop(future)
+            try:
+                yield absolute_file_path, future.result()
+            except OSError as e:
+                yield absolute_file_path, e
+            except BrokenProcessPool as e:
+                if not _hash_process_pool_broken:
+                    logger.error(f"Hashing process pool is disabled. Error: {str(e)}")
+                    _hash_process_pool_broken = True
+                yield absolute_file_path, hash_file(absolute_file_path)
+
+    for absolute_file_path in absolute_file_paths:
+        try:
+            large_file = process_pool is not None and os.path.getsize(absolute_file_path) >= process_min_size
+        except OSError as e:
+            yield absolute_file_path, e
+            continue
+        if large_file:
+            if len(in_flight) >= get_hash_workers():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from completed(done)
+            try:
+                in_flight[process_pool.submit(calculate_file_md5, absolute_file_path, buffer_size)] = absolute_file_path
+                continue
+            except BrokenProcessPool:
+                pass
+        yield absolute_file_path, hash_file(absolute_file_path)
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        yield from completed(done)
+
+
+def _stat_key(file_stat: os.stat_result) -> tuple:
+    return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
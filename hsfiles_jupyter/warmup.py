@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .utils import (
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    logger,
+    get_executor,
+    get_local_absolute_file_path,
+    get_resource_cache_ttl,
+    get_resource_id,
+    get_warmup_max_files,
+)
+
+# local checksums are prefetched by a single thread so that warm-ups never compete with the user's own actions for
+# the workers of the extension thread pool
+_checksum_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hsfiles_jupyter_warmup')
+
+# monotonic time of the last warm-up keyed by resource id
+_warmed_up_at: dict[str, float] = {}
+_warmed_up_lock = threading.Lock()
+
+
+def _get_local_contents_path(path: str, resource_id: str):
+    # a resource is downloaded either to Downloads/<id>/data/contents or to Downloads/<id>/<id>/data/contents
+    for local_resource_path in (Path('Downloads') / resource_id / resource_id, Path('Downloads') / resource_id):
+        contents_path = local_resource_path / 'data' / 'contents'
+        if os.path.isdir(get_local_absolute_file_path(contents_path.as_posix())):
+            return contents_path.as_posix()
+    return None
+
+
+def _prefetch_checksums(contents_path: str) -> None:
+    absolute_contents_path = get_local_absolute_file_path(contents_path)
+    file_paths = []
+    for dir_path, dir_names, file_names in os.walk(absolute_contents_path):
+        dir_names[:] = [dir_name for dir_name in dir_names if not dir_name.startswith('.')]
+        relative_dir_path = Path(contents_path) / Path(dir_path).relative_to(absolute_contents_path)
+        for file_name in file_names:
+            if file_name.startswith('.'):
+                continue
+            if len(file_paths) >= get_warmup_max_files():
+                break
+            file_paths.append((relative_dir_path / file_name).as_posix())
+    LocalChecksumCache().get_checksums(file_paths, ignore_errors=True)
+
+
+def _warm_up(resource_id: str, contents_path: str) -> None:
+    rfc_manager = ResourceFileCacheManager()
+    try:
+        if not rfc_manager.user_authorized():
+            return
+        # loads the resource and its file listing into the resource file cache
+        rfc_manager.get_resource(resource_id)
+    except Exception as e:
+        # a failed warm-up is retried the next time the resource is opened
+        logger.error(f"Failed to warm up the cache for resource: {resource_id}. Error: {str(e)}")
+        with _warmed_up_lock:
+            _warmed_up_at.pop(resource_id, None)
+        return
+    if contents_path is not None:
+        _checksum_prefetch_executor.submit(_prefetch_checksums, contents_path)
+
+
+def warm_up_resource(path: str) -> bool:
+    """Starts loading the resource of the local file or folder 'path' and its file listing from HydroShare, and
+    hashing its local files, in the background. Returns False if the resource was already warmed up recently."""
+    resource_id = get_resource_id(Path(path).as_posix())
+    now = time.monotonic()
+    with _warmed_up_lock:
+        warmed_up_at = _warmed_up_at.get(resource_id)
+        if warmed_up_at is not None and now - warmed_up_at < get_resource_cache_ttl():
+            return False
+        _warmed_up_at[resource_id] = now
+    get_executor().submit(_warm_up, resource_id, _get_local_contents_path(path, resource_id))
+    return True
+
+
+async def warm_up(path: str):
+    """Warms up the caches for the HydroShare resource of the local file or folder 'path'"""
+    try:
+        started = warm_up_resource(path)
+    except ValueError as e:
+        return {"error": str(e)}
+    resource_id = get_resource_id(Path(path).as_posix())
+    if not started:
+        return {"success": f"Cache for resource {resource_id} is already warm"}
+    return {"success": f"Started warming up the cache for resource {resource_id}"}
@@ -35,6 +35,9 @@ setup(
         'jupyter_server==2.13.*',
     ],
     extras_require={
+        'watcher': [
+            'watchdog'
+        ],
         'dev': [
             'build',
             'setuptools',
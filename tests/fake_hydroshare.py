@@ -0,0 +1,452 @@
+"""An in-process fake of the HydroShare REST api used by hsclient and this extension, for exercising the real resource,
+cache and transfer code paths without a HydroShare server. The latency, bandwidth and failure rate of the fake server
+are configurable."""
+
+import asyncio
+import hashlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from unittest.mock import patch
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+from hsmodels.schemas import rdf_string
+from hsmodels.schemas.aggregations import FileSetMetadata
+from hsmodels.schemas.fields import Creator, Rights
+from hsmodels.schemas.resource import ResourceMetadata
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+from hsfiles_jupyter import utils
+
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# env settings cached by the extension that must be re-read for each fake server
+_CACHED_SETTINGS = [
+    utils.get_credentials,
+    utils.get_hydroshare_host,
+    utils.get_hydroshare_protocol,
+    utils.get_hydroshare_port,
+]
+
+
+@dataclass
+class FakeResource:
+    resource_id: str
+    # file contents keyed by the file path relative to the data/contents folder
+    files: dict[str, bytes] = field(default_factory=dict)
+    checksums: dict[str, str] = field(default_factory=dict)
+    # folders (relative to the data/contents folder) that are file set aggregations
+    aggregations: set[str] = field(default_factory=set)
+    modified_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    _resource_map: str = None
+    _metadata: str = None
+
+    def add_file(self, file_path: str, content: bytes) -> None:
+        self.files[file_path] = content
+        self.checksums[file_path] = hashlib.md5(content).hexdigest()
+        self._modified()
+
+    def delete_file(self, file_path: str) -> bool:
+        if self.files.pop(file_path, None) is None:
+            return False
+        del self.checksums[file_path]
+        self._modified()
+        return True
+
+    def add_aggregation(self, folder: str) -> None:
+        """Makes the 'folder' (with its files and sub folders) a file set aggregation."""
+        self.aggregations.add(folder)
+        self._modified()
+
+    def _modified(self) -> None:
+        self.modified_at = datetime.now(timezone.utc)
+        self._resource_map = None
+
+    def get_aggregation(self, file_path: str):
+        """Returns the folder of the (innermost) aggregation the file is in or None."""
+        folders = [folder for folder in self.aggregations if file_path.startswith(f"{folder}/")]
+        return max(folders, key=len) if folders else None
+
+    @staticmethod
+    def aggregation_map_path(folder: str) -> str:
+        return f"{folder}/{folder.rpartition('/')[2]}_resmap.xml"
+
+    @staticmethod
+    def aggregation_metadata_path(folder: str) -> str:
+        return f"{folder}/{folder.rpartition('/')[2]}_meta.xml"
+
+    def resource_map(self, base_url: str) -> str:
+        if self._resource_map is None:
+            url = f"{base_url}/resource/{self.resource_id}"
+            self._resource_map = self._map(url, f"{url}/data/resourcemap.xml", f"{url}/data/resourcemetadata.xml", None)
+        return self._resource_map
+
+    def aggregation_map(self, base_url: str, folder: str) -> str:
+        url = f"{base_url}/resource/{self.resource_id}"
+        return self._map(url, f"{url}/data/contents/{quote(self.aggregation_map_path(folder))}",
+                         f"{url}/data/contents/{quote(self.aggregation_metadata_path(folder))}", folder)
+
+    def _map(self, url: str, map_url: str, metadata_url: str, aggregation) -> str:
+        # the map of the resource (aggregation None) or of one of its aggregations lists the files of the resource or
+        # aggregation that are not in a nested aggregation, and the maps of the nested aggregations
+        aggregated = [f"{quote(self.aggregation_map_path(folder))}#aggregation" for folder in sorted(self.aggregations)
+                      if self.get_aggregation(folder) == aggregation]
+        aggregated += [quote(path) for path in sorted(self.files) if self.get_aggregation(path) == aggregation]
+        aggregates = "".join(f'    <ore:aggregates rdf:resource={quoteattr(f"{url}/data/contents/{path}")}/>\n'
+                             for path in aggregated)
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rdf:RDF xmlns:citoterms="http://purl.org/spar/cito/" xmlns:dc="http://purl.org/dc/elements/1.1/"\n'
+            '  xmlns:ore="http://www.openarchives.org/ore/terms/"'
+            ' xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">\n'
+            f'  <rdf:Description rdf:about="{map_url}">\n'
+            f'    <dc:identifier>{escape(self.resource_id)}</dc:identifier>\n'
+            f'    <ore:describes rdf:resource="{map_url}#aggregation"/>\n'
+            '    <rdf:type rdf:resource="http://www.openarchives.org/ore/terms/ResourceMap"/>\n'
+            '  </rdf:Description>\n'
+            f'  <rdf:Description rdf:about="{map_url}#aggregation">\n'
+            f'{aggregates}'
+            '    <dc:title>Fake resource</dc:title>\n'
+            f'    <ore:isDescribedBy rdf:resource="{map_url}"/>\n'
+            f'    <citoterms:isDocumentedBy rdf:resource="{metadata_url}"/>\n'
+            '    <rdf:type rdf:resource="http://www.openarchives.org/ore/terms/Aggregation"/>\n'
+            '  </rdf:Description>\n'
+            '</rdf:RDF>\n'
+        )
+
+    def aggregation_metadata(self, base_url: str, folder: str) -> str:
+        map_url = f"{base_url}/resource/{self.resource_id}/data/contents/{quote(self.aggregation_map_path(folder))}"
+        rights = Rights(statement="This resource is shared under the Creative Commons Attribution CC BY.",
+                        url="http://creativecommons.org/licenses/by/4.0/")
+        metadata = FileSetMetadata(title=folder, url=f"{map_url}#aggregation", rights=rights)
+        return rdf_string(metadata, rdf_format='xml')
+
+    def metadata(self, base_url: str) -> str:
+        if self._metadata is None:
+            url = f"{base_url}/resource/{self.resource_id}"
+            metadata = ResourceMetadata(title="Fake resource", abstract="A resource of the fake HydroShare server",
+                                        identifier=url, url=url, creators=[Creator(name="Fake")])
+            self._metadata = rdf_string(metadata, rdf_format='xml')
+        return self._metadata
+
+    def manifest(self) -> str:
+        return "".join(f"{checksum}    data/contents/{path}\n" for path, checksum in self.checksums.items())
+
+
+class FakeHydroShare:
+    """A fake HydroShare server running on its own event loop thread. Every request is delayed by 'latency' seconds,
+    request and response bodies are transferred at 'bandwidth' bytes per second (unlimited if None) and a
+    'failure_rate' fraction of the requests fail with a 503 response."""
+
+    def __init__(self, latency: float = 0.0, bandwidth: int = None, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.resources: dict[str, FakeResource] = {}
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._failures_to_inject = []
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self.port = None
+
+    @property
+    def host(self) -> str:
+        return '127.0.0.1'
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def add_resource(self, files: dict[str, bytes] = None) -> FakeResource:
+        resource = FakeResource(resource_id=uuid.uuid4().hex)
+        for file_path, content in (files or {}).items():
+            resource.add_file(file_path, content)
+        self.resources[resource.resource_id] = resource
+        return resource
+
+    def fail_next(self, count: int = 1, status_code: int = 503) -> None:
+        """Makes the next 'count' requests fail with 'status_code'."""
+        with self._lock:
+            self._failures_to_inject.extend([status_code] * count)
+
+    def next_failure(self):
+        with self._lock:
+            self.request_count += 1
+            if self._failures_to_inject:
+                return self._failures_to_inject.pop(0)
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return 503
+        return None
+
+    async def throttle(self, byte_count: int) -> None:
+        if self.bandwidth:
+            await asyncio.sleep(byte_count / self.bandwidth)
+
+    def start(self) -> None:
+        sockets = bind_sockets(0, self.host)
+        self.port = sockets[0].getsockname()[1]
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            server = HTTPServer(self._make_app(), max_body_size=1024 ** 3)
+            server.add_sockets(sockets)
+            self._loop.call_soon(started.set)
+            self._loop.run_forever()
+            server.stop()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake_hydroshare', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _make_app(self) -> Application:
+        resource_path = r"/resource/([0-9a-f]{32})"
+        hsapi_path = r"/hsapi/resource/([0-9a-f]{32})"
+        handler_args = {"fake_hydroshare": self}
+        return Application([
+            (r"/hsapi/userInfo/?", UserInfoHandler, handler_args),
+            (rf"{resource_path}/data/resourcemap\.xml/?", ResourceMapHandler, handler_args),
+            (rf"{resource_path}/data/resourcemetadata\.xml/?", ResourceMetadataHandler, handler_args),
+            (rf"{resource_path}/manifest-md5\.txt/?", ManifestHandler, handler_args),
+            (rf"{resource_path}/data/contents/(.+?)/?", FileContentHandler, handler_args),
+            (rf"{hsapi_path}/sysmeta/?", SystemMetadataHandler, handler_args),
+            (rf"{hsapi_path}/functions/unzip/data/contents/(.+?)/?", UnzipHandler, handler_args),
+            (rf"{hsapi_path}/functions/move-or-rename/?", MoveOrRenameHandler, handler_args),
+            (rf"{hsapi_path}/files/?(.*?)/?", FilesHandler, handler_args),
+        ])
+
+
+class FakeHydroShareHandler(RequestHandler):
+    def initialize(self, fake_hydroshare: FakeHydroShare):
+        self.fake_hydroshare = fake_hydroshare
+
+    async def prepare(self):
+        if self.fake_hydroshare.latency:
+            await asyncio.sleep(self.fake_hydroshare.latency)
+        status_code = self.fake_hydroshare.next_failure()
+        if status_code is not None:
+            self.set_status(status_code)
+            if status_code in (429, 503):
+                self.set_header('Retry-After', '0')
+            self.finish()
+            return
+        await self.fake_hydroshare.throttle(len(self.request.body or b''))
+
+    def get_resource(self, resource_id: str) -> FakeResource:
+        resource = self.fake_hydroshare.resources.get(resource_id)
+        if resource is None:
+            self.send_error(404)
+        return resource
+
+    async def write_body(self, body: bytes) -> None:
+        self.set_header('Content-Length', str(len(body)))
+        for offset in range(0, len(body), _DOWNLOAD_CHUNK_SIZE):
+            chunk = body[offset:offset + _DOWNLOAD_CHUNK_SIZE]
+            self.write(chunk)
+            await self.flush()
+            await self.fake_hydroshare.throttle(len(chunk))
+        self.finish()
+
+
+class UserInfoHandler(FakeHydroShareHandler):
+    def get(self):
+        self.write({"username": "fake_user", "id": 1})
+
+
+class ResourceMapHandler(FakeHydroShareHandler):
+    async def get(self, resource_id):
+        resource = self.get_resource(resource_id)
+        if resource is not None:
+            self.set_header('Content-Type', 'application/rdf+xml')
+            await self.write_body(resource.resource_map(self.fake_hydroshare.base_url).encode())
+
+
+class ResourceMetadataHandler(FakeHydroShareHandler):
+    async def get(self, resource_id):
+        resource = self.get_resource(resource_id)
+        if resource is not None:
+            self.set_header('Content-Type', 'application/rdf+xml')
+            await self.write_body(resource.metadata(self.fake_hydroshare.base_url).encode())
+
+
+class ManifestHandler(FakeHydroShareHandler):
+    async def get(self, resource_id):
+        resource = self.get_resource(resource_id)
+        if resource is not None:
+            await self.write_body(resource.manifest().encode())
+
+
+class FileContentHandler(FakeHydroShareHandler):
+    async def get(self, resource_id, file_path):
+        resource = self.get_resource(resource_id)
+        if resource is None:
+            return
+        for folder in resource.aggregations:
+            if file_path == resource.aggregation_map_path(folder):
+                self.set_header('Content-Type', 'application/rdf+xml')
+                await self.write_body(resource.aggregation_map(self.fake_hydroshare.base_url, folder).encode())
+                return
+            if file_path == resource.aggregation_metadata_path(folder):
+                self.set_header('Content-Type', 'application/rdf+xml')
+                await self.write_body(resource.aggregation_metadata(self.fake_hydroshare.base_url, folder).encode())
+                return
+        if file_path not in resource.files:
+            self.send_error(404)
+            return
+        self.set_header('Content-Type', 'application/octet-stream')
+        await self.write_body(resource.files[file_path])
+
+
+class SystemMetadataHandler(FakeHydroShareHandler):
+    def get(self, resource_id):
+        resource = self.get_resource(resource_id)
+        if resource is not None:
+            self.write({"resource_id": resource_id, "date_last_updated": resource.modified_at.isoformat()})
+
+
+class FilesHandler(FakeHydroShareHandler):
+    def post(self, resource_id, folder):
+        resource = self.get_resource(resource_id)
+        if resource is None:
+            return
+        uploaded_file = self.request.files['file'][0]
+        file_path = f"{folder.strip('/')}/{uploaded_file.filename}" if folder else uploaded_file.filename
+        if file_path in resource.files:
+            self.send_error(400)
+            return
+        resource.add_file(file_path, uploaded_file.body)
+        self.set_status(201)
+        self.write({"resource_id": resource_id, "file_name": file_path})
+
+    def delete(self, resource_id, file_path):
+        resource = self.get_resource(resource_id)
+        if resource is None:
+            return
+        if not resource.delete_file(file_path):
+            self.send_error(404)
+            return
+        self.write({"resource_id": resource_id, "file_name": file_path})
+
+
+class MoveOrRenameHandler(FakeHydroShareHandler):
+    def post(self, resource_id):
+        resource = self.get_resource(resource_id)
+        if resource is None:
+            return
+        source_path = self.get_body_argument('source_path')
+        target_path = self.get_body_argument('target_path')
+        if source_path not in resource.files or target_path in resource.files:
+            self.send_error(400)
+            return
+        content = resource.files[source_path]
+        resource.delete_file(source_path)
+        resource.add_file(target_path, content)
+        self.write({"resource_id": resource_id, "target_rel_path": target_path})
+
+
+class UnzipHandler(FakeHydroShareHandler):
+    def post(self, resource_id, zip_file_path):
+        resource = self.get_resource(resource_id)
+        if resource is None:
+            return
+        zip_content = resource.files.get(zip_file_path)
+        if zip_content is None:
+            self.send_error(404)
+            return
+        folder = zip_file_path.rpartition('/')[0]
+        if self.get_body_argument('overwrite', 'false').lower() != 'true':
+            # like HydroShare, unzips into a new folder named after the zip file rather than next to it
+            folder = os.path.splitext(zip_file_path)[0]
+        with zipfile.ZipFile(io.BytesIO(zip_content)) as zip_file:
+            for member in zip_file.infolist():
+                if member.is_dir():
+                    continue
+                file_path = f"{folder}/{member.filename}" if folder else member.filename
+                resource.add_file(file_path, zip_file.read(member))
+        resource.delete_file(zip_file_path)
+        self.write({"resource_id": resource_id, "unzip_path": zip_file_path})
+
+
+class FakeHydroShareTestCase(unittest.TestCase):
+    """A test case that runs the extension against a fake HydroShare server (started with start_fake_hydroshare), with
+    a temporary notebook dir and jupyter runtime dir."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_hydroshare = None
+        env = {
+            'HS_USER': 'fake_user',
+            'HS_PASS': 'fake_password',
+            'JUPYTER_RUNTIME_DIR': os.path.join(self.temp_dir, 'runtime'),
+        }
+        self.env_patch = patch.dict(os.environ, env)
+        self.env_patch.start()
+        self.notebook_dir_patch = patch('hsfiles_jupyter.utils.get_notebook_dir', return_value=self.temp_dir)
+        self.notebook_dir_patch.start()
+
+    def tearDown(self):
+        self.stop_fake_hydroshare()
+        self.notebook_dir_patch.stop()
+        self.env_patch.stop()
+        reset_extension_state()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def start_fake_hydroshare(self, **kwargs) -> FakeHydroShare:
+        self.fake_hydroshare = FakeHydroShare(**kwargs)
+        self.fake_hydroshare.start()
+        # restored by the env patch
+        os.environ.update({'HS_HOST': self.fake_hydroshare.host, 'HS_PROTOCOL': 'http',
+                           'HS_PORT': str(self.fake_hydroshare.port)})
+        reset_extension_state()
+        return self.fake_hydroshare
+
+    def stop_fake_hydroshare(self) -> None:
+        if self.fake_hydroshare is None:
+            return
+        # background work of the extension (e.g., cache refreshes) is finished before the fake server is stopped
+        utils.get_executor().shutdown(wait=True)
+        utils.shutdown_executor()
+        self.fake_hydroshare.stop()
+        self.fake_hydroshare = None
+        reset_extension_state()
+
+    def write_local_file(self, resource_id: str, file_path: str, content: bytes) -> str:
+        """Writes the local copy of the resource file and returns its path relative to the notebook dir."""
+        local_file_path = f"Downloads/{resource_id}/data/contents/{file_path}"
+        absolute_file_path = os.path.join(self.temp_dir, local_file_path)
+        os.makedirs(os.path.dirname(absolute_file_path), exist_ok=True)
+        with open(absolute_file_path, 'wb') as local_file:
+            local_file.write(content)
+        return local_file_path
+
+    def read_local_file(self, local_file_path: str) -> bytes:
+        with open(os.path.join(self.temp_dir, local_file_path), 'rb') as local_file:
+            return local_file.read()
+
+
+def reset_extension_state() -> None:
+    """Drops the session, the caches and the cached settings of the extension."""
+    for setting in _CACHED_SETTINGS:
+        setting.cache_clear()
+    utils.HydroShareWrapper._instance = None
+    utils.ResourceFileCacheManager.resource_file_caches = utils.ResourceFilesCacheStore()
+    utils.LocalChecksumCache._instance = None
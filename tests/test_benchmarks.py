@@ -0,0 +1,195 @@
+"""Benchmarks of the file operations against the fake HydroShare server (tests/fake_hydroshare.py). They are skipped
+unless HS_RUN_BENCHMARKS is set:
+
+    HS_RUN_BENCHMARKS=1 python -m pytest -s tests/test_benchmarks.py
+
+Resource sizes (number of files) are set with HS_BENCHMARK_SIZES (default "10,100,1000,10000,100000") and the number of
+operations in progress at a time in the concurrent benchmarks with HS_BENCHMARK_CONCURRENCY (default 10). Results are
+printed, written as json to HS_BENCHMARK_RESULTS (if set) and, if HS_BENCHMARK_BASELINE points to the results of an
+earlier run, each p99 latency must be within HS_BENCHMARK_TOLERANCE (default 1.5) times its baseline."""
+
+import asyncio
+import json
+import os
+import time
+import unittest
+
+from fake_hydroshare import FakeHydroShareTestCase, reset_extension_state
+
+from hsfiles_jupyter import utils
+from hsfiles_jupyter.check_file_status import check_file_status
+from hsfiles_jupyter.delete_file import delete_file_from_hydroshare
+from hsfiles_jupyter.refresh_file import refresh_file_from_hydroshare
+from hsfiles_jupyter.upload_file import upload_file_to_hydroshare
+
+RUN_BENCHMARKS = bool(os.getenv('HS_RUN_BENCHMARKS'))
+RESOURCE_SIZES = [int(size) for size in os.getenv('HS_BENCHMARK_SIZES', '10,100,1000,10000,100000').split(',')]
+ITERATIONS = int(os.getenv('HS_BENCHMARK_ITERATIONS', 20))
+FILE_SIZE = int(os.getenv('HS_BENCHMARK_FILE_SIZE', 1024 * 1024))
+CONCURRENCY = int(os.getenv('HS_BENCHMARK_CONCURRENCY', 10))
+
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, "benchmarks run only when HS_RUN_BENCHMARKS is set")
+class TestBenchmarks(FakeHydroShareTestCase):
+    results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if not cls.results:
+            return
+        print()
+        print(f"{'benchmark':<40} {'ops/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'errors':>7}")
+        for name, result in cls.results.items():
+            print(f"{name:<40} {result['throughput']:>10.1f} {result['p50'] * 1000:>10.1f}"
+                  f" {result['p99'] * 1000:>10.1f} {result['errors']:>7}")
+        results_path = os.getenv('HS_BENCHMARK_RESULTS')
+        if results_path:
+            with open(results_path, 'w') as results_file:
+                json.dump(cls.results, results_file, indent=2)
+
+    def create_resource(self, file_count: int):
+        """Creates a resource with 'file_count' small files in HydroShare and downloads the first ITERATIONS of
+        them. Returns the local path of the data/contents folder of the resource and the downloaded file paths."""
+        files = {f"folder_{index // 1000}/file_{index}.txt": f"content of file {index}\n".encode()
+                 for index in range(file_count)}
+        resource = self.fake_hydroshare.add_resource(files)
+        contents_path = f"Downloads/{resource.resource_id}/data/contents"
+        local_file_paths = []
+        for file_path in list(files)[:ITERATIONS]:
+            local_file_path = f"{contents_path}/{file_path}"
+            os.makedirs(os.path.dirname(os.path.join(self.temp_dir, local_file_path)), exist_ok=True)
+            with open(os.path.join(self.temp_dir, local_file_path), 'wb') as local_file:
+                local_file.write(files[file_path])
+            local_file_paths.append(local_file_path)
+        return contents_path, local_file_paths
+
+    def create_upload_files(self, contents_path: str, count: int) -> list[str]:
+        """Writes 'count' local files of FILE_SIZE random bytes to upload to the resource. Returns their paths."""
+        upload_paths = []
+        for index in range(count):
+            upload_path = f"{contents_path}/uploads/upload_{index}.bin"
+            os.makedirs(os.path.dirname(os.path.join(self.temp_dir, upload_path)), exist_ok=True)
+            with open(os.path.join(self.temp_dir, upload_path), 'wb') as upload_file:
+                upload_file.write(os.urandom(FILE_SIZE))
+            upload_paths.append(upload_path)
+        return upload_paths
+
+    def record(self, name: str, latencies: list[float], errors: int, elapsed: float) -> None:
+        result = {
+            "throughput": len(latencies) / elapsed if elapsed else 0,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "errors": errors,
+        }
+        self.results[name] = result
+        baseline_path = os.getenv('HS_BENCHMARK_BASELINE')
+        if baseline_path:
+            with open(baseline_path) as baseline_file:
+                baseline = json.load(baseline_file).get(name)
+            if baseline is not None:
+                tolerance = float(os.getenv('HS_BENCHMARK_TOLERANCE', 1.5))
+                self.assertLessEqual(result["p99"], baseline["p99"] * tolerance,
+                                     f"p99 latency of {name} regressed from {baseline['p99']:.3f}s")
+
+    async def measure(self, name: str, operation, file_paths: list[str]) -> None:
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for file_path in file_paths:
+            operation_started = time.perf_counter()
+            response = await operation(file_path)
+            latencies.append(time.perf_counter() - operation_started)
+            if "error" in response:
+                errors += 1
+        self.record(name, latencies, errors, time.perf_counter() - started)
+
+    async def measure_concurrent(self, name: str, operation, file_paths: list[str]) -> None:
+        # up to CONCURRENCY operations are in progress at a time, like requests from several browser tabs or users
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        latencies = []
+        errors = 0
+
+        async def run_operation(file_path):
+            nonlocal errors
+            async with semaphore:
+                operation_started = time.perf_counter()
+                response = await operation(file_path)
+                latencies.append(time.perf_counter() - operation_started)
+                if "error" in response:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_operation(file_path) for file_path in file_paths))
+        self.record(name, latencies, errors, time.perf_counter() - started)
+
+    def test_file_operations(self):
+        for file_count in RESOURCE_SIZES:
+            with self.subTest(file_count=file_count):
+                self.start_fake_hydroshare(latency=0.005)
+                contents_path, file_paths = self.create_resource(file_count)
+                upload_paths = self.create_upload_files(contents_path, ITERATIONS)
+
+                async def run_benchmarks():
+                    # the first status check loads the resource and its file listing
+                    await self.measure(f"status (cold) {file_count} files", check_file_status, file_paths[:1])
+                    await self.measure(f"status {file_count} files", check_file_status, file_paths)
+                    await self.measure(f"upload {file_count} files", upload_file_to_hydroshare, upload_paths)
+                    # the local copies are modified so that refresh has to download them
+                    for upload_path in upload_paths:
+                        with open(os.path.join(self.temp_dir, upload_path), 'ab') as upload_file:
+                            upload_file.write(b'modified')
+                    await self.measure(f"refresh {file_count} files", refresh_file_from_hydroshare, upload_paths)
+                    await self.measure(f"delete {file_count} files", delete_file_from_hydroshare, upload_paths)
+                    # after a restart the first status check is served from the on-disk snapshot of the file listing
+                    utils.ResourceListingSnapshots().flush()
+                    reset_extension_state()
+                    await self.measure(f"status (restart) {file_count} files", check_file_status, file_paths[:1])
+                    # the restored listing is revalidated in the background - wait for it before the server is stopped
+                    rfc_manager = utils.ResourceFileCacheManager()
+                    resource = rfc_manager.get_resource(utils.get_resource_id(file_paths[0]))
+                    await asyncio.wrap_future(rfc_manager.refresh_files_cache(resource))
+
+                asyncio.run(run_benchmarks())
+                self.stop_fake_hydroshare()
+
+    def test_file_operations_with_failures(self):
+        # 10% of the requests to the slow (50ms latency, 10MB/s) fake server fail and are retried
+        self.start_fake_hydroshare(latency=0.05, bandwidth=10 * 1024 * 1024, failure_rate=0.1)
+        contents_path, file_paths = self.create_resource(1000)
+
+        async def run_benchmarks():
+            await self.measure("status with failures 1000 files", check_file_status, file_paths)
+            for file_path in file_paths:
+                with open(os.path.join(self.temp_dir, file_path), 'ab') as local_file:
+                    local_file.write(b'modified')
+            await self.measure("refresh with failures 1000 files", refresh_file_from_hydroshare, file_paths)
+
+        asyncio.run(run_benchmarks())
+
+    def test_concurrent_file_operations(self):
+        self.start_fake_hydroshare(latency=0.005)
+        resources = [self.create_resource(1000) for _ in range(4)]
+        upload_paths = [self.create_upload_files(contents_path, ITERATIONS) for contents_path, _ in resources]
+        # the operations of the resources are interleaved
+        all_file_paths = [file_path for file_paths in zip(*(file_paths for _, file_paths in resources))
+                          for file_path in file_paths]
+        all_upload_paths = [upload_path for paths in zip(*upload_paths[1:]) for upload_path in paths]
+
+        async def run_benchmarks():
+            # the resources and their file listings are loaded before the concurrent requests
+            for _, file_paths in resources:
+                await check_file_status(file_paths[0])
+            await self.measure_concurrent("concurrent status 1 resource", check_file_status, resources[0][1])
+            await self.measure_concurrent("concurrent upload 1 resource", upload_file_to_hydroshare,
+                                          upload_paths[0])
+            await self.measure_concurrent("concurrent status 4 resources", check_file_status, all_file_paths)
+            await self.measure_concurrent("concurrent upload 3 resources", upload_file_to_hydroshare,
+                                          all_upload_paths)
+
+        asyncio.run(run_benchmarks())
@@ -0,0 +1,237 @@
+"""Tests of the file operations against the fake HydroShare server (tests/fake_hydroshare.py)."""
+
+import asyncio
+import gc
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from hsclient.hydroshare import Resource
+
+from fake_hydroshare import FakeHydroShareTestCase
+
+from hsfiles_jupyter import utils
+from hsfiles_jupyter.check_file_status import check_file_status
+from hsfiles_jupyter.file_watcher import FileWatcher
+from hsfiles_jupyter.folder_status import get_folder_file_statuses
+from hsfiles_jupyter.jobs import JobManager, get_job, submit_job
+from hsfiles_jupyter.refresh_file import refresh_file_from_hydroshare
+from hsfiles_jupyter.replace_file import replace_file_in_hydroshare
+from hsfiles_jupyter.upload_file import upload_file_to_hydroshare
+from hsfiles_jupyter.upload_folder import upload_folder_to_hydroshare
+
+
+class FileOperationsTestCase(FakeHydroShareTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start_fake_hydroshare()
+
+
+class TestRefreshFile(FileOperationsTestCase):
+    def test_refresh_file_with_special_characters_in_name(self):
+        for file_path in ("my file.txt", "folder/my file#1.txt", "données/100% ü.txt"):
+            with self.subTest(file_path=file_path):
+                resource = self.fake_hydroshare.add_resource({file_path: b"content in HydroShare"})
+                local_file_path = self.write_local_file(resource.resource_id, file_path, b"local content")
+
+                response = asyncio.run(refresh_file_from_hydroshare(local_file_path))
+
+                self.assertIn("success", response, response.get("error"))
+                self.assertEqual(self.read_local_file(local_file_path), b"content in HydroShare")
+
+
+class TestFolderStatus(FileOperationsTestCase):
+    @patch.object(FileWatcher, 'is_running', return_value=True)
+    def test_file_changed_without_the_watcher_noticing_is_not_synced(self, _):
+        resource = self.fake_hydroshare.add_resource({"data.csv": b"a,b\n1,2\n"})
+        local_file_path = self.write_local_file(resource.resource_id, "data.csv", b"a,b\n1,2\n")
+        utils.LocalChecksumCache().get_checksum(local_file_path)
+        folder_path = os.path.dirname(local_file_path)
+        self.assertEqual(get_folder_file_statuses(folder_path), {"data.csv": "synced"})
+
+        # e.g., edited while the server was down
+        self.write_local_file(resource.resource_id, "data.csv", b"a,b\n1,2\n3,4\n")
+
+        self.assertEqual(get_folder_file_statuses(folder_path), {"data.csv": "checking"})
+
+
+class TestUploadFolder(FileOperationsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.resource = self.fake_hydroshare.add_resource({"folder/existing.txt": b"content in HydroShare"})
+        self.write_local_file(self.resource.resource_id, "folder/new.txt", b"new content")
+        local_file_path = self.write_local_file(self.resource.resource_id, "folder/existing.txt", b"local content")
+        self.folder_path = os.path.dirname(local_file_path)
+
+    def test_upload_folder_with_existing_files_fails_without_overwrite(self):
+        response = asyncio.run(upload_folder_to_hydroshare(self.folder_path, overwrite=False))
+
+        self.assertIn("error", response)
+        self.assertIn("folder/existing.txt", response["error"])
+        self.assertEqual(self.resource.files, {"folder/existing.txt": b"content in HydroShare"})
+
+    def test_upload_folder_with_overwrite_replaces_existing_files(self):
+        response = asyncio.run(upload_folder_to_hydroshare(self.folder_path, overwrite=True))
+
+        self.assertIn("success", response, response.get("error"))
+        self.assertEqual(self.resource.files,
+                         {"folder/existing.txt": b"local content", "folder/new.txt": b"new content"})
+
+    def test_upload_new_folder_without_overwrite(self):
+        self.resource.delete_file("folder/existing.txt")
+
+        response = asyncio.run(upload_folder_to_hydroshare(self.folder_path, overwrite=False))
+
+        self.assertIn("success", response, response.get("error"))
+        self.assertEqual(self.resource.files,
+                         {"folder/existing.txt": b"local content", "folder/new.txt": b"new content"})
+
+
+class TestConcurrentFileCache(FileOperationsTestCase):
+    def test_concurrent_listing_and_cache_updates(self):
+        fake_resource = self.fake_hydroshare.add_resource({f"file{i}.txt": b"content" for i in range(40)})
+        rfc_manager = utils.ResourceFileCacheManager()
+        resource = rfc_manager.get_resource(fake_resource.resource_id)
+        rfc_manager.get_files(resource)
+        # files uploaded and deleted by the extension - HydroShare has them before the cache is updated
+        added_files = [f"new/file{i}.txt" for i in range(20)]
+        deleted_files = [f"file{i}.txt" for i in range(20)]
+        for file_path in added_files:
+            fake_resource.add_file(file_path, b"new content")
+        for file_path in deleted_files:
+            fake_resource.delete_file(file_path)
+
+        def update(file_path, update_type):
+            rfc_manager.update_resource_files_cache(resource=resource, file_path=file_path, update_type=update_type)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(rfc_manager.get_files, resource, refresh=True) for _ in range(5)]
+            futures += [executor.submit(update, file_path, utils.FileCacheUpdateType.ADD) for file_path in added_files]
+            futures += [executor.submit(update, file_path, utils.FileCacheUpdateType.DELETE)
+                        for file_path in deleted_files]
+            futures += [executor.submit(rfc_manager.get_files, resource) for _ in range(20)]
+            for future in futures:
+                future.result(30)
+
+        files, _ = rfc_manager.get_files(resource)
+        self.assertEqual(set(files), set(fake_resource.files))
+        self.assertEqual(set(rfc_manager.get_resource_file_cache(resource).get_folder_files("new")), set(added_files))
+
+
+class TestUploadFile(FileOperationsTestCase):
+    def test_status_right_after_upload_is_identical(self):
+        resource = self.fake_hydroshare.add_resource({})
+        local_file_path = self.write_local_file(resource.resource_id, "folder/data.csv", b"a,b\n1,2\n")
+
+        async def upload_and_check_status():
+            response = await upload_file_to_hydroshare(local_file_path)
+            self.assertIn("success", response, response.get("error"))
+            return await check_file_status(local_file_path)
+
+        response = asyncio.run(upload_and_check_status())
+
+        self.assertEqual(response["status"], "Exists in HydroShare and they are identical")
+        self.assertEqual(resource.files, {"folder/data.csv": b"a,b\n1,2\n"})
+
+
+class TestBatchJob(FileOperationsTestCase):
+    def setUp(self):
+        super().setUp()
+        JobManager._instance = None
+        self.addCleanup(setattr, JobManager, '_instance', None)
+
+    def test_batch_upload_job(self):
+        resource = self.fake_hydroshare.add_resource({})
+        local_file_paths = [self.write_local_file(resource.resource_id, f"folder/file{i}.txt", b"content")
+                            for i in range(3)]
+        folder_path = os.path.dirname(local_file_paths[0])
+
+        async def run_job():
+            response = await submit_job('batch/upload', folder_path, {"paths": local_file_paths})
+            self.assertIn("success", response, response.get("error"))
+            job_id = response["job"]["job_id"]
+            while (await get_job(job_id))["job"]["status"] == "running":
+                await asyncio.sleep(0.01)
+            return (await get_job(job_id))["job"]
+
+        job = asyncio.run(run_job())
+
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual([result["path"] for result in job["result"]["results"]], local_file_paths)
+        self.assertTrue(all("success" in result for result in job["result"]["results"]), job["result"])
+        self.assertEqual(resource.files, {f"folder/file{i}.txt": b"content" for i in range(3)})
+
+
+class TestResourceEviction(FileOperationsTestCase):
+    @patch('hsfiles_jupyter.utils.get_resource_cache_max_entries', return_value=1)
+    def test_evicted_resource_is_freed(self, _):
+        rfc_manager = utils.ResourceFileCacheManager()
+        resource_ids = [self.fake_hydroshare.add_resource({"data.csv": b"a,b\n"}).resource_id for _ in range(2)]
+        evicted_resource = weakref.ref(rfc_manager.get_resource(resource_ids[0]))
+        rfc_manager.get_resource(resource_ids[1])
+        # the snapshot written for the evicted resource holds its cache until it is written
+        utils.ResourceListingSnapshots().flush()
+        gc.collect()
+
+        self.assertIsNone(rfc_manager.resource_file_caches.peek(resource_ids[0]))
+        self.assertEqual(utils.HydroShareWrapper().hs._resource_object_cache, {})
+        self.assertIsNone(evicted_resource())
+
+
+class TestReplaceFile(FileOperationsTestCase):
+    def setUp(self):
+        super().setUp()
+        patches = [
+            patch('hsfiles_jupyter.utils.get_retry_max_attempts', return_value=2),
+            patch('hsfiles_jupyter.utils.get_retry_base_delay', return_value=0.01),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.resource = self.fake_hydroshare.add_resource({"data.csv": b"content in HydroShare"})
+        self.local_file_path = self.write_local_file(self.resource.resource_id, "data.csv", b"local content")
+
+    def fail_renaming_uploaded_file(self, failure_count: int):
+        """Makes the next 'failure_count' requests fail once the uploaded copy is being renamed."""
+        file_rename = Resource.file_rename
+        failures_injected = False
+
+        def fail_rename(resource, path, new_path):
+            nonlocal failures_injected
+            if path.endswith('.hsfiles-upload') and not failures_injected:
+                failures_injected = True
+                self.fake_hydroshare.fail_next(failure_count)
+            return file_rename(resource, path, new_path)
+
+        rename_patch = patch.object(Resource, 'file_rename', autospec=True, side_effect=fail_rename)
+        rename_patch.start()
+        self.addCleanup(rename_patch.stop)
+
+    def test_replace_file(self):
+        response = asyncio.run(replace_file_in_hydroshare(self.local_file_path))
+
+        self.assertIn("success", response, response.get("error"))
+        self.assertEqual(self.resource.files, {"data.csv": b"local content"})
+
+    def test_failed_rename_leaves_file_in_hydroshare_as_it_was(self):
+        # both attempts to rename the uploaded copy fail
+        self.fail_renaming_uploaded_file(2)
+
+        response = asyncio.run(replace_file_in_hydroshare(self.local_file_path))
+
+        self.assertIn("was left as it was", response["error"])
+        self.assertEqual(self.resource.files, {"data.csv": b"content in HydroShare"})
+
+    def test_failed_rename_back_reports_where_the_copies_are(self):
+        # renaming the uploaded copy and then the backup back both fail
+        self.fail_renaming_uploaded_file(4)
+
+        response = asyncio.run(replace_file_in_hydroshare(self.local_file_path))
+
+        files = {os.path.splitext(file_path)[1]: file_path for file_path in self.resource.files}
+        self.assertEqual(set(files), {'.hsfiles-upload', '.hsfiles-backup'})
+        self.assertIn(files['.hsfiles-upload'], response["error"])
+        self.assertIn(files['.hsfiles-backup'], response["error"])
+        self.assertEqual(self.resource.files[files['.hsfiles-backup']], b"content in HydroShare")
+        self.assertEqual(self.resource.files[files['.hsfiles-upload']], b"local content")
@@ -0,0 +1,60 @@
+"""Unit tests of the local file watcher in hsfiles_jupyter/file_watcher.py."""
+
+import unittest
+from unittest.mock import patch
+
+from hsfiles_jupyter.file_watcher import FileWatcher
+
+FILE_PATH = f"Downloads/{'0' * 32}/data/contents/data.csv"
+
+
+class TestProcessDirtyFile(unittest.TestCase):
+    def setUp(self):
+        auto_upload_patch = patch('hsfiles_jupyter.file_watcher.get_auto_upload_enabled', return_value=False)
+        auto_upload_patch.start()
+        self.addCleanup(auto_upload_patch.stop)
+        checksum_cache_patch = patch('hsfiles_jupyter.file_watcher.LocalChecksumCache')
+        self.mock_get_checksum = checksum_cache_patch.start().return_value.get_checksum
+        self.addCleanup(checksum_cache_patch.stop)
+        FileWatcher._instance = None
+        self.addCleanup(setattr, FileWatcher, '_instance', None)
+        self.file_watcher = FileWatcher()
+        self.file_watcher._dirty_files[FILE_PATH] = 1.0
+
+    def test_hashed_file_is_no_longer_dirty(self):
+        self.file_watcher._process_dirty_file(FILE_PATH)
+
+        self.assertFalse(self.file_watcher.is_dirty(FILE_PATH))
+        self.mock_get_checksum.assert_called_once_with(FILE_PATH)
+
+    def test_deleted_file_is_no_longer_dirty(self):
+        self.mock_get_checksum.side_effect = FileNotFoundError()
+
+        with patch('hsfiles_jupyter.file_watcher.logger') as mock_logger:
+            self.file_watcher._process_dirty_file(FILE_PATH)
+
+        self.assertFalse(self.file_watcher.is_dirty(FILE_PATH))
+        mock_logger.error.assert_not_called()
+
+    def test_unreadable_file_is_not_retried(self):
+        self.mock_get_checksum.side_effect = PermissionError()
+
+        with patch('hsfiles_jupyter.file_watcher.logger') as mock_logger:
+            self.file_watcher._process_dirty_file(FILE_PATH)
+
+        self.assertFalse(self.file_watcher.is_dirty(FILE_PATH))
+        mock_logger.error.assert_called_once()
+
+    def test_file_changed_while_hashed_stays_dirty(self):
+        def change_file(file_path):
+            self.file_watcher._dirty_files[file_path] = 2.0
+
+        self.mock_get_checksum.side_effect = change_file
+
+        self.file_watcher._process_dirty_file(FILE_PATH)
+
+        self.assertTrue(self.file_watcher.is_dirty(FILE_PATH))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,14 +3,29 @@ import json
 from asynctest import CoroutineMock, patch, PropertyMock
 
 from tornado.web import Application, RequestHandler
+from tornado.simple_httpclient import HTTPTimeoutError
 from tornado.testing import AsyncHTTPTestCase, gen_test
 
 from hsfiles_jupyter.handlers import (
     UploadFileHandler as OriginalUploadFileHandler,
     RefreshFileHandler as OriginalRefreshFileHandler,
     DeleteFileHandler as OriginalDeleteFileHandler,
+    ReplaceFileHandler as OriginalReplaceFileHandler,
     CheckFileStatusHandler as OriginalCheckFileStatusHandler,
+    BatchFileHandler as OriginalBatchFileHandler,
+    CancelTransferHandler as OriginalCancelTransferHandler,
+    TransferProgressHandler as OriginalTransferProgressHandler,
+    SyncFolderHandler as OriginalSyncFolderHandler,
+    UploadFolderHandler as OriginalUploadFolderHandler,
+    CheckFolderStatusHandler as OriginalCheckFolderStatusHandler,
+    WarmUpHandler as OriginalWarmUpHandler,
+    MetricsHandler as OriginalMetricsHandler,
+    JobsHandler as OriginalJobsHandler,
+    JobHandler as OriginalJobHandler,
+    EventStreamHandler as OriginalEventStreamHandler,
 )
+from hsfiles_jupyter.events import publish
+from hsfiles_jupyter.metrics import timed
 
 
 class BaseHandler(RequestHandler):
@@ -30,17 +45,77 @@ class DeleteFileHandler(BaseHandler, OriginalDeleteFileHandler):
     pass
 
 
+class ReplaceFileHandler(BaseHandler, OriginalReplaceFileHandler):
+    pass
+
+
 class CheckFileStatusHandler(BaseHandler, OriginalCheckFileStatusHandler):
     pass
 
 
+class BatchFileHandler(BaseHandler, OriginalBatchFileHandler):
+    pass
+
+
+class CancelTransferHandler(BaseHandler, OriginalCancelTransferHandler):
+    pass
+
+
+class TransferProgressHandler(BaseHandler, OriginalTransferProgressHandler):
+    pass
+
+
+class SyncFolderHandler(BaseHandler, OriginalSyncFolderHandler):
+    pass
+
+
+class UploadFolderHandler(BaseHandler, OriginalUploadFolderHandler):
+    pass
+
+
+class CheckFolderStatusHandler(BaseHandler, OriginalCheckFolderStatusHandler):
+    pass
+
+
+class WarmUpHandler(BaseHandler, OriginalWarmUpHandler):
+    pass
+
+
+class MetricsHandler(BaseHandler, OriginalMetricsHandler):
+    pass
+
+
+class JobsHandler(BaseHandler, OriginalJobsHandler):
+    pass
+
+
+class JobHandler(BaseHandler, OriginalJobHandler):
+    pass
+
+
+class EventStreamHandler(BaseHandler, OriginalEventStreamHandler):
+    pass
+
+
 class TestHandlers(AsyncHTTPTestCase):
     def get_app(self):
         return Application([
             (r"/hydroshare/upload", UploadFileHandler),
             (r"/hydroshare/refresh", RefreshFileHandler),
             (r"/hydroshare/delete", DeleteFileHandler),
+            (r"/hydroshare/replace", ReplaceFileHandler),
             (r"/hydroshare/status", CheckFileStatusHandler),
+            (r"/hydroshare/batch/(upload|refresh|delete|status)", BatchFileHandler),
+            (r"/hydroshare/cancel", CancelTransferHandler),
+            (r"/hydroshare/progress", TransferProgressHandler),
+            (r"/hydroshare/sync", SyncFolderHandler),
+            (r"/hydroshare/upload-folder", UploadFolderHandler),
+            (r"/hydroshare/folder-status", CheckFolderStatusHandler),
+            (r"/hydroshare/warmup", WarmUpHandler),
+            (r"/hydroshare/metrics", MetricsHandler),
+            (r"/hydroshare/jobs", JobsHandler),
+            (r"/hydroshare/jobs/([0-9a-f]{32})", JobHandler),
+            (r"/hydroshare/events", EventStreamHandler),
         ], cookie_secret="a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", xsrf_cookies=False)
 
 
@@ -89,6 +164,16 @@ class TestHandlers(AsyncHTTPTestCase):
                             mock_return_value={"success": "File deleted"}, mock_current_user=mock_current_user,
                             mock_prepare=mock_prepare)
 
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.replace_file_in_hydroshare', new_callable=CoroutineMock)
+    @gen_test
+    async def test_replace_file_handler(self, mock_replace, mock_prepare, mock_current_user):
+        url = '/hydroshare/replace'
+        await self.run_test(url=url, mock_function=mock_replace,
+                            mock_return_value={"success": "File replaced"}, mock_current_user=mock_current_user,
+                            mock_prepare=mock_prepare)
+
 
     @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
     @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
@@ -99,3 +184,188 @@ class TestHandlers(AsyncHTTPTestCase):
         await self.run_test(url=url, mock_function=mock_check_status,
                             mock_return_value={"success": "File exists"}, mock_current_user=mock_current_user,
                             mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.run_batch_operation', new_callable=CoroutineMock)
+    @gen_test
+    async def test_batch_file_handler(self, mock_batch, mock_prepare, mock_current_user):
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        mock_return_value = {"results": [{"path": "file_1", "success": "File uploaded"},
+                                         {"path": "file_2", "error": "File already exists"}]}
+        mock_batch.return_value = mock_return_value
+        response = await self.http_client.fetch(
+            self.get_url('/hydroshare/batch/upload'),
+            method='POST',
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({"paths": ["file_1", "file_2"]})
+        )
+        assert response.code == 200
+        assert json.loads(response.body) == {"response": mock_return_value}
+        mock_batch.assert_called_once_with('upload', ["file_1", "file_2"])
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.cancel_file_transfers', new_callable=CoroutineMock)
+    @gen_test
+    async def test_cancel_transfer_handler(self, mock_cancel, mock_prepare, mock_current_user):
+        url = '/hydroshare/cancel'
+        await self.run_test(url=url, mock_function=mock_cancel,
+                            mock_return_value={"success": "Cancelled 1 transfer(s)"},
+                            mock_current_user=mock_current_user, mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.get_transfer_progress', new_callable=CoroutineMock)
+    @gen_test
+    async def test_transfer_progress_handler(self, mock_progress, mock_prepare, mock_current_user):
+        url = '/hydroshare/progress'
+        await self.run_test(url=url, mock_function=mock_progress,
+                            mock_return_value={"success": "50.0% of file transferred",
+                                               "progress": {"bytes_done": 50, "total_bytes": 100}},
+                            mock_current_user=mock_current_user, mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.sync_folder_with_hydroshare', new_callable=CoroutineMock)
+    @gen_test
+    async def test_sync_folder_handler(self, mock_sync, mock_prepare, mock_current_user):
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        mock_return_value = {"success": "1 file(s) to sync in folder test_folder_path",
+                             "plan": [{"path": "test_folder_path/file_1", "status": "local-only",
+                                       "action": "upload"}]}
+        mock_sync.return_value = mock_return_value
+        response = await self.http_client.fetch(
+            self.get_url('/hydroshare/sync'),
+            method='POST',
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({"path": "test_folder_path", "direction": "upload", "dry_run": True})
+        )
+        assert response.code == 200
+        assert json.loads(response.body) == {"response": mock_return_value}
+        mock_sync.assert_called_once_with("test_folder_path", direction="upload", dry_run=True)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.upload_folder_to_hydroshare', new_callable=CoroutineMock)
+    @gen_test
+    async def test_upload_folder_handler(self, mock_upload_folder, mock_prepare, mock_current_user):
+        url = '/hydroshare/upload-folder'
+        await self.run_test(url=url, mock_function=mock_upload_folder,
+                            mock_return_value={"success": "Folder uploaded"}, mock_current_user=mock_current_user,
+                            mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.check_folder_status', new_callable=CoroutineMock)
+    @gen_test
+    async def test_check_folder_status_handler(self, mock_check_folder_status, mock_prepare, mock_current_user):
+        url = '/hydroshare/folder-status'
+        await self.run_test(url=url, mock_function=mock_check_folder_status,
+                            mock_return_value={"success": "Status of 2 file(s)",
+                                               "statuses": {"file_1": "synced", "file_2": "local-only"}},
+                            mock_current_user=mock_current_user, mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.warm_up', new_callable=CoroutineMock)
+    @gen_test
+    async def test_warm_up_handler(self, mock_warm_up, mock_prepare, mock_current_user):
+        url = '/hydroshare/warmup'
+        await self.run_test(url=url, mock_function=mock_warm_up,
+                            mock_return_value={"success": "Started warming up the cache for resource"},
+                            mock_current_user=mock_current_user, mock_prepare=mock_prepare)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.check_file_status', new_callable=CoroutineMock)
+    @gen_test
+    async def test_server_timing_and_metrics(self, mock_check_status, mock_prepare, mock_current_user):
+        async def check_file_status(file_path):
+            with timed('resource_info'):
+                pass
+            return {"status": "Exists in HydroShare and they are identical"}
+
+        mock_check_status.side_effect = check_file_status
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        response = await self.http_client.fetch(
+            self.get_url('/hydroshare/status'),
+            method='POST',
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({"path": "test_file_path"})
+        )
+        assert response.code == 200
+        server_timing = response.headers['Server-Timing']
+        assert server_timing.startswith('resource_info;dur=')
+        assert 'total;dur=' in server_timing
+
+        response = await self.http_client.fetch(self.get_url('/hydroshare/metrics'))
+        assert response.code == 200
+        assert response.headers['Content-Type'].startswith('text/plain')
+        assert b'hsfiles_stage_duration_seconds_count{stage="resource_info"}' in response.body
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.submit_job', new_callable=CoroutineMock)
+    @gen_test
+    async def test_submit_job_handler(self, mock_submit_job, mock_prepare, mock_current_user):
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        mock_return_value = {"success": "Started job to sync test_folder_path",
+                             "job": {"job_id": "a" * 32, "status": "running"}}
+        mock_submit_job.return_value = mock_return_value
+        response = await self.http_client.fetch(
+            self.get_url('/hydroshare/jobs'),
+            method='POST',
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({"operation": "sync", "path": "test_folder_path", "dry_run": False})
+        )
+        assert response.code == 200
+        assert json.loads(response.body) == {"response": mock_return_value}
+        mock_submit_job.assert_called_once_with("sync", "test_folder_path", {"dry_run": False})
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.cancel_job', new_callable=CoroutineMock)
+    @patch('hsfiles_jupyter.handlers.get_job', new_callable=CoroutineMock)
+    @gen_test
+    async def test_job_handler(self, mock_get_job, mock_cancel_job, mock_prepare, mock_current_user):
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        job_id = "a" * 32
+        mock_get_job.return_value = {"success": "Job to upload test_file_path is running",
+                                     "job": {"job_id": job_id, "status": "running"}}
+        mock_cancel_job.return_value = {"success": f"Cancelled job {job_id}"}
+
+        response = await self.http_client.fetch(self.get_url(f'/hydroshare/jobs/{job_id}'))
+        assert response.code == 200
+        assert json.loads(response.body) == {"response": mock_get_job.return_value}
+        mock_get_job.assert_called_once_with(job_id)
+
+        response = await self.http_client.fetch(self.get_url(f'/hydroshare/jobs/{job_id}'), method='DELETE')
+        assert response.code == 200
+        assert json.loads(response.body) == {"response": mock_cancel_job.return_value}
+        mock_cancel_job.assert_called_once_with(job_id)
+
+    @patch('jupyter_server.base.handlers.JupyterHandler.current_user', new_callable=PropertyMock)
+    @patch('jupyter_server.base.handlers.JupyterHandler.prepare', new_callable=CoroutineMock)
+    @gen_test
+    async def test_event_stream_handler(self, mock_prepare, mock_current_user):
+        mock_current_user.return_value = "test_user"
+        mock_prepare.return_value = None
+        chunks = []
+
+        def on_chunk(chunk):
+            chunks.append(chunk)
+            if chunk.startswith(b': connected'):
+                publish('files', resource_id='test_resource_id', path='test_file_path')
+
+        # the stream stays open until the client gives up on it
+        with self.assertRaises(HTTPTimeoutError):
+            await self.http_client.fetch(self.get_url('/hydroshare/events'), streaming_callback=on_chunk,
+                                         request_timeout=1)
+        assert (b'event: files\ndata: {"resource_id": "test_resource_id", "path": "test_file_path"}\n\n'
+                in b''.join(chunks))
@@ -0,0 +1,106 @@
+"""Unit tests of the transfer scheduler in hsfiles_jupyter/scheduler.py."""
+
+import threading
+import unittest
+from unittest.mock import patch
+
+from hsfiles_jupyter.scheduler import (
+    TransferCancelledError,
+    TransferPriority,
+    TransferScheduler,
+    check_transfer_cancelled,
+)
+
+
+class TestTransferScheduler(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch('hsfiles_jupyter.scheduler.get_max_transfers', return_value=2),
+            patch('hsfiles_jupyter.scheduler.get_max_transfers_per_resource', return_value=1),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        TransferScheduler._instance = None
+        self.scheduler = TransferScheduler()
+        self.addCleanup(self.shut_down_scheduler)
+        self.release = threading.Event()
+        self.started = []
+
+    def shut_down_scheduler(self):
+        self.release.set()
+        self.scheduler._executor.shutdown(wait=True)
+        TransferScheduler._instance = None
+
+    def transfer(self, name: str):
+        def operation():
+            self.started.append(name)
+            self.release.wait(5)
+            return name
+        return operation
+
+    def submit(self, name: str, resource_id: str = 'resource_id', priority=TransferPriority.NORMAL):
+        return self.scheduler.submit(resource_id, f"{name}.txt", self.transfer(name), priority=priority)
+
+    def test_queued_transfers_start_in_priority_order(self):
+        running = self.submit('running')
+        queued = [self.submit('low', priority=TransferPriority.LOW),
+                  self.submit('normal 1'),
+                  self.submit('high', priority=TransferPriority.HIGH),
+                  self.submit('normal 2')]
+        self.assertTrue(running.running)
+        self.assertFalse(any(transfer.running for transfer in queued))
+        self.release.set()
+
+        for transfer in [running, *queued]:
+            transfer.future.result(5)
+        self.assertEqual(self.started, ['running', 'high', 'normal 1', 'normal 2', 'low'])
+
+    def test_transfers_of_other_resources_are_not_held_up(self):
+        running = self.submit('running', resource_id='resource_1')
+        queued = self.submit('queued', resource_id='resource_1')
+        other = self.submit('other', resource_id='resource_2')
+
+        self.assertEqual([transfer.running for transfer in (running, queued, other)], [True, False, True])
+        self.release.set()
+        self.assertEqual([transfer.future.result(5) for transfer in (running, queued, other)],
+                         ['running', 'queued', 'other'])
+
+    def test_cancelled_queued_transfer_is_never_started(self):
+        running = self.submit('running')
+        queued = self.submit('queued')
+
+        self.assertTrue(self.scheduler.cancel(queued.transfer_id))
+        with self.assertRaises(TransferCancelledError):
+            queued.future.result(5)
+        self.assertEqual([transfer['path'] for transfer in self.scheduler.list_transfers()], ['running.txt'])
+        self.release.set()
+        running.future.result(5)
+        self.assertEqual(self.started, ['running'])
+        self.assertFalse(self.scheduler.cancel(queued.transfer_id))
+
+    def test_cancelled_running_transfer_is_stopped(self):
+        stopped = threading.Event()
+
+        def operation():
+            try:
+                while True:
+                    check_transfer_cancelled()
+                    self.release.wait(0.01)
+            finally:
+                stopped.set()
+
+        running = self.scheduler.submit('resource_id', 'running.txt', operation)
+        queued = self.submit('queued')
+
+        self.assertEqual(self.scheduler.cancel_file_transfers('running.txt'), 1)
+        with self.assertRaises(TransferCancelledError):
+            running.future.result(5)
+        self.assertTrue(stopped.wait(5))
+        # the next transfer of the resource is started once the cancelled one has stopped
+        self.release.set()
+        self.assertEqual(queued.future.result(5), 'queued')
+
+
+if __name__ == '__main__':
+    unittest.main()
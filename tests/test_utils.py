@@ -0,0 +1,405 @@
+"""Unit tests of the HydroShare session helpers and caches in hsfiles_jupyter/utils.py."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from requests import ConnectionError, Request, Response
+from requests.adapters import HTTPAdapter
+
+from hsfiles_jupyter.scheduler import TransferCancelledError
+from hsfiles_jupyter.utils import (
+    CircuitBreaker,
+    HydroShareHTTPAdapter,
+    HydroShareUnavailableError,
+    HydroShareWrapper,
+    LocalChecksumCache,
+    ResourceFileCacheManager,
+    ResourceFilesCacheStore,
+    calculate_md5,
+    get_retry_delay,
+    is_retryable_error,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patches = [
+            patch('hsfiles_jupyter.utils.time.monotonic', side_effect=lambda: self.now),
+            patch('hsfiles_jupyter.utils.get_circuit_breaker_threshold', return_value=2),
+            patch('hsfiles_jupyter.utils.get_circuit_breaker_cooldown', return_value=30),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.circuit_breaker = CircuitBreaker('hydroshare.org')
+
+    def open_circuit(self):
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.before_request()
+        self.circuit_breaker.record_failure()
+        with self.assertRaises(HydroShareUnavailableError):
+            self.circuit_breaker.before_request()
+
+    def test_success_resets_failure_count(self):
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_success()
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.before_request()
+
+    def test_half_open_lets_a_single_trial_through(self):
+        self.open_circuit()
+        self.now += 30
+        self.circuit_breaker.before_request()
+        with self.assertRaises(HydroShareUnavailableError):
+            self.circuit_breaker.before_request()
+
+    def test_closes_when_trial_succeeds(self):
+        self.open_circuit()
+        self.now += 30
+        self.circuit_breaker.before_request()
+        self.circuit_breaker.record_success()
+        self.circuit_breaker.before_request()
+        self.circuit_breaker.before_request()
+
+    def test_reopens_when_trial_fails(self):
+        self.open_circuit()
+        self.now += 30
+        self.circuit_breaker.before_request()
+        self.circuit_breaker.record_failure()
+        with self.assertRaises(HydroShareUnavailableError):
+            self.circuit_breaker.before_request()
+        self.now += 30
+        self.circuit_breaker.before_request()
+
+    def test_released_trial_lets_another_trial_through(self):
+        self.open_circuit()
+        self.now += 30
+        self.circuit_breaker.before_request()
+        self.circuit_breaker.release_trial()
+        self.circuit_breaker.before_request()
+        with self.assertRaises(HydroShareUnavailableError):
+            self.circuit_breaker.before_request()
+
+
+class TestHydroShareHTTPAdapter(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patches = [
+            patch('hsfiles_jupyter.utils.time.monotonic', side_effect=lambda: self.now),
+            patch('hsfiles_jupyter.utils.get_circuit_breaker_threshold', return_value=1),
+            patch('hsfiles_jupyter.utils.get_circuit_breaker_cooldown', return_value=30),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.adapter = HydroShareHTTPAdapter()
+        self.request = Request('GET', 'https://hydroshare.org/hsapi/resource/').prepare()
+
+    def send(self, error: BaseException):
+        with patch.object(HTTPAdapter, 'send', side_effect=error):
+            with self.assertRaises(type(error)):
+                self.adapter.send(self.request)
+
+    def test_connection_error_opens_circuit(self):
+        self.send(ConnectionError())
+        with self.assertRaises(HydroShareUnavailableError):
+            self.adapter.send(self.request)
+
+    def test_cancelled_trial_does_not_leave_circuit_stuck(self):
+        self.send(ConnectionError())
+        self.now += 30
+        # the trial request is cancelled while its body is being read
+        self.send(TransferCancelledError())
+        self.send(ConnectionError())
+        with self.assertRaises(HydroShareUnavailableError):
+            self.adapter.send(self.request)
+        self.now += 30
+        self.send(KeyboardInterrupt())
+        self.send(ConnectionError())
+
+
+class TestRetries(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch('hsfiles_jupyter.utils.get_retry_base_delay', return_value=0.5),
+            patch('hsfiles_jupyter.utils.get_retry_max_delay', return_value=30),
+            patch('hsfiles_jupyter.utils.get_circuit_breaker_threshold', return_value=100),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.adapter = HydroShareHTTPAdapter()
+        self.request = Request('GET', 'https://hydroshare.org/hsapi/resource/').prepare()
+
+    def send(self, status_code: int, retry_after: str = None):
+        response = Response()
+        response.status_code = status_code
+        if retry_after is not None:
+            response.headers['Retry-After'] = retry_after
+        with patch.object(HTTPAdapter, 'send', return_value=response):
+            return self.adapter.send(self.request)
+
+    def test_retry_after_seconds_is_honored(self):
+        self.send(429, retry_after='7')
+        self.assertEqual(get_retry_delay(0), 7)
+
+    def test_retry_after_date_is_honored(self):
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=20)
+        self.send(503, retry_after=format_datetime(retry_at, usegmt=True))
+        self.assertAlmostEqual(get_retry_delay(0), 20, delta=2)
+
+    def test_retry_after_is_capped(self):
+        self.send(503, retry_after='3600')
+        self.assertEqual(get_retry_delay(0), 30)
+
+    def test_delay_grows_exponentially_without_retry_after(self):
+        for retry_after in (None, 'soon'):
+            with self.subTest(retry_after=retry_after):
+                self.send(503, retry_after=retry_after)
+                with patch('hsfiles_jupyter.utils.random.uniform', side_effect=lambda low, high: high):
+                    self.assertEqual([get_retry_delay(attempt) for attempt in range(8)],
+                                     [0.5, 1, 2, 4, 8, 16, 30, 30])
+
+    def test_retry_after_of_an_earlier_response_is_not_reused(self):
+        self.send(429, retry_after='7')
+        self.send(200)
+        with patch('hsfiles_jupyter.utils.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(get_retry_delay(0), 0.5)
+
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable_error(ConnectionError()))
+        self.assertTrue(is_retryable_error(Exception("Failed POST /hsapi/resource/, status_code 429")))
+        self.assertTrue(is_retryable_error(Exception("Failed GET /hsapi/resource/, status_code 502")))
+        self.assertFalse(is_retryable_error(Exception("Failed GET /hsapi/resource/, status_code 404")))
+        self.assertFalse(is_retryable_error(HydroShareUnavailableError()))
+
+    @patch('hsfiles_jupyter.utils.time.sleep')
+    def test_execute_with_retry(self, mock_sleep):
+        # the retries don't need a logged in session
+        hs_wrapper = object.__new__(HydroShareWrapper)
+        operation = MagicMock(side_effect=[ConnectionError(), Exception("status_code 503"), 'resource'])
+        self.assertEqual(hs_wrapper.execute_with_retry(operation, max_retries=3), 'resource')
+        self.assertEqual(operation.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+        operation = MagicMock(side_effect=Exception("status_code 404"))
+        with self.assertRaises(Exception):
+            hs_wrapper.execute_with_retry(operation, max_retries=3)
+        self.assertEqual(operation.call_count, 1)
+
+        operation = MagicMock(side_effect=ConnectionError())
+        with self.assertRaises(ConnectionError):
+            hs_wrapper.execute_with_retry(operation, max_retries=3)
+        self.assertEqual(operation.call_count, 3)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.rfc_manager = ResourceFileCacheManager()
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown, wait=True)
+        self.load_started = threading.Event()
+        self.finish_load = threading.Event()
+        self.load_count = 0
+
+    def load_files(self, result=None, error: Exception = None):
+        def load():
+            self.load_count += 1
+            self.load_started.set()
+            self.finish_load.wait(5)
+            if error is not None:
+                raise error
+            return result
+        return load
+
+    def start_load(self, kind: str, load):
+        future = self.executor.submit(self.rfc_manager._single_flight, 'resource_id', kind, load)
+        self.assertTrue(self.load_started.wait(5))
+        return future
+
+    def test_concurrent_loads_share_a_single_listing(self):
+        first = self.start_load('create', self.load_files('cache'))
+        joined = [self.executor.submit(self.rfc_manager._single_flight, 'resource_id', 'create',
+                                       self.load_files('other cache')) for _ in range(3)]
+        # letting the other callers reach the load in progress
+        time.sleep(0.2)
+        self.finish_load.set()
+
+        self.assertEqual([future.result(5) for future in [first, *joined]], ['cache'] * 4)
+        self.assertEqual(self.load_count, 1)
+        self.assertEqual(self.rfc_manager._loads_in_progress, {})
+
+    def test_load_error_is_raised_to_joined_callers(self):
+        first = self.start_load('load', self.load_files(error=ValueError('listing failed')))
+        joined = self.executor.submit(self.rfc_manager._single_flight, 'resource_id', 'load', self.load_files())
+        time.sleep(0.2)
+        self.finish_load.set()
+
+        for future in (first, joined):
+            with self.assertRaises(ValueError):
+                future.result(5)
+        self.assertEqual(self.load_count, 1)
+
+    def test_create_does_not_join_a_reload(self):
+        reload = self.start_load('load', self.load_files())
+
+        self.assertEqual(self.rfc_manager._single_flight('resource_id', 'create', lambda: 'cache'), 'cache')
+        self.finish_load.set()
+        self.assertIsNone(reload.result(5))
+
+
+class TestLocalChecksumCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.clock = 0
+        patches = [
+            patch.dict(os.environ, {'JUPYTER_RUNTIME_DIR': os.path.join(self.temp_dir, 'runtime')}),
+            patch('hsfiles_jupyter.utils.get_notebook_dir', return_value=self.temp_dir),
+            patch('hsfiles_jupyter.utils.get_checksum_cache_max_entries', return_value=2),
+            # a distinct access time for each cache access
+            patch('hsfiles_jupyter.utils.time.time', side_effect=self.tick),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        calculate_md5_patch = patch('hsfiles_jupyter.utils.calculate_md5', side_effect=calculate_md5)
+        self.mock_calculate_md5 = calculate_md5_patch.start()
+        self.addCleanup(calculate_md5_patch.stop)
+        LocalChecksumCache._instance = None
+        self.addCleanup(self.close_cache)
+        self.checksum_cache = LocalChecksumCache()
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    @staticmethod
+    def close_cache():
+        if LocalChecksumCache._instance._conn is not None:
+            LocalChecksumCache._instance._conn.close()
+        LocalChecksumCache._instance = None
+
+    def write_file(self, file_name: str, content: bytes) -> str:
+        with open(os.path.join(self.temp_dir, file_name), 'wb') as file:
+            file.write(content)
+        return file_name
+
+    def test_unchanged_file_is_not_hashed_again(self):
+        file_path = self.write_file('data.csv', b'a,b\n')
+        checksum = self.checksum_cache.get_checksum(file_path)
+
+        self.assertEqual(self.checksum_cache.get_checksum(file_path), checksum)
+        self.assertEqual(self.checksum_cache.get_cached_checksum(file_path), checksum)
+        self.assertEqual(self.mock_calculate_md5.call_count, 1)
+
+    def test_modified_file_is_hashed_again(self):
+        file_path = self.write_file('data.csv', b'a,b\n')
+        checksum = self.checksum_cache.get_checksum(file_path)
+        self.write_file('data.csv', b'a,b\n1,2\n')
+
+        self.assertIsNone(self.checksum_cache.get_cached_checksum(file_path))
+        self.assertNotEqual(self.checksum_cache.get_checksum(file_path), checksum)
+        self.assertEqual(self.mock_calculate_md5.call_count, 2)
+
+    def test_touched_file_is_hashed_again(self):
+        file_path = self.write_file('data.csv', b'a,b\n')
+        checksum = self.checksum_cache.get_checksum(file_path)
+        file_stat = os.stat(os.path.join(self.temp_dir, file_path))
+        os.utime(os.path.join(self.temp_dir, file_path), ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+
+        self.assertIsNone(self.checksum_cache.get_cached_checksum(file_path))
+        self.assertEqual(self.checksum_cache.get_checksum(file_path), checksum)
+        self.assertEqual(self.mock_calculate_md5.call_count, 2)
+
+    def test_least_recently_used_checksums_are_evicted(self):
+        file_paths = [self.write_file(f'data{i}.csv', f'{i}'.encode()) for i in range(3)]
+        self.checksum_cache.get_checksum(file_paths[0])
+        self.checksum_cache.get_checksum(file_paths[1])
+        # used again - the checksum of data1.csv is now the least recently used
+        self.checksum_cache.get_checksum(file_paths[0])
+        self.checksum_cache.get_checksum(file_paths[2])
+
+        self.assertIsNotNone(self.checksum_cache.get_cached_checksum(file_paths[0]))
+        self.assertIsNone(self.checksum_cache.get_cached_checksum(file_paths[1]))
+        self.assertIsNotNone(self.checksum_cache.get_cached_checksum(file_paths[2]))
+
+
+class TestResourceFilesCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patches = [
+            patch('hsfiles_jupyter.utils.time.monotonic', side_effect=lambda: self.now),
+            patch('hsfiles_jupyter.utils.get_resource_cache_max_entries', return_value=2),
+            patch('hsfiles_jupyter.utils.get_resource_cache_max_bytes', return_value=1000),
+            patch('hsfiles_jupyter.utils.get_resource_cache_ttl', return_value=60),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.store = ResourceFilesCacheStore()
+
+    def put(self, resource_id: str, size: int = 100):
+        # the store only needs the approximate size of a cache
+        resource_file_cache = SimpleNamespace(size=size)
+        self.store.put(resource_id, resource_file_cache)
+        return resource_file_cache
+
+    def test_least_recently_used_cache_is_evicted_beyond_max_entries(self):
+        cache_1 = self.put('resource_1')
+        self.put('resource_2')
+        self.assertIs(self.store.get('resource_1'), cache_1)
+        cache_3 = self.put('resource_3')
+
+        self.assertIsNone(self.store.peek('resource_2'))
+        self.assertIs(self.store.peek('resource_1'), cache_1)
+        self.assertIs(self.store.peek('resource_3'), cache_3)
+        self.assertEqual(self.store.stats()["evictions"], 1)
+
+    def test_least_recently_used_cache_is_evicted_beyond_max_bytes(self):
+        self.put('resource_1', size=600)
+        cache_2 = self.put('resource_2', size=600)
+
+        self.assertIsNone(self.store.peek('resource_1'))
+        self.assertIs(self.store.peek('resource_2'), cache_2)
+
+    def test_least_recently_used_cache_is_evicted_when_a_cache_grows(self):
+        self.put('resource_1')
+        cache_2 = self.put('resource_2')
+        cache_2.size = 950
+
+        self.assertIs(self.store.get('resource_2'), cache_2)
+        self.assertIsNone(self.store.peek('resource_1'))
+
+    def test_most_recently_used_cache_is_kept_beyond_max_bytes(self):
+        cache = self.put('resource_1', size=2000)
+
+        self.assertIs(self.store.peek('resource_1'), cache)
+
+    def test_cache_not_used_within_ttl_is_evicted(self):
+        cache = self.put('resource_1')
+        self.now += 60
+        self.assertIs(self.store.get('resource_1'), cache)
+        self.now += 61
+
+        self.assertIsNone(self.store.get('resource_1'))
+        self.assertEqual(self.store.stats(), {"entries": 0, "approximate_bytes": 0, "hits": 1, "misses": 1,
+                                              "evictions": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()